@@ -0,0 +1,163 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import mmap
+import os
+import struct
+import traceback
+from threading import (Thread, Event, Lock)
+
+from superset.extensions import ace_state_manager
+from superset.ace.util_class import (START_TS, Checkpoint)
+
+# A checkpoint file is a header, one record and one serialized result per
+# node with a committed result, and one record per node metric:
+#   header: magic, format version, last_committed, num_versions, num_metrics
+#   version: node_id, ts, length of the serialized result
+#   metric: node_id, value
+MAGIC = b"ACEC"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sIqII")
+VERSION_RECORD = struct.Struct("<qqI")
+METRIC_RECORD = struct.Struct("<qd")
+
+
+def checkpoint_path(directory: str, dash_id: int) -> str:
+    return os.path.join(directory, f"{dash_id}.ckpt")
+
+
+def write_checkpoint(path: str, checkpoint: Checkpoint) -> None:
+    parts = [HEADER.pack(MAGIC, FORMAT_VERSION, checkpoint.last_committed,
+                         len(checkpoint.versions), len(checkpoint.node_metrics))]
+    for node_id, (ts, fragment) in checkpoint.versions.items():
+        parts.append(VERSION_RECORD.pack(node_id, ts, len(fragment)))
+        parts.append(fragment)
+    for node_id, value in checkpoint.node_metrics.items():
+        parts.append(METRIC_RECORD.pack(node_id, value))
+    # readers never see a partially written checkpoint, even after a crash
+    with open(path + ".tmp", "wb") as checkpoint_file:
+        checkpoint_file.write(b"".join(parts))
+        checkpoint_file.flush()
+        os.fsync(checkpoint_file.fileno())
+    os.replace(path + ".tmp", path)
+
+
+# A checkpoint that cannot be read, e.g., empty or truncated, is ignored:
+# the dashboard then starts from an empty state
+def load_checkpoint(path: str) -> Checkpoint:
+    try:
+        checkpoint_file = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    try:
+        with checkpoint_file, mmap.mmap(checkpoint_file.fileno(), 0,
+                                        access=mmap.ACCESS_READ) as buf:
+            return parse_checkpoint(buf)
+    except (ValueError, struct.error) as error:
+        print("Ignore the ACE checkpoint " + path + ": " + str(error))
+        return None
+
+
+def parse_checkpoint(buf) -> Checkpoint:
+    magic, format_version, last_committed, num_versions, num_metrics = \
+        HEADER.unpack_from(buf, 0)
+    if magic != MAGIC or format_version != FORMAT_VERSION:
+        raise ValueError("unknown format")
+    offset = HEADER.size
+    versions = {}
+    for _ in range(num_versions):
+        node_id, ts, length = VERSION_RECORD.unpack_from(buf, offset)
+        offset += VERSION_RECORD.size
+        if offset + length > len(buf):
+            raise ValueError("truncated result of node " + str(node_id))
+        versions[node_id] = (ts, buf[offset:offset + length])
+        offset += length
+    node_metrics = {}
+    for _ in range(num_metrics):
+        node_id, value = METRIC_RECORD.unpack_from(buf, offset)
+        offset += METRIC_RECORD.size
+        node_metrics[node_id] = value
+    return Checkpoint(last_committed, versions, node_metrics)
+
+
+def remove_checkpoint(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+# Checkpoints the committed state of every dashboard every `interval`
+# seconds, so that add_ds_state_manager can restore it after a restart
+class CheckpointWriter(Thread):
+    def __init__(self, interval: int, directory: str) -> None:
+        super().__init__(name="ace-checkpoint", daemon=True)
+        self.interval = interval
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.finish_event = Event()
+        self.stats_lock = Lock()
+        # last_committed of the last checkpoint of each dashboard
+        self.checkpointed_ts = {}
+        self.num_checkpoints = 0
+        self.finish = False
+
+    def run(self) -> None:
+        while not self.finish:
+            self.finish_event.wait(self.interval)
+            if not self.finish:
+                self.checkpoint_all()
+
+    def checkpoint_all(self) -> None:
+        for dash_id, ds_state_manager in list(ace_state_manager.items()):
+            try:
+                self.checkpoint_one(dash_id, ds_state_manager)
+            except Exception:  # pylint: disable=broad-except
+                traceback.print_exc()
+
+    def checkpoint_one(self, dash_id: int, ds_state_manager) -> None:
+        checkpoint = ds_state_manager.get_checkpoint()
+        if checkpoint is None or \
+            self.checkpointed_ts.get(dash_id, START_TS) == checkpoint.last_committed:
+            return
+        path = checkpoint_path(self.directory, dash_id)
+        write_checkpoint(path, checkpoint)
+        if ace_state_manager.get(dash_id, None) is not ds_state_manager:
+            # deleted in the meantime
+            remove_checkpoint(path)
+            return
+        self.stats_lock.acquire()
+        self.checkpointed_ts[dash_id] = checkpoint.last_committed
+        self.num_checkpoints += 1
+        self.stats_lock.release()
+
+    def forget(self, dash_id: int) -> None:
+        self.stats_lock.acquire()
+        self.checkpointed_ts.pop(dash_id, None)
+        self.stats_lock.release()
+        remove_checkpoint(checkpoint_path(self.directory, dash_id))
+
+    def get_stats(self) -> dict:
+        self.stats_lock.acquire()
+        stats = {"num_checkpoints": self.num_checkpoints,
+                 "checkpointed_ts": dict(self.checkpointed_ts)}
+        self.stats_lock.release()
+        return stats
+
+    def shut_down(self) -> None:
+        self.finish = True
+        self.finish_event.set()
@@ -0,0 +1,109 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from threading import Lock
+
+from superset.charts.schemas import ChartDataQueryContextSchema
+from superset.sql_parse import ParsedQuery
+from superset.utils.core import QuerySource
+
+# cost of a query whose database cannot estimate it
+DEFAULT_QUERY_COST = 1.0
+# the scheduler divides by the cost
+MIN_QUERY_COST = 0.01
+
+
+# A number out of the raw estimate of BaseEngineSpec.estimate_statement_cost,
+# whose keys depend on the engine
+def to_scalar_cost(raw_cost: dict) -> float:
+    if "Total cost" in raw_cost:  # Postgres
+        return float(raw_cost["Total cost"])
+    estimate = raw_cost.get("estimate", {})  # Presto, Trino
+    for key in ("cpuCost", "outputSizeInBytes", "outputRowCount"):
+        if key in estimate:
+            return float(estimate[key])
+    return DEFAULT_QUERY_COST
+
+
+# Estimates the refresh cost of charts with the EXPLAIN of the database of
+# their dataset. The EXPLAINs of a txn run concurrently on num_workers
+# threads, over one pooled engine per database and schema.
+class CostEstimator:
+    def __init__(self, num_workers: int) -> None:
+        self.executor = ThreadPoolExecutor(max_workers=max(1, num_workers),
+                                           thread_name_prefix="ace-cost")
+        self.engines = {}
+        self.engines_lock = Lock()
+        self.chart_data_query_context_schema = ChartDataQueryContextSchema()
+
+    def get_engine(self, database, schema: str):
+        key = (database.id, database.sqlalchemy_uri_decrypted, schema)
+        self.engines_lock.acquire()
+        engine = self.engines.get(key, None)
+        if engine is None:
+            engine = database.get_sqla_engine(schema=schema, nullpool=False,
+                                              source=QuerySource.DASHBOARD)
+            self.engines[key] = engine
+        self.engines_lock.release()
+        return engine
+
+    def estimate(self, app, chart_ids: set, charts_form_data: dict) -> dict:
+        futures = {chart_id: self.executor.submit(self.estimate_one, app,
+                                                  charts_form_data[chart_id])
+                   for chart_id in chart_ids if chart_id in charts_form_data}
+        chart_id_to_cost = {}
+        for chart_id, future in futures.items():
+            try:
+                chart_id_to_cost[chart_id] = future.result()
+            except Exception:  # pylint: disable=broad-except
+                traceback.print_exc()
+                chart_id_to_cost[chart_id] = DEFAULT_QUERY_COST
+        return chart_id_to_cost
+
+    def estimate_one(self, app, form_data: dict) -> float:
+        with app.app_context():
+            query_context = self.chart_data_query_context_schema.load(form_data)
+            queries = query_context.get_query_str()["queries"]
+            datasource = query_context.datasource
+            database = getattr(datasource, "database", None)
+            if database is None:
+                return DEFAULT_QUERY_COST * len(queries)
+            db_engine_spec = database.db_engine_spec
+            if not db_engine_spec.get_allow_cost_estimate(database.get_extra() or {}):
+                return DEFAULT_QUERY_COST * len(queries)
+            engine = self.get_engine(database, getattr(datasource, "schema", None))
+            cost = 0.0
+            with closing(engine.raw_connection()) as conn:
+                cursor = conn.cursor()
+                for query in queries:
+                    for statement in ParsedQuery(query["query"]).get_statements():
+                        statement = db_engine_spec.process_statement(
+                            statement, database, None)
+                        cost += to_scalar_cost(
+                            db_engine_spec.estimate_statement_cost(statement, cursor))
+        return max(cost, MIN_QUERY_COST)
+
+    def shut_down(self) -> None:
+        self.executor.shutdown(wait=False)
+        self.engines_lock.acquire()
+        for engine in self.engines.values():
+            engine.dispose()
+        self.engines = {}
+        self.engines_lock.release()
@@ -0,0 +1,162 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import json
+import os
+import time
+import traceback
+from threading import Lock
+
+EWMA_TIME = 0
+EWMA_ERROR = 1
+NUM_SAMPLES = 2
+EXPLAIN_COST = 3
+
+SAVE_INTERVAL = 30
+# the scheduler divides by the cost
+MIN_COST = 1e-3
+
+
+# Expected refresh time of each chart, learned from the wall time of its
+# refreshes with an exponentially weighted moving average. Until a chart
+# has min_samples samples, its estimate is blended with its EXPLAIN cost,
+# converted into seconds by the observed seconds per cost unit of the
+# charts of its database, as the cost units of the databases differ. The
+# model is shared by all dashboards of the process and saved to `path`, if
+# any.
+class ChartCostModel:
+    def __init__(self, alpha: float = 0.2, min_samples: int = 5,
+                 path: str = "") -> None:
+        self.alpha = alpha
+        self.min_samples = max(1, min_samples)
+        self.path = path
+        self.lock = Lock()
+        self.save_lock = Lock()
+        # chart_id -> [ewma of the time, ewma of the absolute error,
+        #              number of samples, last EXPLAIN cost]
+        self.charts = {}
+        # chart_id -> id of its database, as of its last prediction
+        self.chart_databases = {}
+        # str(database id) -> ewma of the seconds per EXPLAIN cost unit
+        self.secs_per_cost_unit = {}
+        self.last_save_time = time.time()
+        self.load()
+
+    def _ewma(self, old_value: float, value: float) -> float:
+        if old_value is None:
+            return value
+        return (1 - self.alpha) * old_value + self.alpha * value
+
+    def _predict(self, chart_id: int, explain_cost: float) -> float:
+        entry = self.charts.get(chart_id, None)
+        secs_per_cost_unit = self.secs_per_cost_unit.get(
+            str(self.chart_databases.get(chart_id, None)), None)
+        if explain_cost is None:
+            prior = None
+        elif secs_per_cost_unit is None:
+            prior = explain_cost
+        else:
+            prior = explain_cost * secs_per_cost_unit
+        if entry is None or entry[NUM_SAMPLES] == 0:
+            return prior
+        if prior is None:
+            return entry[EWMA_TIME]
+        weight = min(entry[NUM_SAMPLES] / self.min_samples, 1.0)
+        return weight * entry[EWMA_TIME] + (1 - weight) * prior
+
+    # the expected refresh time of chart_ids, given their EXPLAIN costs and
+    # the ids of their databases
+    def predict(self, chart_ids: set, chart_id_to_explain_cost: dict,
+                chart_databases: dict = None) -> dict:
+        chart_id_to_cost = {}
+        self.lock.acquire()
+        self.chart_databases.update(chart_databases or {})
+        for chart_id in chart_ids:
+            explain_cost = chart_id_to_explain_cost.get(chart_id, None)
+            entry = self.charts.setdefault(chart_id, [None, None, 0, None])
+            if explain_cost is not None:
+                entry[EXPLAIN_COST] = explain_cost
+            cost = self._predict(chart_id, entry[EXPLAIN_COST])
+            if cost is not None:
+                chart_id_to_cost[chart_id] = max(cost, MIN_COST)
+        self.lock.release()
+        return chart_id_to_cost
+
+    # An incremental refresh only queries the rows appended since the
+    # previous one: its time is the chart's, but says nothing about the
+    # seconds per cost unit of the EXPLAIN cost of the full query
+    def observe(self, chart_id: int, seconds: float,
+                incremental: bool = False) -> None:
+        self.lock.acquire()
+        entry = self.charts.setdefault(chart_id, [None, None, 0, None])
+        predicted = self._predict(chart_id, entry[EXPLAIN_COST])
+        if predicted is not None and entry[NUM_SAMPLES] > 0:
+            entry[EWMA_ERROR] = self._ewma(entry[EWMA_ERROR], abs(seconds - predicted))
+        entry[EWMA_TIME] = self._ewma(entry[EWMA_TIME], seconds)
+        entry[NUM_SAMPLES] += 1
+        if entry[EXPLAIN_COST] and not incremental:
+            key = str(self.chart_databases.get(chart_id, None))
+            self.secs_per_cost_unit[key] = self._ewma(
+                self.secs_per_cost_unit.get(key, None), seconds / entry[EXPLAIN_COST])
+        should_save = time.time() - self.last_save_time > SAVE_INTERVAL
+        self.lock.release()
+        if should_save:
+            self.save()
+
+    def get_stats(self) -> dict:
+        self.lock.acquire()
+        charts = {chart_id: {"estimate": self._predict(chart_id, entry[EXPLAIN_COST]),
+                             "mean_abs_error": entry[EWMA_ERROR],
+                             "num_samples": entry[NUM_SAMPLES],
+                             "explain_cost": entry[EXPLAIN_COST]}
+                  for chart_id, entry in self.charts.items()}
+        stats = {"secs_per_cost_unit": dict(self.secs_per_cost_unit),
+                 "charts": charts}
+        self.lock.release()
+        return stats
+
+    def load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as model_file:
+                model = json.load(model_file)
+            # a model saved with a single rate for all databases relearns them
+            if isinstance(model["secs_per_cost_unit"], dict):
+                self.secs_per_cost_unit = model["secs_per_cost_unit"]
+            self.charts = {int(chart_id): entry
+                           for chart_id, entry in model["charts"].items()}
+        except (OSError, ValueError, KeyError):
+            traceback.print_exc()
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        self.lock.acquire()
+        model = json.dumps({"secs_per_cost_unit": self.secs_per_cost_unit,
+                            "charts": self.charts})
+        self.last_save_time = time.time()
+        self.lock.release()
+        self.save_lock.acquire()
+        try:
+            with open(self.path + ".tmp", "w") as model_file:
+                model_file.write(model)
+            os.replace(self.path + ".tmp", self.path)
+        except OSError:
+            traceback.print_exc()
+        finally:
+            self.save_lock.release()
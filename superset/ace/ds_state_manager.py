@@ -16,16 +16,49 @@
 # under the License.
 
 import sys
+import time
 import random
-from typing import Tuple
+from bisect import bisect_right
+from collections import OrderedDict
+from threading import Condition
+from typing import Iterator, Tuple
 
 from superset.ace.view_graph import *
+from superset.ace.iv_counter import IVCounter, build_iv_counter
+from superset.ace.priority_queue import ChartPriorityQueue
+from superset.ace.k_controller import KController
+from superset.ace.viewport_predictor import (PREDICTOR_NONE,
+                                             build_viewport_predictor)
+from superset.ace.payload_store import (payload_store, serialize_payload,
+                                        deserialize_payload)
+
+MAX_IV_COUNTERS = 32
+# a chart predicted to enter the viewport with score 1 gets the priority of
+# PREDICTION_BOOST times the viewport time, or metric, of the most viewed chart
+PREDICTION_BOOST = 0.5
 
 
 def compute_iv_num(snapshot: dict) -> int:
     return sum(map(lambda ver: isinstance(ver, IV), snapshot.values()))
 
 
+# The JSON of {"ts": ts, "snapshot": to_basic_types(snapshot)}, stitched from
+# the fragments serialized when the versions were stored
+def to_json_bytes(ts: int, snapshot: dict) -> bytes:
+    parts = []
+    for node_id in snapshot:
+        version = snapshot[node_id]
+        if isinstance(version, Version):
+            fragment = version.fragment
+            if fragment is None:
+                fragment = serialize_payload(version.result)
+        else:
+            fragment = serialize_payload(version.to_basic_type_dict()["version_result"])
+        parts.append(b'"%d": {"ts": %d, "version_result": %s}'
+                     % (node_id, version.ts, fragment))
+    return b'{"ts": %d, "snapshot": {%s}}' % (ts, b", ".join(parts))
+
+
 def to_basic_types(snapshot: dict) -> dict:
     snapshot_with_basic_types = {}
     for node_id in snapshot:
@@ -39,11 +72,26 @@ class DashStateManager:
     def __init__(self, dependency_list: list) -> None:
         self.prop = PropertyCombination(1)
         self.k_relaxed = 0
+        # adjusts k_relaxed if set, see k_controller.py
+        self.k_controller = None
         self.opt_viewport = True
         self.opt_exec_time = True
         self.opt_metrics = True
         self.opt_skip_write = True
         self.enable_stats_cache = True
+        self.num_refresh_workers = 1
+        self.scheduler_weight = 1.0
+        self.opt_shared_scan = False
+        # datasource id -> watermark column, see incremental.py
+        self.watermark_columns = {}
+        self.incremental_states = {}
+        # admission control of new txns, see admit_txn
+        self.max_pending_txns = 0
+        self.admission_mode = ADMISSION_REJECT
+        self.last_commit_time = time.time()
+        self.commit_interval = 0.0
+        self.num_merged_txns = 0
+        self.num_rejected_txns = 0
         self.db_name = ""
         self.username = ""
         self.password = ""
@@ -58,83 +106,329 @@ class DashStateManager:
         for dependency in dependency_list:
             self.view_graph.insert(dependency)
         self.view_graph.create_initial_snapshot(START_TS)
-        self.num_ivs = {START_TS: 0}
+        self.num_ivs = TsCounters(START_TS)
+        self.num_ivs[START_TS] = 0
+        self.epoch = ReadEpoch(START_TS, START_TS, (0,))
+        # IV counters of the node sets read by LCMB/LCNB, in LRU order
+        self.iv_counters = OrderedDict()
 
         self.global_lock = Lock()
         self.meta_data_lock = Lock()
         self.cur_ts = START_TS
         self.node_metrics = {}
+        self.max_node_metric = 0
+        # the charts each active ts still has to schedule, by priority
+        self.pending_queues = {}
+        self.pending_costs = {}
+        self.node_to_pending_ts = {}
+        # the largest viewport time of the charts of each active ts
+        self.max_view_time = {}
+        # node id -> score of the charts about to enter the viewport, see
+        # viewport_predictor.py
+        self.viewport_predictor = None
+        self.predicted_nodes = {}
+
+        # version garbage collection, see clean_unused_versions
+        self.memory_budget = 0
+        self.gc_event = None
+        self.payload_bytes = 0
+        self.reclaimed_versions = 0
+        self.reclaimed_bytes = 0
+        self.gc_watermark = START_TS
+        self.is_released = False
+
+        # bumped by every new version or commit, see wait_for_new_versions
+        self.version_cond = Condition()
+        self.version_seq = 0
 
     # The following functions are used by WTXnManager
     def submit_one_txn(self, node_id_set: set,
                        node_ids_in_view_port: set,
                        duration: int) -> Tuple[int, list]:
         self.global_lock.acquire()
+        ts, ret_list = self._create_txn(node_id_set)
+        self.global_lock.release()
+        self._init_view_port_time(ts, ret_list, node_ids_in_view_port, duration)
+        return ts, ret_list
+
+    # Submits the txn only if it is admitted, see admit_txn, and returns None
+    # otherwise. The check and the ts allocation are atomic.
+    def try_submit_one_txn(self, node_id_set: set,
+                           node_ids_in_view_port: set,
+                           duration: int) -> Tuple[int, list]:
+        self.global_lock.acquire()
+        if not self._admit_txn(self.last_submitted - self.last_committed):
+            self.global_lock.release()
+            return None
+        ts, ret_list = self._create_txn(node_id_set)
+        self.global_lock.release()
+        self._init_view_port_time(ts, ret_list, node_ids_in_view_port, duration)
+        return ts, ret_list
+
+    # It must be called with global_lock held
+    def _create_txn(self, node_id_set: set) -> Tuple[int, list]:
         self.cur_ts = self.cur_ts + 1
         ts = self.cur_ts
         self.last_submitted = ts
         self.num_ivs[ts] = len(node_id_set)
         ret_list = self.view_graph.create_snapshot_placeholder(node_id_set, ts)
-        self.global_lock.release()
+        self._count_new_ivs(ret_list[NodeType.VIZ.value - 1], ts)
+        self._publish_epoch()
+        return ts, ret_list
 
+    def _init_view_port_time(self, ts: int, ret_list: list,
+                             node_ids_in_view_port: set, duration: int) -> None:
         self.meta_data_lock.acquire()
-        # initialize the view_port_time
-        self.view_port_time[ts] = {}
-        for node_group in ret_list:
-            for node_id in node_group:
-                if node_id in node_ids_in_view_port:
-                    self.view_port_time[ts][node_id] = duration
-                else:
-                    self.view_port_time[ts][node_id] = 0
+        # initialize the view_port_time of the charts, the only nodes
+        # that are scheduled: the charts of ts and the nonzero view times
+        viz_set = ret_list[NodeType.VIZ.value - 1]
+        view_port_time = {}
+        for node_id in viz_set:
+            if node_id in node_ids_in_view_port and duration != 0:
+                view_port_time[node_id] = duration
+            self.node_to_pending_ts.setdefault(node_id, set()).add(ts)
+        self.view_port_time[ts] = (viz_set, view_port_time)
+        self.max_view_time[ts] = max(view_port_time.values(), default=0)
         self.meta_data_lock.release()
 
-        return ts, ret_list
-
     def finish_one_update(self, node_id: int, ts: int, result: dict) -> None:
-        self.view_graph.add_version(node_id, ts, result)
+        payload = payload_store.put(result)
+        num_bytes = len(payload.fragment)
         self.global_lock.acquire()
+        node = self.view_graph.id_to_node[node_id]
+        is_iv = isinstance(node.get_version_by_snapshot(ts), IV)
+        replaced_version = self.view_graph.add_version(
+            node_id, ts, payload.result, num_bytes, payload.digest, payload.fragment)
+        if is_iv:
+            self._count_finished_iv(node, ts)
         self.num_ivs[ts] -= 1
+        # a result written again at the same ts replaces the older one
+        self.payload_bytes += num_bytes - self._release_payloads([replaced_version])
+        self._publish_epoch()
         self.global_lock.release()
+        self._notify_readers()
+        # a pass at the same watermark would not reclaim anything, e.g.,
+        # while a subscriber holds back the watermark
+        if self.is_over_memory_budget() and self.gc_event is not None and \
+            self.get_low_watermark() > self.gc_watermark:
+            self.gc_event.set()
 
     def commit_one_txn(self, ts: int) -> None:
+        self.global_lock.acquire()
         self.last_committed = ts
+        cur_time = time.time()
+        self.commit_interval += COMMIT_INTERVAL_ALPHA * \
+            (cur_time - self.last_commit_time - self.commit_interval)
+        self.last_commit_time = cur_time
+        self._publish_epoch()
+        self.global_lock.release()
+        self._notify_readers()
+
+        self.meta_data_lock.acquire()
+        for committed_ts in [cur_ts for cur_ts in self.view_port_time
+                             if cur_ts <= ts]:
+            for node_id in self.view_port_time.pop(committed_ts)[0]:
+                self._remove_pending_ts(node_id, committed_ts)
+            self.max_view_time.pop(committed_ts, None)
+            self.pending_queues.pop(committed_ts, None)
+            self.pending_costs.pop(committed_ts, None)
+        self.meta_data_lock.release()
+
+    # The following functions are used by the admission control of new txns.
+    # The queue depth is the number of submitted txns not committed yet.
+    def get_queue_depth(self) -> int:
+        epoch = self.epoch
+        return epoch.last_submitted - epoch.last_committed
+
+    def admit_txn(self) -> bool:
+        return self._admit_txn(self.get_queue_depth())
 
+    def _admit_txn(self, queue_depth: int) -> bool:
+        return self.max_pending_txns <= 0 or queue_depth < self.max_pending_txns
+
+    def count_merged_txn(self) -> None:
+        self.global_lock.acquire()
+        self.num_merged_txns += 1
+        self.global_lock.release()
+
+    def count_rejected_txn(self) -> None:
+        self.global_lock.acquire()
+        self.num_rejected_txns += 1
+        self.global_lock.release()
+
+    # seconds until the queue depth is expected to be below max_pending_txns
+    def get_retry_after(self) -> int:
+        num_commits = self.get_queue_depth() - self.max_pending_txns + 1
+        return max(1, int(round(num_commits * self.commit_interval)))
+
+    def get_impacted_charts(self, node_id_set: set) -> frozenset:
+        self.global_lock.acquire()
+        groups = self.view_graph.get_impacted_groups(node_id_set)
+        self.global_lock.release()
+        return groups[NodeType.VIZ.value - 1]
+
+    def get_admission_stats(self) -> dict:
+        return {"queue_depth": self.get_queue_depth(),
+                "max_pending_txns": self.max_pending_txns,
+                "admission_mode": self.admission_mode,
+                "commit_interval": self.commit_interval,
+                "merged_txns": self.num_merged_txns,
+                "rejected_txns": self.num_rejected_txns}
+
+    # The following functions let readers wait for new versions instead of
+    # polling
+    def _notify_readers(self) -> None:
+        self.version_cond.acquire()
+        self.version_seq += 1
+        self.version_cond.notify_all()
+        self.version_cond.release()
+
+    def wait_for_new_versions(self, seq: int, timeout: float) -> int:
+        self.version_cond.acquire()
+        self.version_cond.wait_for(
+            lambda: self.version_seq != seq or self.is_released, timeout)
+        seq = self.version_seq
+        self.version_cond.release()
+        return seq
+
+    # Readers only see the state published here. It must be called
+    # with global_lock held.
+    def _publish_epoch(self) -> None:
+        num_ivs = self.num_ivs.get_range(self.last_committed, self.last_submitted)
+        self.epoch = ReadEpoch(self.last_committed, self.last_submitted, num_ivs)
+
+    # The following functions maintain self.iv_counters. They must be called
+    # with global_lock held.
+    def _count_new_ivs(self, viz_set: set, ts: int) -> None:
+        for node_id_set, iv_counter in self.iv_counters.items():
+            iv_counter.lock.acquire()
+            iv_counter.extend(ts)
+            for node_id in viz_set & node_id_set:
+                iv_flags = self.view_graph.id_to_node[node_id].versions.iv_flags
+                # an IV following another IV does not change the count
+                if len(iv_flags) < 2 or not iv_flags[-2]:
+                    iv_counter.add(ts, None, 1)
+            iv_counter.lock.release()
+
+    def _count_finished_iv(self, node: Node, ts: int) -> None:
+        ts_list = node.versions.ts_list
+        idx = bisect_right(ts_list, ts)
+        next_ts = ts_list[idx] - 1 if idx < len(ts_list) else None
+        for node_id_set, iv_counter in self.iv_counters.items():
+            if node.node_id in node_id_set:
+                iv_counter.lock.acquire()
+                iv_counter.add(ts, next_ts, -1)
+                iv_counter.lock.release()
+
+    def _get_iv_counter(self, node_id_set: set) -> IVCounter:
+        key = frozenset(node_id_set)
+        iv_counter = self.iv_counters.get(key, None)
+        if iv_counter is not None:
+            return iv_counter
+        self.global_lock.acquire()
+        iv_counter = self.iv_counters.get(key, None)
+        if iv_counter is None:
+            nodes = [self.view_graph.id_to_node[node_id] for node_id in key]
+            iv_counter = build_iv_counter(nodes, self.last_submitted)
+            self.iv_counters[key] = iv_counter
+            if len(self.iv_counters) > MAX_IV_COUNTERS:
+                self.iv_counters.popitem(last=False)
+        else:
+            self.iv_counters.move_to_end(key)
+        self.global_lock.release()
+        return iv_counter
+
+    # the charts in the order of the dependency list, which follows the layout
+    # of the dashboard, see add_ds_state_manager
+    def get_chart_order(self) -> list:
+        return [node_id for node_id, node in self.view_graph.id_to_node.items()
+                if node.node_type == NodeType.VIZ]
+
+    # Pops the pending chart of ts of the highest priority among
+    # ready_node_ids, or among all of node_ids if it is None. node_ids are all
+    # the charts ts still has to refresh: the queue is built from them, and
+    # the charts not ready, e.g., whose database has no free query slot, keep
+    # their place in it.
     def get_top_priority_node(self, ts: int, node_ids: set,
-                              chart_id_to_cost: dict) -> int:
-        if self.opt_metrics:
-            ret_node_ids = set()
-            ret_node_metric = 0
+                              chart_id_to_cost: dict,
+                              ready_node_ids: set = None) -> int:
+        self.meta_data_lock.acquire()
+        pending_queue = self.pending_queues.get(ts, None)
+        if pending_queue is None:
+            # build the queue when the scheduler starts on this ts, which is
+            # when the refresh cost is known
+            self.pending_costs[ts] = chart_id_to_cost
+            pending_queue = ChartPriorityQueue()
+            self.pending_queues[ts] = pending_queue
             for node_id in node_ids:
-                if node_id in self.node_metrics:
-                    if self.node_metrics[node_id] > ret_node_metric:
-                        ret_node_ids = set()
-                    if self.node_metrics[node_id] >= ret_node_metric:
-                        ret_node_ids.add(node_id)
-                        ret_node_metric = self.node_metrics[node_id]
-            if len(ret_node_ids) == 0:
-                ret_node_ids = node_ids
-            return random.choice(tuple(ret_node_ids))
+                pending_queue.update(node_id, self._node_priority(ts, node_id))
+        ret_node_id = pending_queue.pop(ready_node_ids)
+        # charts no longer in node_ids were skipped by the scheduler
+        while ret_node_id is not None and ret_node_id not in node_ids:
+            self._remove_pending_ts(ret_node_id, ts)
+            ret_node_id = pending_queue.pop(ready_node_ids)
+        if ret_node_id is None:
+            ret_node_id = random.choice(tuple(
+                node_ids if ready_node_ids is None else ready_node_ids))
+            pending_queue.remove(ret_node_id)
+        self._remove_pending_ts(ret_node_id, ts)
+        self.meta_data_lock.release()
+        return ret_node_id
 
-        if not self.opt_viewport and not self.opt_exec_time:
-            return random.choice(tuple(node_ids))
+    # the charts ts no longer refreshes, e.g., refreshed again by a newer txn
+    # or in the shared scan of another chart
+    def remove_pending_nodes(self, ts: int, node_ids) -> None:
         self.meta_data_lock.acquire()
-        max_priority = -1
-        ret_node_id = -1
+        pending_queue = self.pending_queues.get(ts, None)
         for node_id in node_ids:
-            if not self.opt_viewport:
-                cur_view_time = 1
-            else:
-                cur_view_time = self.view_port_time[ts][node_id]
-            if node_id not in chart_id_to_cost:
-                cur_execute_cost = 1
-            else:
-                cur_execute_cost = chart_id_to_cost[node_id]
-            cur_priority = float(cur_view_time) / float(cur_execute_cost)
-            if cur_priority > max_priority:
-                max_priority = cur_priority
-                ret_node_id = node_id
+            if pending_queue is not None:
+                pending_queue.remove(node_id)
+            self._remove_pending_ts(node_id, ts)
         self.meta_data_lock.release()
-        return ret_node_id
+
+    # The following functions must be called with meta_data_lock held
+    def _node_priority(self, ts: int, node_id: int) -> float:
+        score = self.predicted_nodes.get(node_id, 0.0)
+        if self.opt_metrics:
+            return float(self.node_metrics.get(node_id, 0)) + \
+                self._prediction_boost(score, self.max_node_metric)
+        if not self.opt_viewport and not self.opt_exec_time:
+            return 0.0
+        if not self.opt_viewport:
+            cur_view_time = 1
+        else:
+            cur_view_time = self.view_port_time[ts][1].get(node_id, 0) + \
+                self._prediction_boost(score, self.max_view_time.get(ts, 0))
+        cur_execute_cost = self.pending_costs.get(ts, {}).get(node_id, 1)
+        return float(cur_view_time) / float(cur_execute_cost)
+
+    def _update_priority(self, node_id: int) -> None:
+        for ts in self.node_to_pending_ts.get(node_id, ()):
+            pending_queue = self.pending_queues.get(ts, None)
+            if pending_queue is not None and node_id in pending_queue:
+                pending_queue.update(node_id, self._node_priority(ts, node_id))
+
+    # The boost grows with the largest metric, which keeps growing, so that
+    # the prediction still counts once the charts were viewed for long
+    @staticmethod
+    def _prediction_boost(score: float, max_metric: float) -> float:
+        return score * PREDICTION_BOOST * max(max_metric, 1)
+
+    def _predict_view_port(self, node_id_set: set) -> None:
+        old_predicted_nodes = self.predicted_nodes
+        if self.viewport_predictor.observe(frozenset(node_id_set)):
+            self.predicted_nodes = self.viewport_predictor.predict()
+        # the boosts follow the largest metric even if the prediction did not
+        # change
+        for node_id in old_predicted_nodes.keys() | self.predicted_nodes.keys():
+            self._update_priority(node_id)
+
+    def _remove_pending_ts(self, node_id: int, ts: int) -> None:
+        pending_ts_set = self.node_to_pending_ts.get(node_id, None)
+        if pending_ts_set is not None:
+            pending_ts_set.discard(ts)
+            if len(pending_ts_set) == 0:
+                del self.node_to_pending_ts[node_id]
 
     # The following functions are used by RTxnManager
     def config_state_manager(self, prop_comb: int,
@@ -148,17 +442,41 @@ class DashStateManager:
                              username: str,
                              password: str,
                              host: str,
-                             port: str) -> None:
+                             port: str,
+                             num_refresh_workers: int = 1,
+                             scheduler_weight: float = 1.0,
+                             opt_shared_scan: bool = False,
+                             watermark_columns: dict = None,
+                             max_pending_txns: int = 0,
+                             admission_mode: str = ADMISSION_REJECT,
+                             adaptive_k: bool = False,
+                             target_invisibility: float = 0.1,
+                             target_staleness: float = 0.1,
+                             viewport_predictor: str = PREDICTOR_NONE) -> None:
         self.prop = PropertyCombination(prop_comb)
         self.k_relaxed = k_relaxed
+        self.k_controller = None
+        if adaptive_k:
+            self.k_controller = KController(k_relaxed, target_invisibility,
+                                            target_staleness)
         self.opt_viewport = opt_viewport
         self.opt_exec_time = opt_exec_time
         self.opt_metrics = opt_metrics
         self.opt_skip_write = opt_skip_write
         self.enable_stats_cache = enable_stats_cache
+        self.num_refresh_workers = num_refresh_workers
+        self.scheduler_weight = scheduler_weight
+        self.opt_shared_scan = opt_shared_scan
+        self.watermark_columns = {int(datasource_id): column for datasource_id, column
+                                  in (watermark_columns or {}).items()}
+        self.max_pending_txns = max_pending_txns
+        self.admission_mode = admission_mode
+        self.meta_data_lock.acquire()
+        self.viewport_predictor = build_viewport_predictor(viewport_predictor,
+                                                           self.get_chart_order())
+        self.predicted_nodes = {}
+        self.meta_data_lock.release()
 
-        if db_name == "":
-            self.opt_exec_time = False
         self.db_name = db_name
         self.username = username
         self.password = password
@@ -166,27 +484,80 @@ class DashStateManager:
         self.port = port
 
     def read_view_port(self, node_id_set: set, duration: int) -> dict:
-        self.global_lock.acquire()
-        last_committed = self.last_committed
-        last_submitted = self.last_submitted
+        ts, snapshot = self._read_view_port(node_id_set, duration)
+        return {"ts": ts, "snapshot": to_basic_types(snapshot)}
+
+    # same as read_view_port, but already serialized
+    def read_view_port_json(self, node_id_set: set, duration: int) -> bytes:
+        ts, snapshot = self._read_view_port(node_id_set, duration)
+        return to_json_bytes(ts, snapshot)
+
+    # Same as read_view_port_json, but blocks until the read returns a ts
+    # newer than last_ts or a changed version, or until timeout seconds
+    # have passed
+    def subscribe_view_port_json(self, node_id_set: set, last_ts: int,
+                                 duration: int, timeout: float) -> bytes:
+        ts, snapshot = self._subscribe_view_port(node_id_set, last_ts,
+                                                 duration, timeout)
+        return to_json_bytes(ts, snapshot)
+
+    # Yields the serialized snapshot deltas of node_id_set as they are
+    # produced, or None after timeout seconds without any, until max_duration
+    # seconds have passed or the dashboard state is released
+    def stream_view_port_json(self, node_id_set: set, last_ts: int, duration: int,
+                              timeout: float, max_duration: float) -> Iterator[bytes]:
+        deadline = time.time() + max_duration
+        while not self.is_released:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return
+            ts, snapshot = self._subscribe_view_port(node_id_set, last_ts, duration,
+                                                     min(timeout, remaining))
+            if ts > last_ts or len(snapshot) != 0:
+                last_ts = ts
+                yield to_json_bytes(ts, snapshot)
+            else:
+                yield None
+
+    def _subscribe_view_port(self, node_id_set: set, last_ts: int,
+                             duration: int, timeout: float) -> tuple:
+        deadline = time.time() + timeout
+        while True:
+            seq = self.version_seq
+            ts, snapshot = self._read_view_port(node_id_set, duration)
+            # the viewport time is accounted once per subscription, not
+            # once per wake-up
+            duration = 0
+            remaining = deadline - time.time()
+            if ts > last_ts or len(snapshot) != 0 or remaining <= 0 \
+                or self.is_released:
+                return ts, snapshot
+            self.wait_for_new_versions(seq, remaining)
+
+    def _read_view_port(self, node_id_set: set, duration: int) -> tuple:
+        epoch = self.epoch
+        last_committed = epoch.last_committed
+        last_submitted = epoch.last_submitted
         ts_to_read = last_committed
         if self.prop == PropertyCombination.GCNB:
             for ts_to_read in reversed(range(last_committed, last_submitted + 1)):
-                if self.num_ivs[ts_to_read] <= self.k_relaxed:
+                if epoch.num_ivs[ts_to_read - last_committed] <= self.k_relaxed:
                     break
-        self.global_lock.release()
 
-        # update the view_port_time
+        # update the view_port_time of the charts still pending
         self.meta_data_lock.acquire()
-        for ts_active in range(last_committed + 1, last_submitted + 1):
-            for node_id in node_id_set:
-                if node_id in self.view_port_time[ts_active]:
-                    self.view_port_time[ts_active][node_id] += duration
         for node_id in node_id_set:
-            if node_id in self.node_metrics:
-                self.node_metrics[node_id] += duration
-            else:
-                self.node_metrics[node_id] = duration
+            metric = self.node_metrics.get(node_id, 0) + duration
+            self.node_metrics[node_id] = metric
+            self.max_node_metric = max(self.max_node_metric, metric)
+            for ts_active in self.node_to_pending_ts.get(node_id, ()):
+                view_port_time = self.view_port_time[ts_active][1]
+                view_port_time[node_id] = view_port_time.get(node_id, 0) + duration
+                self.max_view_time[ts_active] = max(self.max_view_time[ts_active],
+                                                    view_port_time[node_id])
+            self._update_priority(node_id)
+        if self.viewport_predictor is not None:
+            self._predict_view_port(node_id_set)
         self.meta_data_lock.release()
 
         if self.prop == PropertyCombination.ICNB:
@@ -194,37 +565,46 @@ class DashStateManager:
         elif self.prop == PropertyCombination.GCNB:
             snapshot = self.view_graph.read_snapshot(ts_to_read, node_id_set)
         elif self.prop == PropertyCombination.LCMB:
-            ts_lower_bound = self._ts_from_last_read(node_id_set)
-            ts_list = [ts for ts in range(ts_lower_bound, last_submitted + 1)]
-            ss_list = [self.view_graph.read_snapshot(ts, node_id_set) for ts in ts_list]
-            ret_ss = {}
-            ret_ts = START_TS - 1
-            min_iv = min([compute_iv_num(cur_ss) for cur_ss in ss_list])
-            for idx, cur_ss in enumerate(ss_list):
-                cur_ts = ts_list[idx]
-                cur_iv_num = compute_iv_num(cur_ss)
-                if cur_iv_num <= min_iv + self.k_relaxed and cur_ts > ret_ts:
-                    ret_ts = cur_ts
-                    ret_ss = cur_ss
-            snapshot = ret_ss
+            iv_counter = self._get_iv_counter(node_id_set)
+            ts_lower_bound = max(self._ts_from_last_read(node_id_set),
+                                 iv_counter.base_ts)
+            ts_lower_bound = min(ts_lower_bound, last_submitted)
+            iv_counter.lock.acquire()
+            min_iv = iv_counter.range_min(ts_lower_bound, last_submitted)
+            ts_to_read = iv_counter.last_leq(ts_lower_bound, last_submitted,
+                                             min_iv + self.k_relaxed)
+            iv_counter.lock.release()
+            snapshot = self.view_graph.read_snapshot(ts_to_read, node_id_set)
         elif self.prop == PropertyCombination.GCPB:
             snapshot = self.view_graph.read_snapshot(last_submitted, node_id_set)
         else:  # C-M_A
-            ts_list = range(last_committed, last_submitted + 1)
-            ss_list = [self.view_graph.read_snapshot(ts, node_id_set)
-                       for ts in ts_list]
-            ret_ss = {}
-            ret_ts = START_TS - 1
-            for idx, cur_ss in enumerate(ss_list):
-                cur_ts = ts_list[idx]
-                cur_iv_num = compute_iv_num(cur_ss)
-                if cur_iv_num <= self.k_relaxed and cur_ts > ret_ts:
-                    ret_ts = cur_ts
-                    ret_ss = cur_ss
-            snapshot = ret_ss
-
-        return {"ts": last_committed,
-                "snapshot": to_basic_types(self._update_last_read(snapshot))}
+            iv_counter = self._get_iv_counter(node_id_set)
+            iv_counter.lock.acquire()
+            ts_to_read = iv_counter.last_leq(max(last_committed, iv_counter.base_ts),
+                                             last_submitted, self.k_relaxed)
+            iv_counter.lock.release()
+            if ts_to_read < START_TS:
+                snapshot = {}
+            else:
+                snapshot = self.view_graph.read_snapshot(ts_to_read, node_id_set)
+
+        if self.k_controller is not None and duration != 0 and len(snapshot) != 0:
+            self._adjust_k_relaxed(snapshot, epoch)
+        return last_committed, self._update_last_read(snapshot)
+
+    # A chart is stale if a newer txn than the one of its version refreshes it
+    def _adjust_k_relaxed(self, snapshot: dict, epoch: ReadEpoch) -> None:
+        num_iv = 0
+        num_stale = 0
+        id_to_node = self.view_graph.id_to_node
+        for node_id, version in snapshot.items():
+            if isinstance(version, IV):
+                num_iv += 1
+            elif version.ts < id_to_node[node_id].versions.ts_list[-1]:
+                num_stale += 1
+        self.k_relaxed = self.k_controller.observe(
+            num_iv, num_stale, len(snapshot),
+            epoch.last_submitted - epoch.last_committed, max(epoch.num_ivs))
 
     def _ts_from_last_read(self, node_id_set: set) -> int:
         ts_lower_bound = START_TS
@@ -242,11 +622,118 @@ class DashStateManager:
             if old_version is None or (not old_version.equal_ts(new_version)) \
                 or (old_version.equal_ts(new_version) and
                     isinstance(old_version, IV) and isinstance(new_version, Version)):
-                new_snapshot[node_id] = new_version
+                if isinstance(new_version, Version) and \
+                    new_version.equal_payload(old_version):
+                    new_snapshot[node_id] = UnchangedVersion(new_version.ts)
+                else:
+                    new_snapshot[node_id] = new_version
             self.last_read[node_id] = new_version
         return new_snapshot
 
     # The following functions are used by a garbage collector
-    def clean_unused_versions(self) -> None:
-        ls = self.last_submitted
-        self.view_graph.clean_unused_versions(ls)
+    def is_over_memory_budget(self) -> bool:
+        return 0 < self.memory_budget < self.payload_bytes
+
+    # the oldest ts that a reader or a pending txn may still read
+    def get_low_watermark(self) -> int:
+        watermark = self.epoch.last_committed
+        for version in list(self.last_read.values()):
+            if version.ts < watermark:
+                watermark = version.ts
+        return watermark
+
+    def clean_unused_versions(self) -> Tuple[int, int]:
+        self.global_lock.acquire()
+        if self.is_released:
+            self.global_lock.release()
+            return 0, 0
+        watermark = self.get_low_watermark()
+        removed_versions = self.view_graph.clean_unused_versions(watermark)
+        num_bytes = self._release_payloads(removed_versions)
+        self.num_ivs.discard_before(watermark)
+        if len(removed_versions) != 0:
+            # rebuilt on the next read, with a base ts at the watermark
+            self.iv_counters.clear()
+        self.payload_bytes -= num_bytes
+        self.reclaimed_versions += len(removed_versions)
+        self.reclaimed_bytes += num_bytes
+        self.gc_watermark = watermark
+        self.global_lock.release()
+        return len(removed_versions), num_bytes
+
+    def release_all_payloads(self) -> None:
+        self.global_lock.acquire()
+        if not self.is_released:
+            for node in self.view_graph.id_to_node.values():
+                self._release_payloads(node.versions.payloads)
+        self.is_released = True
+        self.payload_bytes = 0
+        self.global_lock.release()
+        # end the subscriptions of the deleted dashboard
+        self._notify_readers()
+
+    @staticmethod
+    def _release_payloads(versions: list) -> int:
+        num_bytes = 0
+        for version in versions:
+            if isinstance(version, Version) and version.digest is not None:
+                payload_store.release(version.digest)
+                num_bytes += version.num_bytes
+        return num_bytes
+
+    # The following functions are used by a CheckpointWriter. A checkpoint
+    # holds the committed version of each node.
+    def get_checkpoint(self) -> Checkpoint:
+        self.global_lock.acquire()
+        last_committed = self.epoch.last_committed
+        versions = {}
+        for node_id, node in self.view_graph.id_to_node.items():
+            version = node.get_version_by_snapshot(last_committed)
+            if isinstance(version, Version) and version.ts > START_TS:
+                fragment = version.fragment
+                if fragment is None:
+                    fragment = serialize_payload(version.result)
+                versions[node_id] = (version.ts, fragment)
+        self.global_lock.release()
+        if last_committed == START_TS:
+            return None
+        self.meta_data_lock.acquire()
+        node_metrics = dict(self.node_metrics)
+        self.meta_data_lock.release()
+        return Checkpoint(last_committed, versions, node_metrics)
+
+    # Must be called before the first txn. The nodes that are not in the
+    # dashboard any more are ignored.
+    def restore_checkpoint(self, checkpoint: Checkpoint) -> None:
+        self.global_lock.acquire()
+        ts = checkpoint.last_committed
+        self.cur_ts = ts
+        self.last_submitted = ts
+        self.last_committed = ts
+        self.num_ivs = TsCounters(ts)
+        self.num_ivs[ts] = 0
+        for node_id, (version_ts, fragment) in checkpoint.versions.items():
+            if node_id not in self.view_graph.id_to_node:
+                continue
+            payload = payload_store.put(deserialize_payload(fragment))
+            replaced_version = self.view_graph.add_version(
+                node_id, version_ts, payload.result, len(payload.fragment),
+                payload.digest, payload.fragment)
+            self.payload_bytes += len(payload.fragment) - \
+                self._release_payloads([replaced_version])
+        self._publish_epoch()
+        self.global_lock.release()
+
+        self.meta_data_lock.acquire()
+        for node_id, value in checkpoint.node_metrics.items():
+            if node_id in self.view_graph.id_to_node:
+                self.node_metrics[node_id] = value
+                self.max_node_metric = max(self.max_node_metric, value)
+        self.meta_data_lock.release()
+
+    def get_gc_stats(self) -> dict:
+        return {"watermark": self.gc_watermark,
+                "payload_bytes": self.payload_bytes,
+                "memory_budget": self.memory_budget,
+                "reclaimed_versions": self.reclaimed_versions,
+                "reclaimed_bytes": self.reclaimed_bytes}
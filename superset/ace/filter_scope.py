@@ -0,0 +1,144 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+import zlib
+
+ROOT_COMPONENT_ID = "ROOT_ID"
+CHART_COMPONENT_TYPE = "CHART"
+FILTER_BOX_VIZ_TYPE = "filter_box"
+# form data flag of a filter box -> the time column it filters on
+FILTER_BOX_TIME_COLUMNS = {"date_filter": "__time_range",
+                           "show_sqla_time_column": "__time_col",
+                           "show_sqla_time_granularity": "__time_grain",
+                           "show_druid_time_granularity": "__granularity",
+                           "show_druid_time_origin": "druid_time_origin"}
+
+
+# Filters are FILTER nodes of the view graph with an edge to every chart in
+# their scope, so that refreshing a filter only invalidates those charts.
+# Filter ids are strings; their node ids are negative so that they do not
+# collide with the ids of charts and datasources, and stable so that every
+# process derives the same ones.
+def get_filter_node_id(filter_id: str) -> int:
+    return -(zlib.crc32(filter_id.encode("utf-8")) + 1)
+
+
+# The ids of the charts in the layout component component_id of position
+def get_charts_under(position: dict, component_id: str) -> set:
+    chart_ids = set()
+    pending = [component_id]
+    visited = set()
+    while len(pending) != 0:
+        cur_id = pending.pop()
+        component = position.get(cur_id, None)
+        if cur_id in visited or not isinstance(component, dict):
+            continue
+        visited.add(cur_id)
+        if component.get("type") == CHART_COMPONENT_TYPE:
+            chart_id = component.get("meta", {}).get("chartId", None)
+            if chart_id is not None:
+                chart_ids.add(int(chart_id))
+        pending.extend(component.get("children", []))
+    return chart_ids
+
+
+# The ids of the charts of position in reading order, i.e., in the order of
+# the children of each layout component
+def get_chart_order(position: dict) -> list:
+    chart_ids = []
+    pending = [ROOT_COMPONENT_ID]
+    visited = set()
+    while len(pending) != 0:
+        cur_id = pending.pop()
+        component = position.get(cur_id, None)
+        if cur_id in visited or not isinstance(component, dict):
+            continue
+        visited.add(cur_id)
+        if component.get("type") == CHART_COMPONENT_TYPE:
+            chart_id = component.get("meta", {}).get("chartId", None)
+            if chart_id is not None:
+                chart_ids.append(int(chart_id))
+        pending.extend(reversed(component.get("children", [])))
+    return chart_ids
+
+
+def get_charts_in_scope(position: dict, chart_ids: set, root_path: list,
+                        excluded: list) -> set:
+    if len(position) == 0 or ROOT_COMPONENT_ID in root_path:
+        in_scope = set(chart_ids)
+    else:
+        in_scope = set()
+        for component_id in root_path:
+            in_scope |= get_charts_under(position, component_id)
+    return (in_scope & chart_ids) - {int(chart_id) for chart_id in excluded}
+
+
+# The columns the filter box with form_data filters on, like the keys
+# convert_filter_scopes gives them in filter_scopes
+def get_filter_box_columns(form_data: dict) -> list:
+    columns = [column for flag, column in FILTER_BOX_TIME_COLUMNS.items()
+               if form_data.get(flag)]
+    for config in form_data.get("filter_configs", None) or []:
+        column = config.get("column", None)
+        if isinstance(column, str):
+            columns.append(column)
+    return columns
+
+
+# filter id -> ids of the charts in its scope, for the native filters of
+# json_metadata and the columns of the filter boxes, where filter_box_columns
+# maps the chart id of each filter box to its columns
+def get_filter_scopes(json_metadata: dict, position: dict, chart_ids: set,
+                      filter_box_columns: dict = None) -> dict:
+    filter_scopes = {}
+    for native_filter in json_metadata.get("native_filter_configuration", None) or []:
+        filter_id = native_filter.get("id", None)
+        if filter_id is None:
+            continue
+        charts_in_scope = native_filter.get("chartsInScope", None)
+        if charts_in_scope is not None:
+            filter_scopes[filter_id] = {int(chart_id) for chart_id in charts_in_scope} \
+                & chart_ids
+            continue
+        scope = native_filter.get("scope", None) or {}
+        filter_scopes[filter_id] = get_charts_in_scope(
+            position, chart_ids, scope.get("rootPath", [ROOT_COMPONENT_ID]),
+            scope.get("excluded", []))
+    # a filter box without filter_scopes, saved before they existed, filters
+    # all the other charts but the immune ones, as after convert_filter_scopes
+    filter_box_scopes = dict(json_metadata.get("filter_scopes", None) or {})
+    immune = [int(chart_id) for chart_id
+              in json_metadata.get("filter_immune_slices", None) or []]
+    immune_by_column = {}
+    for chart_id, columns in (json_metadata.get("filter_immune_slice_fields", None)
+                              or {}).items():
+        for column in columns:
+            immune_by_column.setdefault(column, []).append(int(chart_id))
+    for filter_chart_id, columns in (filter_box_columns or {}).items():
+        if str(filter_chart_id) not in filter_box_scopes:
+            filter_box_scopes[str(filter_chart_id)] = {
+                column: {"scope": [ROOT_COMPONENT_ID],
+                         "immune": immune + immune_by_column.get(column, [])}
+                for column in columns}
+    # a filter box filters the other charts on each of its columns
+    for filter_chart_id, columns in filter_box_scopes.items():
+        for column, scope in columns.items():
+            in_scope = get_charts_in_scope(
+                position, chart_ids, scope.get("scope", [ROOT_COMPONENT_ID]),
+                scope.get("immune", []))
+            in_scope.discard(int(filter_chart_id))
+            filter_scopes[f"{filter_chart_id}_{column}"] = in_scope
+    return filter_scopes
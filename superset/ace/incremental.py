@@ -0,0 +1,167 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+import copy
+import json
+from typing import NamedTuple
+
+import pandas as pd
+
+from superset.utils.core import get_metric_name
+from superset.ace.shared_scan import (ROLLUP_FUNCTIONS, get_order_label,
+                                      has_having, rollup_groups,
+                                      finalize_chart_payload)
+
+# label of the max watermark of each group in the partial aggregates
+WATERMARK_LABEL = "__ace_watermark"
+AVG_SUM_SUFFIX = "__ace_sum"
+AVG_COUNT_SUFFIX = "__ace_count"
+
+
+# Partial aggregates of a chart over the rows of its datasource whose
+# watermark column is at most watermark. df holds one row per group with the
+# partial aggregates of every metric, without ordering or row limit.
+class IncrementalState(NamedTuple):
+    key: str
+    watermark: object
+    df: pd.DataFrame
+
+
+# Charts over a datasource that is only appended to, in the increasing order
+# of its watermark column, are maintained incrementally: the refresh of a
+# chart only aggregates the rows above the watermark of its IncrementalState,
+# merges them into its partial aggregates and computes the chart result from
+# them. SUM, COUNT, MIN and MAX merge as in a shared scan, AVG is kept as a
+# SUM and a COUNT.
+def get_partial_metrics(metric) -> list:
+    if not isinstance(metric, dict) or metric.get("expressionType") != "SIMPLE":
+        return None
+    aggregate = str(metric.get("aggregate", "")).upper()
+    label = get_metric_name(metric)
+    if aggregate == "AVG":
+        return [(dict(metric, aggregate="SUM", label=label + AVG_SUM_SUFFIX,
+                      hasCustomLabel=True), "sum"),
+                (dict(metric, aggregate="COUNT", label=label + AVG_COUNT_SUFFIX,
+                      hasCustomLabel=True), "sum")]
+    if aggregate not in ROLLUP_FUNCTIONS:
+        return None
+    return [(dict(metric, label=label, hasCustomLabel=True),
+             ROLLUP_FUNCTIONS[aggregate])]
+
+
+# The IncrementalState of a chart is reused iff its key did not change; None
+# if the chart cannot be maintained incrementally
+def get_incremental_key(form_data: dict, watermark_column: str) -> str:
+    if form_data is None or watermark_column is None or \
+        form_data.get("result_format", "json") != "json" or \
+        form_data.get("result_type", "full") != "full":
+        return None
+    queries = form_data.get("queries", [])
+    if len(queries) != 1:
+        return None
+    query = queries[0]
+    if query.get("is_timeseries") or query.get("granularity") or \
+        query.get("post_processing") or query.get("time_offsets") or \
+        has_having(query):
+        return None
+    metrics = query.get("metrics", None)
+    columns = query.get("columns", [])
+    if not metrics or any(get_partial_metrics(metric) is None for metric in metrics):
+        return None
+    if any(not isinstance(column, str) for column in columns):
+        return None
+    labels = set(columns) | {get_metric_name(metric) for metric in metrics}
+    if any(get_order_label(order_by) not in labels
+           for order_by, _ in query.get("orderby", [])):
+        return None
+    # the ordering and row limit are applied to the merged aggregates
+    state_query = {key: value for key, value in query.items()
+                   if key not in ("orderby", "row_limit")}
+    return json.dumps([form_data.get("datasource"), watermark_column, state_query],
+                      sort_keys=True, default=str)
+
+
+# The query of the partial aggregates of the rows above watermark, or of all
+# the rows if watermark is None. Rows appended late, with a watermark at or
+# below the one of the state, are not counted until the state is rebuilt, i.e.,
+# until the chart's query changes or ACE restarts.
+def build_incremental_form_data(form_data: dict, watermark_column: str,
+                                watermark, row_limit: int) -> dict:
+    form_data = copy.deepcopy(form_data)
+    query = form_data["queries"][0]
+    metrics = []
+    for metric in query["metrics"]:
+        metrics.extend(partial for partial, _ in get_partial_metrics(metric))
+    metrics.append({"expressionType": "SIMPLE",
+                    "aggregate": "MAX",
+                    "column": {"column_name": watermark_column},
+                    "label": WATERMARK_LABEL,
+                    "hasCustomLabel": True})
+    query["metrics"] = metrics
+    query["orderby"] = []
+    query["row_limit"] = row_limit
+    if watermark is not None:
+        query["filters"] = list(query.get("filters", [])) + \
+            [{"col": watermark_column, "op": ">", "val": watermark}]
+    return form_data
+
+
+def get_partial_rollup(form_data: dict) -> dict:
+    rollup = {}
+    for metric in form_data["queries"][0]["metrics"]:
+        for partial, function in get_partial_metrics(metric):
+            rollup[partial["label"]] = function
+    rollup[WATERMARK_LABEL] = "max"
+    return rollup
+
+
+# The IncrementalState after merging the partial aggregates of the delta
+# rows in payload into state, or the first one if state is None
+def merge_incremental_state(state: IncrementalState, key: str, payload: dict,
+                            form_data: dict) -> IncrementalState:
+    columns = list(form_data["queries"][0].get("columns", []))
+    rollup = get_partial_rollup(form_data)
+    delta_df = pd.DataFrame(payload["data"], columns=payload["colnames"])
+    delta_df = delta_df[columns + list(rollup)]
+    if state is None:
+        df = delta_df
+    elif len(delta_df.index) == 0:
+        return state
+    else:
+        df = rollup_groups(pd.concat([state.df, delta_df], ignore_index=True),
+                           columns, rollup)
+    watermark = df[WATERMARK_LABEL].max() if len(df.index) != 0 else None
+    if pd.isna(watermark):
+        watermark = state.watermark if state is not None else None
+    elif hasattr(watermark, "item"):
+        watermark = watermark.item()
+    return IncrementalState(key, watermark, df)
+
+
+# The query result of a chart out of its IncrementalState
+def build_incremental_result(payload: dict, state: IncrementalState,
+                             form_data: dict) -> dict:
+    query = form_data["queries"][0]
+    columns = list(query.get("columns", []))
+    df = state.df[columns].copy()
+    for metric in query["metrics"]:
+        label = get_metric_name(metric)
+        if str(metric.get("aggregate", "")).upper() == "AVG":
+            count = state.df[label + AVG_COUNT_SUFFIX]
+            df[label] = state.df[label + AVG_SUM_SUFFIX] / count.where(count != 0)
+        else:
+            df[label] = state.df[label]
+    return finalize_chart_payload(payload, df, query)
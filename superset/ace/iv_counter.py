@@ -0,0 +1,153 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+from threading import Lock
+
+from superset.ace.util_class import START_TS
+
+
+# Number of IVs per ts for a fixed set of nodes, i.e., compute_iv_num of
+# read_snapshot(ts, node_id_set) for every ts from base_ts on. It is a
+# segment tree with lazy range-add and range-min so that both maintaining
+# the counts and choosing the snapshot to read take O(log(#ts)).
+#
+# Ranges are inclusive; an add without an upper bound also applies to the
+# ts that have not been submitted yet (tracked by `tail`).
+class IVCounter:
+    def __init__(self, base_ts: int, last_ts: int, values: list) -> None:
+        self.base_ts = base_ts
+        self.tail = values[-1] if len(values) != 0 else 0
+        self.size = 1
+        self.min_tree = []
+        self.lazy = []
+        self.lock = Lock()
+        self._build(values, last_ts)
+
+    def _build(self, values: list, last_ts: int) -> None:
+        size = 1
+        while size < last_ts - self.base_ts + 1:
+            size *= 2
+        leaves = values + [self.tail] * (size - len(values))
+        self.size = size
+        self.min_tree = [0] * size + leaves
+        self.lazy = [0] * (2 * size)
+        for node in reversed(range(1, size)):
+            self.min_tree[node] = min(self.min_tree[2 * node],
+                                      self.min_tree[2 * node + 1])
+
+    def _values(self) -> list:
+        for node in range(1, self.size):
+            self._push(node)
+        return self.min_tree[self.size:]
+
+    def extend(self, last_ts: int) -> None:
+        if last_ts - self.base_ts + 1 > self.size:
+            self._build(self._values(), last_ts)
+
+    def add(self, lo_ts: int, hi_ts: int, delta: int) -> None:
+        if hi_ts is None:
+            self.tail += delta
+            hi = self.size - 1
+        else:
+            hi = hi_ts - self.base_ts
+        lo = max(lo_ts - self.base_ts, 0)
+        if lo <= hi:
+            self._add(1, 0, self.size - 1, lo, hi, delta)
+
+    def range_min(self, lo_ts: int, hi_ts: int) -> int:
+        return self._min(1, 0, self.size - 1,
+                         lo_ts - self.base_ts, hi_ts - self.base_ts)
+
+    # the largest ts in [lo_ts, hi_ts] with at most `bound` IVs
+    def last_leq(self, lo_ts: int, hi_ts: int, bound: int) -> int:
+        idx = self._last_leq(1, 0, self.size - 1,
+                             lo_ts - self.base_ts, hi_ts - self.base_ts, bound)
+        if idx < 0:
+            return START_TS - 1
+        return idx + self.base_ts
+
+    def _apply(self, node: int, delta: int) -> None:
+        self.min_tree[node] += delta
+        if node < self.size:
+            self.lazy[node] += delta
+
+    def _push(self, node: int) -> None:
+        if self.lazy[node] != 0:
+            self._apply(2 * node, self.lazy[node])
+            self._apply(2 * node + 1, self.lazy[node])
+            self.lazy[node] = 0
+
+    def _add(self, node: int, left: int, right: int,
+             lo: int, hi: int, delta: int) -> None:
+        if hi < left or right < lo:
+            return
+        if lo <= left and right <= hi:
+            self._apply(node, delta)
+            return
+        self._push(node)
+        mid = (left + right) // 2
+        self._add(2 * node, left, mid, lo, hi, delta)
+        self._add(2 * node + 1, mid + 1, right, lo, hi, delta)
+        self.min_tree[node] = min(self.min_tree[2 * node],
+                                  self.min_tree[2 * node + 1])
+
+    def _min(self, node: int, left: int, right: int, lo: int, hi: int) -> int:
+        if lo <= left and right <= hi:
+            return self.min_tree[node]
+        self._push(node)
+        mid = (left + right) // 2
+        if hi <= mid:
+            return self._min(2 * node, left, mid, lo, hi)
+        if lo > mid:
+            return self._min(2 * node + 1, mid + 1, right, lo, hi)
+        return min(self._min(2 * node, left, mid, lo, hi),
+                   self._min(2 * node + 1, mid + 1, right, lo, hi))
+
+    def _last_leq(self, node: int, left: int, right: int,
+                  lo: int, hi: int, bound: int) -> int:
+        if hi < left or right < lo or self.min_tree[node] > bound:
+            return -1
+        if left == right:
+            return left
+        self._push(node)
+        mid = (left + right) // 2
+        idx = self._last_leq(2 * node + 1, mid + 1, right, lo, hi, bound)
+        if idx < 0:
+            idx = self._last_leq(2 * node, left, mid, lo, hi, bound)
+        return idx
+
+
+def build_iv_counter(nodes: list, last_ts: int) -> IVCounter:
+    base_ts = last_ts
+    for node in nodes:
+        ts_list = node.versions.ts_list
+        if len(ts_list) != 0 and ts_list[0] < base_ts:
+            base_ts = ts_list[0]
+    diffs = [0] * (last_ts - base_ts + 2)
+    for node in nodes:
+        ts_list, iv_flags, _, _ = node.versions.state
+        for idx in range(len(ts_list)):
+            if iv_flags[idx] and ts_list[idx] <= last_ts:
+                diffs[ts_list[idx] - base_ts] += 1
+                if idx + 1 < len(ts_list) and ts_list[idx + 1] <= last_ts:
+                    diffs[ts_list[idx + 1] - base_ts] -= 1
+    values = []
+    count = 0
+    for diff in diffs[:-1]:
+        count += diff
+        values.append(count)
+    return IVCounter(base_ts, last_ts, values)
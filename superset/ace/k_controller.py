@@ -0,0 +1,75 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+from threading import Lock
+
+# weight of the newest read in the moving averages of the controller
+READ_ALPHA = 0.1
+# number of reads between two adjustments of k
+ADJUST_INTERVAL = 16
+# k only goes up while the invisibility is below this fraction of its target,
+# so that it does not oscillate around the target
+HEADROOM = 0.5
+
+
+# Adjusts k_relaxed online so that the invisibility and the staleness of the
+# reads, as StatsCollector defines them, stay within their targets: the
+# fraction of the viewport time charts are shown as an IV, and the fraction
+# they are shown with an older result than the newest submitted refresh.
+# A larger k reads newer snapshots with more IVs, so k goes down while the
+# invisibility is above its target and up while the staleness is, as long as
+# there are pending txns a larger k could read.
+class KController:
+    def __init__(self, k_relaxed: int, target_invisibility: float,
+                 target_staleness: float) -> None:
+        self.k_relaxed = k_relaxed
+        self.target_invisibility = target_invisibility
+        self.target_staleness = target_staleness
+        self.invisibility = 0.0
+        self.staleness = 0.0
+        self.num_reads = 0
+        self.num_adjustments = 0
+        self.lock = Lock()
+
+    # max_iv is the max number of IVs of the ts a reader can choose from, a
+    # larger k changes nothing
+    def observe(self, num_iv: int, num_stale: int, num_nodes: int,
+                commit_lag: int, max_iv: int) -> int:
+        self.lock.acquire()
+        self.invisibility += READ_ALPHA * (num_iv / num_nodes - self.invisibility)
+        self.staleness += READ_ALPHA * (num_stale / num_nodes - self.staleness)
+        self.num_reads += 1
+        if self.num_reads % ADJUST_INTERVAL == 0:
+            if self.invisibility > self.target_invisibility and self.k_relaxed > 0:
+                self.k_relaxed -= 1
+                self.num_adjustments += 1
+            elif self.staleness > self.target_staleness and commit_lag > 0 \
+                and self.invisibility < self.target_invisibility * HEADROOM \
+                and self.k_relaxed < max_iv:
+                self.k_relaxed += 1
+                self.num_adjustments += 1
+        k_relaxed = self.k_relaxed
+        self.lock.release()
+        return k_relaxed
+
+    def get_stats(self) -> dict:
+        return {"k_relaxed": self.k_relaxed,
+                "invisibility": self.invisibility,
+                "staleness": self.staleness,
+                "target_invisibility": self.target_invisibility,
+                "target_staleness": self.target_staleness,
+                "adjustments": self.num_adjustments}
@@ -0,0 +1,131 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import base64
+import hashlib
+from threading import Lock
+from typing import NamedTuple
+
+import pandas as pd
+import pyarrow as pa
+import simplejson
+
+from superset.utils.core import json_int_dttm_ser
+from superset.ace.util_class import (RESPONSE_CODE, RESPONSE)
+
+JSON_FORMAT = "json"
+ARROW_FORMAT = "arrow"
+
+RESULT = 0
+FRAGMENT = 1
+REF_COUNT = 2
+
+
+class StoredPayload(NamedTuple):
+    digest: str
+    result: dict
+    fragment: bytes
+
+
+def serialize_payload(result) -> bytes:
+    return simplejson.dumps(result, default=json_int_dttm_ser, ignore_nan=True,
+                            sort_keys=True).encode("utf-8")
+
+
+def deserialize_payload(fragment: bytes):
+    return simplejson.loads(fragment)
+
+
+# Replaces the "data" records of each query of a successful chart result by a
+# base64 encoded Arrow IPC stream
+def encode_arrow_data(result: dict) -> dict:
+    if result.get(RESPONSE_CODE, None) != 200 or \
+        not isinstance(result.get(RESPONSE, None), list):
+        return result
+    queries = []
+    for query in result[RESPONSE]:
+        data = query.get("data", None)
+        if isinstance(data, list):
+            table = pa.Table.from_pandas(pd.DataFrame(data), preserve_index=False)
+            sink = pa.BufferOutputStream()
+            writer = pa.ipc.new_stream(sink, table.schema)
+            writer.write_table(table)
+            writer.close()
+            query = dict(query)
+            query["data"] = base64.b64encode(sink.getvalue().to_pybytes()).decode()
+            query["data_format"] = ARROW_FORMAT
+        queries.append(query)
+    return {**result, RESPONSE: queries}
+
+
+# Process-wide store of chart results addressed by the hash of their
+# serialization. A result is serialized once, when it is stored; the
+# serialized fragment is what the ace/<pk>/charts endpoint sends. Versions
+# with byte-identical results, on any dashboard, share one entry, which is
+# dropped once no Version refers to it.
+class PayloadStore:
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.entries = {}
+        self.num_puts = 0
+        self.num_dedup_hits = 0
+        self.payload_format = JSON_FORMAT
+
+    def configure(self, payload_format: str) -> None:
+        self.payload_format = payload_format
+
+    def serialize(self, result: dict) -> bytes:
+        if self.payload_format == ARROW_FORMAT:
+            return serialize_payload(encode_arrow_data(result))
+        return serialize_payload(result)
+
+    def put(self, result: dict) -> StoredPayload:
+        fragment = self.serialize(result)
+        digest = hashlib.sha256(fragment).hexdigest()
+        self.lock.acquire()
+        self.num_puts += 1
+        entry = self.entries.get(digest, None)
+        if entry is None:
+            entry = [result, fragment, 0]
+            self.entries[digest] = entry
+        else:
+            self.num_dedup_hits += 1
+        entry[REF_COUNT] += 1
+        self.lock.release()
+        return StoredPayload(digest, entry[RESULT], entry[FRAGMENT])
+
+    def release(self, digest: str) -> None:
+        self.lock.acquire()
+        entry = self.entries.get(digest, None)
+        if entry is not None:
+            entry[REF_COUNT] -= 1
+            if entry[REF_COUNT] <= 0:
+                del self.entries[digest]
+        self.lock.release()
+
+    def get_stats(self) -> dict:
+        self.lock.acquire()
+        stats = {"num_payloads": len(self.entries),
+                 "stored_bytes": sum(len(entry[FRAGMENT])
+                                     for entry in self.entries.values()),
+                 "num_puts": self.num_puts,
+                 "num_dedup_hits": self.num_dedup_hits}
+        self.lock.release()
+        return stats
+
+
+payload_store = PayloadStore()
@@ -0,0 +1,89 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import heapq
+import random
+
+PRIORITY = 0
+NODE_ID = 2
+VALID = 3
+# the heap is rebuilt from the valid entries once the invalidated ones
+# outnumber them by this factor
+MAX_STALE_RATIO = 2
+MIN_HEAP_REBUILD = 64
+
+
+# Max-priority queue of the charts a txn still has to refresh. Updating the
+# priority of a chart pushes a new heap entry and invalidates the old one,
+# which is dropped once it reaches the top, or when too many invalidated
+# entries pile up, see _rebuild. Ties are broken randomly.
+class ChartPriorityQueue:
+    def __init__(self) -> None:
+        self.heap = []
+        self.entries = {}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, node_id: int) -> bool:
+        return node_id in self.entries
+
+    def update(self, node_id: int, priority: float) -> None:
+        old_entry = self.entries.get(node_id, None)
+        if old_entry is not None:
+            if old_entry[PRIORITY] == -priority:
+                return
+            old_entry[VALID] = False
+        entry = [-priority, random.random(), node_id, True]
+        self.entries[node_id] = entry
+        heapq.heappush(self.heap, entry)
+        self._rebuild()
+
+    def remove(self, node_id: int) -> None:
+        entry = self.entries.pop(node_id, None)
+        if entry is not None:
+            entry[VALID] = False
+            self._rebuild()
+
+    # Pops the chart of the highest priority among ready_node_ids, or among
+    # all of them if it is None. The charts that are not ready stay in the
+    # queue with their priority.
+    def pop(self, ready_node_ids: set = None) -> int:
+        held_entries = []
+        ret_node_id = None
+        while len(self.heap) != 0:
+            entry = heapq.heappop(self.heap)
+            if not entry[VALID]:
+                continue
+            if ready_node_ids is not None and entry[NODE_ID] not in ready_node_ids:
+                held_entries.append(entry)
+                continue
+            del self.entries[entry[NODE_ID]]
+            ret_node_id = entry[NODE_ID]
+            break
+        for entry in held_entries:
+            heapq.heappush(self.heap, entry)
+        return ret_node_id
+
+    # a chart whose priority is updated on every viewport read would
+    # otherwise leave one entry per read in the heap until it is popped
+    def _rebuild(self) -> None:
+        if len(self.heap) <= max(MIN_HEAP_REBUILD,
+                                 (MAX_STALE_RATIO + 1) * len(self.entries)):
+            return
+        self.heap = list(self.entries.values())
+        heapq.heapify(self.heap)
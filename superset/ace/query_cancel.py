@@ -0,0 +1,121 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from threading import Lock, local
+
+from superset.utils.core import QuerySource
+
+tracked_queries = local()
+
+
+class QueryCancelledError(Exception):
+    pass
+
+
+# A chart query run by the scheduler. While it is tracked on the thread
+# running it, Database.get_df records the database and the cancel id of the
+# cursor it opens, so that the query can be cancelled when a newer txn
+# refreshes the chart again.
+class InFlightQuery:
+    def __init__(self, chart_id: int, ts: int) -> None:
+        self.chart_id = chart_id
+        self.ts = ts
+        self.database = None
+        self.cancel_query_id = None
+        self.is_cancelled = False
+        self.lock = Lock()
+
+
+def track_query(query: InFlightQuery) -> None:
+    tracked_queries.query = query
+
+
+# Once the query is done, its cancel id may be reused by another query
+def untrack_query() -> None:
+    query = getattr(tracked_queries, "query", None)
+    if query is None:
+        return
+    query.lock.acquire()
+    query.database = None
+    query.cancel_query_id = None
+    query.lock.release()
+    tracked_queries.query = None
+
+
+# Called by Database.get_df with the cursor of each query it runs
+def register_cursor(database, cursor) -> None:
+    query = getattr(tracked_queries, "query", None)
+    if query is None:
+        return
+    db_engine_spec = database.db_engine_spec
+    # the engines that cancel implicitly do it from SQL Lab's cursor handling
+    if db_engine_spec.has_implicit_cancel():
+        return
+    cancel_query_id = db_engine_spec.get_cancel_query_id(cursor, None)
+    query.lock.acquire()
+    query.database = database
+    query.cancel_query_id = cancel_query_id
+    is_cancelled = query.is_cancelled
+    query.lock.release()
+    if is_cancelled:
+        raise QueryCancelledError(f"The refresh of chart {query.chart_id} at ts "
+                                  f"{query.ts} was superseded")
+
+
+# Cancels in-flight queries in the database of their dataset on a thread of
+# its own, since cancelling takes a connection to the database
+class QueryCanceller:
+    def __init__(self, num_workers: int = 1) -> None:
+        self.executor = ThreadPoolExecutor(max_workers=max(1, num_workers),
+                                           thread_name_prefix="ace-cancel")
+        self.num_cancelled = 0
+
+    def cancel(self, app, query: InFlightQuery) -> None:
+        query.lock.acquire()
+        is_cancelled = query.is_cancelled
+        query.is_cancelled = True
+        query.lock.release()
+        if not is_cancelled:
+            self.executor.submit(self.cancel_one, app, query)
+
+    def cancel_one(self, app, query: InFlightQuery) -> bool:
+        query.lock.acquire()
+        database = query.database
+        cancel_query_id = query.cancel_query_id
+        query.lock.release()
+        # a query that has not opened its cursor yet cancels itself there
+        if database is None or cancel_query_id is None:
+            return False
+        try:
+            with app.app_context():
+                engine = database.get_sqla_engine(nullpool=True,
+                                                  source=QuerySource.DASHBOARD)
+                with closing(engine.raw_connection()) as conn:
+                    with closing(conn.cursor()) as cursor:
+                        is_cancelled = database.db_engine_spec.cancel_query(
+                            cursor, None, cancel_query_id)
+        except Exception:  # pylint: disable=broad-except
+            traceback.print_exc()
+            return False
+        if is_cancelled:
+            self.num_cancelled += 1
+        return is_cancelled
+
+    def shut_down(self) -> None:
+        self.executor.shutdown(wait=False)
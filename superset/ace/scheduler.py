@@ -16,8 +16,8 @@
 # under the License.
 
 import time
-import psycopg2
-from threading import (Thread, Lock)
+from collections import deque
+from typing import NamedTuple
 
 from marshmallow import ValidationError
 
@@ -28,123 +28,339 @@ from superset.charts.commands.exceptions import ChartDataCacheLoadError, \
 from superset.exceptions import QueryObjectValidationError
 from superset.extensions import ace_state_manager
 from superset.charts.commands.data import ChartDataCommand
-from superset.charts.schemas import ChartDataQueryContextSchema
 
-from superset.ace.util_class import (NodeType, START_TS, RESPONSE_CODE, RESPONSE)
+from superset.ace.util_class import (NodeType, RESPONSE_CODE, RESPONSE)
+from superset.ace.shared_scan import (get_shared_scan_key,
+                                      build_shared_scan_form_data,
+                                      split_shared_scan_result)
+from superset.ace.incremental import (get_incremental_key,
+                                      build_incremental_form_data,
+                                      merge_incremental_state,
+                                      build_incremental_result)
+from superset.ace.query_cancel import InFlightQuery, track_query, untrack_query
 
 
-class Scheduler(Thread):
+# A pending txn, or several adjacent ones coalesced into the newest, see
+# merge_txn_records. A chart is written at the ts of the newest txn that
+# refreshes it: ts, or chart_ts[chart_id] for the charts only older txns
+# refresh. The older ts in covered_ts are committed with ts.
+class TxnRecord(NamedTuple):
+    ts: int
+    node_groups: list
+    charts_form_data: dict
+    chart_ts: dict = None
+    covered_ts: tuple = ()
+
+    def get_chart_ts(self, chart_id: int) -> int:
+        if self.chart_ts is None:
+            return self.ts
+        return self.chart_ts.get(chart_id, self.ts)
+
+
+def merge_txn_records(older: TxnRecord, newer: TxnRecord) -> TxnRecord:
+    newer_chart_ids = newer.node_groups[NodeType.VIZ.value - 1]
+    chart_ts = {chart_id: older.get_chart_ts(chart_id)
+                for chart_id in older.node_groups[NodeType.VIZ.value - 1]
+                if chart_id not in newer_chart_ids}
+    charts_form_data = dict(newer.charts_form_data)
+    for chart_id in chart_ts:
+        if chart_id in older.charts_form_data:
+            charts_form_data[chart_id] = older.charts_form_data[chart_id]
+    node_groups = [older_group | newer_group for older_group, newer_group
+                   in zip(older.node_groups, newer.node_groups)]
+    return TxnRecord(newer.ts, node_groups, charts_form_data, chart_ts,
+                     older.covered_ts + (older.ts,) + newer.covered_ts)
+
+
+# A unit of work run by a worker of the SchedulerService: estimating the
+# refresh cost of a txn if chart_id is None, refreshing a chart otherwise,
+# in one shared scan with the charts of batch if there are any
+class SchedulerTask(NamedTuple):
+    txn: TxnRecord
+    chart_id: int
+    batch: tuple = ()
+    # the database whose query slot the task holds, see SchedulerService
+    database_id: int = None
+
+
+# Scheduler of one dashboard. It does not own any thread: the workers of the
+# SchedulerService claim its tasks one at a time. All methods except
+# run_task are called with the service lock held.
+class Scheduler:
     def __init__(self, dash_id: int, app):
-        super().__init__()
         self.dash_id = dash_id
         self.ds_state_manager = ace_state_manager[dash_id]
-        self.node_groups_list = []
-        self.charts_form_data_list = []
-        self.ts_list = []
+        self.pending_txns = deque()
+        self.cur_txn = None
+        self.cur_chart_ids = set()
+        self.cur_chart_id_to_cost = {}
+        self.is_estimating = False
+        self.num_in_flight = 0
         self.finished_ts_set = set()
         self.dependent_ts_set = set()
-        self.scheduler_lock = Lock()
         self.finish = False
         self.app = app
-        self.chart_data_query_context_schema = ChartDataQueryContextSchema()
+        self.service = None
         self.chart_id_to_cost = None
+        # chart id -> InFlightQuery of its refresh in the current txn
+        self.in_flight_queries = {}
+        # chart id -> the newest ts of the pending txns that refresh it
+        self.chart_to_pending_ts = {}
+        # chart id -> the database of the charts of the current txn
+        self.chart_databases = {}
+
+        # used by the fair queuing of SchedulerService
+        self.finish_tag = 0.0
+        self.last_active_time = time.time()
 
     def submit_one_txn(self, ts: int, node_groups: list,
                        input_charts_form_data: dict):
         charts_form_data = {}
         for node_id_str in input_charts_form_data:
             charts_form_data[int(node_id_str)] = input_charts_form_data[node_id_str]
-        self.scheduler_lock.acquire()
-        self.ts_list.append(ts)
-        self.node_groups_list.append(node_groups)
-        self.charts_form_data_list.append(charts_form_data)
-        self.scheduler_lock.release()
-
-    def run(self):
-        while not self.finish:
-            self.scheduler_lock.acquire()
-            if len(self.ts_list) != 0:
-                cur_ts = self.ts_list.pop(0)
-                cur_node_groups = self.node_groups_list.pop(0)
-                cur_charts_form_data = self.charts_form_data_list.pop(0)
-            else:
-                cur_ts = START_TS
-                cur_node_groups = None
-                cur_charts_form_data = None
-            self.scheduler_lock.release()
-            if cur_ts != START_TS:
-                cur_chart_ids = cur_node_groups[NodeType.VIZ.value - 1]
-                chart_id_to_cost = self.estimate_refresh_cost(
-                    cur_chart_ids, cur_charts_form_data)
-                while len(cur_chart_ids) != 0:
-                    cur_chart_ids = self.skip_chart_refresh(cur_chart_ids)
-                    if len(cur_chart_ids) != 0:
-                        chart_id_to_schedule = self.schedule_one_chart(cur_ts,
-                                                                       cur_chart_ids,
-                                                                       chart_id_to_cost)
-                        self.refresh_one_chart(cur_ts, chart_id_to_schedule,
-                                               cur_charts_form_data)
-                        cur_chart_ids.remove(chart_id_to_schedule)
-                self.finished_ts_set.add(cur_ts)
-                self.dependent_ts_set.add(cur_ts)
-                if self.dependent_ts_set.issubset(self.finished_ts_set):
-                    max_ts = max(self.finished_ts_set)
-                    self.ds_state_manager.commit_one_txn(max_ts)
-                    self.finished_ts_set = set()
-                    self.dependent_ts_set = set()
-            time.sleep(0.01)
-
-    def build_db_conn(self):
-        conn = psycopg2.connect(dbname=self.ds_state_manager.db_name,
-                                user=self.ds_state_manager.username,
-                                password=self.ds_state_manager.password,
-                                host=self.ds_state_manager.host,
-                                port=self.ds_state_manager.port)
-        return conn
+        txn = TxnRecord(ts, node_groups, charts_form_data)
+        chart_ids = node_groups[NodeType.VIZ.value - 1]
+        if self.ds_state_manager.opt_skip_write:
+            # the charts refreshed again are skipped and the pending txns
+            # coalesced as soon as the txn is submitted
+            self.skip_superseded_charts(ts, chart_ids)
+            if len(self.pending_txns) != 0:
+                txn = merge_txn_records(self.pending_txns.pop(), txn)
+        self.pending_txns.append(txn)
+        for chart_id in chart_ids:
+            self.chart_to_pending_ts[chart_id] = ts
+        self.last_active_time = time.time()
+        self.cancel_superseded_queries(ts, node_groups)
+
+    # Merges a txn that is not admitted into the newest pending txn, which
+    # refreshes its charts with their new form data. Returns the ts of the
+    # pending txn, or None if it does not refresh all the charts.
+    def merge_into_pending_txn(self, chart_ids: set,
+                               input_charts_form_data: dict) -> int:
+        if len(self.pending_txns) == 0:
+            return None
+        txn = self.pending_txns[-1]
+        if not chart_ids.issubset(txn.node_groups[NodeType.VIZ.value - 1]):
+            return None
+        charts_form_data = dict(txn.charts_form_data)
+        for node_id_str in input_charts_form_data:
+            charts_form_data[int(node_id_str)] = input_charts_form_data[node_id_str]
+        self.pending_txns[-1] = txn._replace(charts_form_data=charts_form_data)
+        self.last_active_time = time.time()
+        return txn.ts
+
+    # The charts of the current txn that txn ts refreshes again are not
+    # written at the ts of the current txn, which is committed with ts
+    def skip_superseded_charts(self, ts: int, chart_ids: set) -> None:
+        if self.cur_txn is None:
+            return
+        skipped_chart_ids = self.cur_chart_ids & chart_ids
+        if len(skipped_chart_ids) == 0:
+            return
+        self.cur_chart_ids.difference_update(skipped_chart_ids)
+        self.ds_state_manager.remove_pending_nodes(self.cur_txn.ts,
+                                                   skipped_chart_ids)
+        self.dependent_ts_set.add(ts)
+        self.try_finish_txn()
+
+    # Cancels the in-flight refreshes of the charts that txn ts refreshes
+    # again. Like the charts skipped by skip_chart_refresh, a cancelled chart
+    # is not written at the ts of the current txn, which is committed
+    # together with ts instead.
+    def cancel_superseded_queries(self, ts: int, node_groups: list) -> None:
+        if not self.ds_state_manager.opt_skip_write or self.service is None:
+            return
+        chart_ids = node_groups[NodeType.VIZ.value - 1]
+        for chart_id, query in self.in_flight_queries.items():
+            if chart_id in chart_ids and not query.is_cancelled:
+                self.dependent_ts_set.add(ts)
+                self.service.query_canceller.cancel(self.app, query)
+
+    def is_idle(self) -> bool:
+        return self.cur_txn is None and len(self.pending_txns) == 0
+
+    def has_ready_task(self) -> bool:
+        if self.finish:
+            return False
+        if self.cur_txn is None:
+            return len(self.pending_txns) != 0
+        max_in_flight = max(1, self.ds_state_manager.num_refresh_workers)
+        if self.is_estimating or self.num_in_flight >= max_in_flight:
+            return False
+        ready_chart_ids = self.get_ready_chart_ids()
+        return len(self.cur_chart_ids if ready_chart_ids is None
+                   else ready_chart_ids) != 0
+
+    # the charts of the current txn whose database has a free query slot, or
+    # None if the number of queries is not capped
+    def get_ready_chart_ids(self) -> set:
+        if self.service is None or self.service.max_queries_per_db <= 0:
+            return None
+        return {chart_id for chart_id in self.cur_chart_ids
+                if self.service.has_db_slot(self.chart_databases.get(chart_id, None))}
+
+    def claim_task(self) -> SchedulerTask:
+        if self.cur_txn is None:
+            self.cur_txn = self.pending_txns.popleft()
+            chart_ids = self.cur_txn.node_groups[NodeType.VIZ.value - 1]
+            for chart_id in chart_ids:
+                if self.chart_to_pending_ts.get(chart_id, None) == \
+                    self.cur_txn.get_chart_ts(chart_id):
+                    del self.chart_to_pending_ts[chart_id]
+            self.cur_chart_ids = self.skip_chart_refresh(set(chart_ids))
+            self.is_estimating = True
+            return SchedulerTask(self.cur_txn, None)
+        if len(self.cur_chart_ids) == 0:
+            self.try_finish_txn()
+            return None
+        ready_chart_ids = self.get_ready_chart_ids()
+        if ready_chart_ids is not None and len(ready_chart_ids) == 0:
+            return None
+        # pick the chart only when a worker is free so that the
+        # priority reflects the latest viewport
+        chart_id = self.schedule_one_chart(self.cur_txn.ts, self.cur_chart_ids,
+                                           self.cur_chart_id_to_cost,
+                                           ready_chart_ids)
+        self.cur_chart_ids.remove(chart_id)
+        # the charts of a shared scan query the same database
+        batch = self.collect_shared_scan(chart_id)
+        self.cur_chart_ids.difference_update(batch)
+        self.ds_state_manager.remove_pending_nodes(self.cur_txn.ts, batch)
+        if len(batch) == 0:
+            self.in_flight_queries[chart_id] = InFlightQuery(
+                chart_id, self.cur_txn.get_chart_ts(chart_id))
+        self.num_in_flight += 1
+        database_id = self.chart_databases.get(chart_id, None)
+        if self.service is not None:
+            self.service.acquire_db_slot(database_id)
+        return SchedulerTask(self.cur_txn, chart_id, batch, database_id)
+
+    # the charts left in the current txn that can share a scan with chart_id
+    def collect_shared_scan(self, chart_id: int) -> tuple:
+        if not self.ds_state_manager.opt_shared_scan:
+            return ()
+        charts_form_data = self.cur_txn.charts_form_data
+        if self.get_incremental_key(chart_id, charts_form_data) is not None:
+            return ()
+        key = get_shared_scan_key(charts_form_data.get(chart_id, None))
+        if key is None:
+            return ()
+        # the charts of a shared scan are written at the same ts
+        ts = self.cur_txn.get_chart_ts(chart_id)
+        return tuple(other_id for other_id in self.cur_chart_ids
+                     if get_shared_scan_key(charts_form_data.get(other_id, None)) == key
+                     and self.get_incremental_key(other_id, charts_form_data) is None
+                     and self.cur_txn.get_chart_ts(other_id) == ts)
+
+    def get_incremental_key(self, chart_id: int, charts_form_data: dict) -> str:
+        watermark_columns = self.ds_state_manager.watermark_columns
+        form_data = charts_form_data.get(chart_id, None)
+        if len(watermark_columns) == 0 or form_data is None:
+            return None
+        datasource = form_data.get("datasource", None)
+        if not isinstance(datasource, dict):
+            return None
+        return get_incremental_key(form_data,
+                                   watermark_columns.get(datasource.get("id"), None))
+
+    # used by SchedulerService to share the workers fairly between dashboards
+    def task_cost(self, task: SchedulerTask) -> float:
+        return 1.0
+
+    def weight(self) -> float:
+        return max(self.ds_state_manager.scheduler_weight, 0.01)
+
+    # called by a worker without holding the service lock
+    def run_task(self, task: SchedulerTask):
+        if task.chart_id is None:
+            chart_ids = task.txn.node_groups[NodeType.VIZ.value - 1]
+            return (self.estimate_refresh_cost(chart_ids, task.txn.charts_form_data),
+                    self.resolve_chart_databases(chart_ids, task.txn.charts_form_data))
+        ts = task.txn.get_chart_ts(task.chart_id)
+        if len(task.batch) != 0:
+            self.refresh_charts_shared_scan(ts, (task.chart_id,) + task.batch,
+                                            task.txn.charts_form_data)
+        else:
+            self.refresh_one_chart(ts, task.chart_id, task.txn.charts_form_data)
+        return None
+
+    def complete_task(self, task: SchedulerTask, result) -> None:
+        if task.chart_id is None:
+            self.is_estimating = False
+            self.cur_chart_id_to_cost, self.chart_databases = \
+                result if result is not None else ({}, {})
+        else:
+            self.num_in_flight -= 1
+            self.in_flight_queries.pop(task.chart_id, None)
+            if self.service is not None:
+                self.service.release_db_slot(task.database_id)
+        self.last_active_time = time.time()
+        self.try_finish_txn()
+
+    def try_finish_txn(self) -> None:
+        if self.cur_txn is None or self.is_estimating or \
+            len(self.cur_chart_ids) != 0 or self.num_in_flight != 0:
+            return
+        covered_ts = (self.cur_txn.ts,) + self.cur_txn.covered_ts
+        self.cur_txn = None
+        self.finished_ts_set.update(covered_ts)
+        self.dependent_ts_set.update(covered_ts)
+        if self.dependent_ts_set.issubset(self.finished_ts_set):
+            max_ts = max(self.finished_ts_set)
+            self.ds_state_manager.commit_one_txn(max_ts)
+            self.finished_ts_set = set()
+            self.dependent_ts_set = set()
+
+    def get_chart_databases(self, chart_ids: set, charts_form_data: dict) -> dict:
+        return {chart_id: self.service.get_database_id(
+                    self.app, charts_form_data[chart_id].get("datasource", None))
+                for chart_id in chart_ids if chart_id in charts_form_data}
+
+    # the databases of the charts when their number of queries is capped
+    def resolve_chart_databases(self, chart_ids: set,
+                                charts_form_data: dict) -> dict:
+        if self.service is None or self.service.max_queries_per_db <= 0:
+            return {}
+        return self.get_chart_databases(chart_ids, charts_form_data)
 
     def estimate_refresh_cost(self, chart_ids: set,
                               charts_form_data: dict) -> dict:
-        if not self.ds_state_manager.opt_exec_time:
+        if not self.ds_state_manager.opt_exec_time or self.service is None:
             return {}
-        if (self.chart_id_to_cost is not None) and \
-            self.ds_state_manager.enable_stats_cache:
-            return self.chart_id_to_cost
-        chart_id_to_cost = {}
-        conn = None
+        # the EXPLAIN costs may be cached, the learned costs keep improving
+        if (self.chart_id_to_cost is None) or \
+            not self.ds_state_manager.enable_stats_cache:
+            self.chart_id_to_cost = self.service.cost_estimator.estimate(
+                self.app, chart_ids, charts_form_data)
+        # the cost units of the databases differ
+        return self.service.cost_model.predict(
+            chart_ids, self.chart_id_to_cost,
+            self.get_chart_databases(chart_ids, charts_form_data))
+
+    def observe_refresh_time(self, chart_id: int, seconds: float,
+                             incremental: bool = False) -> None:
+        if self.service is not None:
+            self.service.cost_model.observe(chart_id, seconds, incremental)
+
+    # Runs the query of chart_id so that a newer txn can cancel it, see
+    # cancel_superseded_queries
+    def run_chart_command(self, chart_id: int, command: ChartDataCommand) -> dict:
+        query = self.in_flight_queries.get(chart_id, None)
+        if query is not None:
+            track_query(query)
         try:
-            conn = self.build_db_conn()
-            cur = conn.cursor()
-            for chart_id in chart_ids:
-                form_data = charts_form_data[chart_id]
-                chart_id_to_cost[chart_id] = \
-                    self.estimate_one_refresh_cost(cur, form_data)
-        except psycopg2.Error as e:
-            print("psycopg2 error : " + e.pgerror)
-            chart_id_to_cost = {}
-        except KeyError as ex:
-            print(ex)
-            chart_id_to_cost = {}
-        except ValidationError as error:
-            print(error)
-            chart_id_to_cost = {}
-        if conn:
-            conn.close()
-        self.chart_id_to_cost = chart_id_to_cost
-        return chart_id_to_cost
-
-    def estimate_one_refresh_cost(self, cur, form_data: dict) -> int:
-        with self.app.app_context():
-            query_context = self.chart_data_query_context_schema.load(form_data)
-            query_result = query_context.get_query_str()['queries']
-            query_str = query_result[0]['query']
-            cur.execute("Explain " + query_str)
-            cost_str: str = cur.fetchall()[0][0]
-            start_idx = cost_str.find("..") + 2
-            end_idx = cost_str.find(" ", start_idx)
-            cost = int(float(cost_str[start_idx:end_idx]))
-        return cost
+            return command.run(force_cached=False)
+        finally:
+            if query is not None:
+                untrack_query()
+
+    def is_superseded(self, chart_id: int) -> bool:
+        query = self.in_flight_queries.get(chart_id, None)
+        return query is not None and query.is_cancelled
 
     def refresh_one_chart(self, ts: int, chart_id: int, charts_form_data: dict):
+        if self.refresh_one_chart_incrementally(ts, chart_id, charts_form_data):
+            return
         with self.app.app_context():
             try:
                 form_data = charts_form_data[chart_id]
@@ -152,7 +368,9 @@ class Scheduler(Thread):
                 command.set_query_context(form_data)
                 # TODO: validate does not work here due to missing user attribute
                 # command.validate()
-                result = command.run(force_cached=False)["queries"]
+                start_time = time.time()
+                result = self.run_chart_command(chart_id, command)["queries"]
+                self.observe_refresh_time(chart_id, time.time() - start_time)
                 code = 200
             except QueryObjectValidationError as error:
                 code = 400
@@ -171,6 +389,8 @@ class Scheduler(Thread):
                 code = 400
                 result = "Message not follow the refresh format"
 
+        if code != 200 and self.is_superseded(chart_id):
+            return
         result_dict = {
             RESPONSE_CODE: code,
             RESPONSE: result
@@ -178,25 +398,101 @@ class Scheduler(Thread):
 
         self.ds_state_manager.finish_one_update(chart_id, ts, result_dict)
 
+    # Refreshes chart_id from the rows appended since its previous refresh, see
+    # incremental.py. Returns False if the chart has to be refreshed in full.
+    # Only the rows above the watermark are queried: a row appended with a
+    # watermark at or below it is missed for as long as the state is reused.
+    def refresh_one_chart_incrementally(self, ts: int, chart_id: int,
+                                        charts_form_data: dict) -> bool:
+        key = self.get_incremental_key(chart_id, charts_form_data)
+        if key is None:
+            return False
+        incremental_states = self.ds_state_manager.incremental_states
+        old_state = incremental_states.pop(chart_id, None)
+        state = old_state if old_state is not None and old_state.key == key else None
+        result = None
+        with self.app.app_context():
+            try:
+                form_data = charts_form_data[chart_id]
+                datasource_id = form_data["datasource"]["id"]
+                row_limit = self.app.config["ACE_SHARED_SCAN_ROW_LIMIT"]
+                delta_form_data = build_incremental_form_data(
+                    form_data, self.ds_state_manager.watermark_columns[datasource_id],
+                    state.watermark if state is not None else None, row_limit)
+                command = ChartDataCommand()
+                command.set_query_context(delta_form_data)
+                start_time = time.time()
+                payload = self.run_chart_command(chart_id, command)["queries"][0]
+                self.observe_refresh_time(chart_id, time.time() - start_time,
+                                          incremental=True)
+                if payload["rowcount"] < row_limit:
+                    state = merge_incremental_state(state, key, payload, form_data)
+                    result = [build_incremental_result(payload, state, form_data)]
+            except Exception:  # pylint: disable=broad-except
+                traceback.print_exc()
+
+        if result is None and self.is_superseded(chart_id):
+            if old_state is not None:
+                incremental_states[chart_id] = old_state
+            return True
+        if result is None:
+            return False
+        incremental_states[chart_id] = state
+        self.ds_state_manager.finish_one_update(chart_id, ts, {
+            RESPONSE_CODE: 200,
+            RESPONSE: result
+        })
+        return True
+
+    # Refreshes chart_ids with one query, or one query per chart if the
+    # shared query fails or its result is truncated
+    def refresh_charts_shared_scan(self, ts: int, chart_ids: tuple,
+                                   charts_form_data: dict):
+        results = None
+        with self.app.app_context():
+            try:
+                row_limit = self.app.config["ACE_SHARED_SCAN_ROW_LIMIT"]
+                form_data = build_shared_scan_form_data(
+                    [charts_form_data[chart_id] for chart_id in chart_ids], row_limit)
+                command = ChartDataCommand()
+                command.set_query_context(form_data)
+                payload = command.run(force_cached=False)["queries"][0]
+                if payload["rowcount"] < row_limit:
+                    results = {chart_id: [split_shared_scan_result(
+                        payload, charts_form_data[chart_id])]
+                               for chart_id in chart_ids}
+            except Exception:  # pylint: disable=broad-except
+                traceback.print_exc()
+
+        if results is None:
+            for chart_id in chart_ids:
+                self.refresh_one_chart(ts, chart_id, charts_form_data)
+            return
+        for chart_id in chart_ids:
+            self.ds_state_manager.finish_one_update(chart_id, ts, {
+                RESPONSE_CODE: 200,
+                RESPONSE: results[chart_id]
+            })
+
     def schedule_one_chart(self, ts: int, cur_chart_ids: set,
-                           chart_id_to_cost: dict) -> int:
+                           chart_id_to_cost: dict, ready_chart_ids: set) -> int:
         return self.ds_state_manager.get_top_priority_node(ts, cur_chart_ids,
-                                                           chart_id_to_cost)
+                                                           chart_id_to_cost,
+                                                           ready_chart_ids)
 
+    # The charts of a new current txn that pending txns refresh again. Since
+    # the pending txns are coalesced with opt_skip_write, there are none
+    # unless opt_skip_write was just turned on.
     def skip_chart_refresh(self, cur_chart_ids: set) -> set:
         if not self.ds_state_manager.opt_skip_write:
             return cur_chart_ids
-        new_chart_ids = set(cur_chart_ids)
-        self.scheduler_lock.acquire()
-        for i in range(len(self.node_groups_list)):
-            pending_chart_ids = self.node_groups_list[i][NodeType.VIZ.value - 1]
-            pending_ts = self.ts_list[i]
-            for chart_id in cur_chart_ids:
-                if chart_id in pending_chart_ids:
-                    if chart_id in new_chart_ids:
-                        new_chart_ids.remove(chart_id)
-                    self.dependent_ts_set.add(pending_ts)
-        self.scheduler_lock.release()
+        new_chart_ids = set()
+        for chart_id in cur_chart_ids:
+            pending_ts = self.chart_to_pending_ts.get(chart_id, None)
+            if pending_ts is None:
+                new_chart_ids.add(chart_id)
+            else:
+                self.dependent_ts_set.add(pending_ts)
         return new_chart_ids
 
     def shut_down(self) -> None:
@@ -0,0 +1,226 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import time
+import traceback
+from threading import (Thread, Condition, Lock)
+from typing import Tuple
+
+from superset.connectors.connector_registry import ConnectorRegistry
+from superset.extensions import ace_scheduler_manager, db
+from superset.ace.scheduler import (Scheduler, SchedulerTask)
+from superset.ace.cost_estimator import CostEstimator
+from superset.ace.cost_model import ChartCostModel
+from superset.ace.query_cancel import QueryCanceller
+
+REAP_INTERVAL = 10
+
+
+# Runs the tasks of all dashboard schedulers of this process on a bounded
+# pool of worker threads.
+#
+# Dashboards share the workers with start-time fair queuing: each scheduler
+# carries the finish tag of its last task, the worker picks the ready
+# scheduler with the smallest start tag max(virtual_time, finish_tag) and
+# advances its finish tag by task_cost / weight. Within a dashboard, the
+# scheduler itself picks charts by viewport priority. Schedulers that stay
+# idle for idle_timeout seconds are dropped. The refresh cost of the charts of
+# a txn is estimated by the shared cost_estimator and cost_model, and the
+# chart queries superseded by a newer txn are cancelled by query_canceller.
+#
+# A chart query holds a slot of its database from the time a worker claims
+# it, up to max_queries_per_db slots per database. The charts of a database
+# without a free slot are not ready, so the workers refresh the charts of
+# other databases instead of waiting for one.
+class SchedulerService:
+    def __init__(self, num_workers: int, idle_timeout: int,
+                 max_queries_per_db: int, num_estimation_workers: int = 4,
+                 cost_model: ChartCostModel = None) -> None:
+        self.service_lock = Condition()
+        self.schedulers = ace_scheduler_manager
+        self.virtual_time = 0.0
+        self.idle_timeout = idle_timeout
+        self.last_reap_time = time.time()
+        self.finish = False
+        self.max_queries_per_db = max_queries_per_db
+        # database id -> number of its chart queries claimed by the workers
+        self.db_in_flight = {}
+        # (datasource type, datasource id) -> database id
+        self.datasource_databases = {}
+        self.datasource_databases_lock = Lock()
+        self.cost_estimator = CostEstimator(num_estimation_workers)
+        self.cost_model = cost_model if cost_model is not None else ChartCostModel()
+        self.query_canceller = QueryCanceller()
+        self.workers = [Thread(target=self.run_worker,
+                               name=f"ace-scheduler-{idx}",
+                               daemon=True)
+                        for idx in range(max(1, num_workers))]
+
+    def start(self) -> None:
+        for worker in self.workers:
+            worker.start()
+
+    def shut_down(self) -> None:
+        self.service_lock.acquire()
+        self.finish = True
+        self.service_lock.notify_all()
+        self.service_lock.release()
+        for worker in self.workers:
+            worker.join(1)
+        self.cost_estimator.shut_down()
+        self.query_canceller.shut_down()
+        self.cost_model.save()
+
+    def unregister(self, dash_id: int) -> None:
+        self.service_lock.acquire()
+        scheduler = self.schedulers.pop(dash_id, None)
+        if scheduler is not None:
+            scheduler.shut_down()
+        self.service_lock.release()
+
+    # The scheduler of dash_id goes on with its txns on the replica that
+    # replaced the stale one it ran them on. For a new state its txns are
+    # gone, and it is dropped to be created again on the next txn.
+    def replace_state_manager(self, dash_id: int, ds_state_manager,
+                              keeps_txns: bool) -> None:
+        self.service_lock.acquire()
+        scheduler = self.schedulers.get(dash_id, None)
+        if scheduler is not None and keeps_txns:
+            scheduler.ds_state_manager = ds_state_manager
+        elif scheduler is not None:
+            del self.schedulers[dash_id]
+            scheduler.shut_down()
+        self.service_lock.release()
+
+    def submit_one_txn(self, dash_id: int, app, ts: int,
+                       node_groups: list, charts_form_data: dict) -> None:
+        self.service_lock.acquire()
+        scheduler = self.schedulers.get(dash_id, None)
+        if scheduler is None:
+            scheduler = Scheduler(dash_id, app)
+            self.register(scheduler)
+        scheduler.submit_one_txn(ts, node_groups, charts_form_data)
+        self.service_lock.notify()
+        self.service_lock.release()
+
+    def merge_into_pending_txn(self, dash_id: int, chart_ids: set,
+                               charts_form_data: dict) -> int:
+        self.service_lock.acquire()
+        scheduler = self.schedulers.get(dash_id, None)
+        ts = None
+        if scheduler is not None:
+            ts = scheduler.merge_into_pending_txn(chart_ids, charts_form_data)
+        self.service_lock.release()
+        return ts
+
+    # called by the workers without holding the service lock
+    def get_database_id(self, app, datasource: dict) -> int:
+        if not isinstance(datasource, dict):
+            return None
+        key = (datasource.get("type", None), datasource.get("id", None))
+        self.datasource_databases_lock.acquire()
+        database_id = self.datasource_databases.get(key, None)
+        self.datasource_databases_lock.release()
+        if database_id is not None:
+            return database_id
+        try:
+            with app.app_context():
+                database_id = ConnectorRegistry.get_datasource(
+                    key[0], key[1], db.session).database_id
+        except Exception:  # pylint: disable=broad-except
+            traceback.print_exc()
+            return None
+        self.datasource_databases_lock.acquire()
+        self.datasource_databases[key] = database_id
+        self.datasource_databases_lock.release()
+        return database_id
+
+    # The following functions are called with service_lock held
+    def register(self, scheduler: Scheduler) -> None:
+        scheduler.service = self
+        scheduler.finish_tag = self.virtual_time
+        self.schedulers[scheduler.dash_id] = scheduler
+
+    def has_db_slot(self, database_id: int) -> bool:
+        return database_id is None or self.max_queries_per_db <= 0 or \
+            self.db_in_flight.get(database_id, 0) < self.max_queries_per_db
+
+    def acquire_db_slot(self, database_id: int) -> None:
+        if database_id is not None:
+            self.db_in_flight[database_id] = self.db_in_flight.get(database_id, 0) + 1
+
+    def release_db_slot(self, database_id: int) -> None:
+        if database_id is not None:
+            self.db_in_flight[database_id] -= 1
+            if self.db_in_flight[database_id] == 0:
+                del self.db_in_flight[database_id]
+
+    def next_task(self) -> Tuple[Scheduler, SchedulerTask]:
+        while True:
+            ret_scheduler = None
+            ret_start_tag = 0.0
+            for scheduler in self.schedulers.values():
+                if scheduler.has_ready_task():
+                    start_tag = max(self.virtual_time, scheduler.finish_tag)
+                    if ret_scheduler is None or start_tag < ret_start_tag:
+                        ret_scheduler = scheduler
+                        ret_start_tag = start_tag
+            if ret_scheduler is None:
+                return None, None
+            task = ret_scheduler.claim_task()
+            if task is not None:
+                self.virtual_time = ret_start_tag
+                ret_scheduler.finish_tag = ret_start_tag + \
+                    ret_scheduler.task_cost(task) / ret_scheduler.weight()
+                return ret_scheduler, task
+
+    def reap_idle_schedulers(self) -> None:
+        cur_time = time.time()
+        if cur_time - self.last_reap_time < REAP_INTERVAL:
+            return
+        self.last_reap_time = cur_time
+        for dash_id in list(self.schedulers.keys()):
+            scheduler = self.schedulers[dash_id]
+            if scheduler.is_idle() and \
+                cur_time - scheduler.last_active_time > self.idle_timeout:
+                del self.schedulers[dash_id]
+                scheduler.shut_down()
+
+    def run_worker(self) -> None:
+        while True:
+            self.service_lock.acquire()
+            while True:
+                if self.finish:
+                    self.service_lock.release()
+                    return
+                self.reap_idle_schedulers()
+                scheduler, task = self.next_task()
+                if task is not None:
+                    break
+                self.service_lock.wait(REAP_INTERVAL)
+            self.service_lock.release()
+
+            result = None
+            try:
+                result = scheduler.run_task(task)
+            except Exception:  # pylint: disable=broad-except
+                traceback.print_exc()
+
+            self.service_lock.acquire()
+            scheduler.complete_task(task, result)
+            self.service_lock.notify_all()
+            self.service_lock.release()
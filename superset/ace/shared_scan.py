@@ -0,0 +1,150 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import copy
+import json
+
+import pandas as pd
+
+from superset.utils.core import extract_dataframe_dtypes, get_metric_name
+
+# how the values of an aggregate over finer groups roll up into coarser ones
+ROLLUP_FUNCTIONS = {"SUM": "sum", "COUNT": "sum", "MIN": "min", "MAX": "max"}
+# the keys of a query that may differ between the charts of a shared scan
+PER_CHART_KEYS = {"columns", "metrics", "orderby", "row_limit", "groupby", "group_by"}
+
+
+# Charts of a txn that aggregate the same datasource with the same filters
+# share one scan: a single query groups by the union of their columns and
+# computes the union of their metrics, and the result of each chart is
+# rolled up from it in pandas. Only metrics that roll up, i.e., SIMPLE adhoc
+# metrics with an aggregate in ROLLUP_FUNCTIONS, are shared.
+def get_rollup_function(metric) -> str:
+    if not isinstance(metric, dict) or metric.get("expressionType") != "SIMPLE":
+        return None
+    return ROLLUP_FUNCTIONS.get(str(metric.get("aggregate", "")).upper(), None)
+
+
+def get_order_label(order_by) -> str:
+    return order_by if isinstance(order_by, str) else get_metric_name(order_by)
+
+
+# HAVING is evaluated at the grain of the query, so a query with one cannot
+# be computed from the groups of a finer or partial one
+def has_having(query: dict) -> bool:
+    extras = query.get("extras", None) or {}
+    return bool(extras.get("having") or extras.get("having_druid") or
+                query.get("having") or query.get("having_druid"))
+
+
+# Rolls the groups of df up to columns. A SUM over groups that are all NULL
+# is NULL, as in SQL, not 0.
+def rollup_groups(df: pd.DataFrame, columns: list, rollup: dict) -> pd.DataFrame:
+    sum_labels = [label for label, function in rollup.items() if function == "sum"]
+    if columns:
+        grouped = df.groupby(columns, as_index=False, sort=False, dropna=False)
+        rolled_up_df = grouped.agg(rollup)
+        if sum_labels:
+            rolled_up_df[sum_labels] = \
+                grouped[sum_labels].sum(min_count=1)[sum_labels].values
+        return rolled_up_df
+    rolled_up_df = df[list(rollup)].agg(rollup).to_frame().T
+    for label in sum_labels:
+        rolled_up_df[label] = df[label].sum(min_count=1)
+    return rolled_up_df
+
+
+# Charts can share a scan iff they have the same key; None if the chart
+# cannot share any
+def get_shared_scan_key(form_data: dict) -> str:
+    if form_data is None or form_data.get("result_format", "json") != "json" or \
+        form_data.get("result_type", "full") != "full":
+        return None
+    queries = form_data.get("queries", [])
+    if len(queries) != 1:
+        return None
+    query = queries[0]
+    if query.get("is_timeseries") or query.get("granularity") or \
+        query.get("post_processing") or query.get("time_offsets") or \
+        has_having(query):
+        return None
+    metrics = query.get("metrics", None)
+    columns = query.get("columns", [])
+    if not metrics or any(get_rollup_function(metric) is None for metric in metrics):
+        return None
+    if any(not isinstance(column, str) for column in columns):
+        return None
+    labels = set(columns) | {get_metric_name(metric) for metric in metrics}
+    if any(get_order_label(order_by) not in labels
+           for order_by, _ in query.get("orderby", [])):
+        return None
+    shared_query = {key: value for key, value in query.items()
+                    if key not in PER_CHART_KEYS}
+    return json.dumps([form_data.get("datasource"), shared_query],
+                      sort_keys=True, default=str)
+
+
+def build_shared_scan_form_data(forms: list, row_limit: int) -> dict:
+    form_data = copy.deepcopy(forms[0])
+    query = form_data["queries"][0]
+    columns = []
+    label_to_metric = {}
+    for chart_form_data in forms:
+        chart_query = chart_form_data["queries"][0]
+        for column in chart_query.get("columns", []):
+            if column not in columns:
+                columns.append(column)
+        for metric in chart_query["metrics"]:
+            label = get_metric_name(metric)
+            if label_to_metric.setdefault(label, metric) != metric:
+                raise ValueError(f"Metric {label} has several definitions")
+    query["columns"] = columns
+    query["metrics"] = list(label_to_metric.values())
+    query["orderby"] = []
+    query["row_limit"] = row_limit
+    return form_data
+
+
+# The query result of one chart out of the result of its shared scan
+def split_shared_scan_result(payload: dict, form_data: dict) -> dict:
+    query = form_data["queries"][0]
+    columns = list(query.get("columns", []))
+    labels = [get_metric_name(metric) for metric in query["metrics"]]
+    rollup = {get_metric_name(metric): get_rollup_function(metric)
+              for metric in query["metrics"]}
+    df = rollup_groups(pd.DataFrame(payload["data"], columns=payload["colnames"]),
+                       columns, rollup)
+    return finalize_chart_payload(payload, df[columns + labels], query)
+
+
+# The payload of query whose result, before ordering and row limit, is df.
+# The other fields are copied from payload.
+def finalize_chart_payload(payload: dict, df: pd.DataFrame, query: dict) -> dict:
+    order_by = query.get("orderby", [])
+    if order_by:
+        df = df.sort_values(by=[get_order_label(label) for label, _ in order_by],
+                            ascending=[bool(ascending) for _, ascending in order_by])
+    if query.get("row_limit"):
+        df = df.head(query["row_limit"])
+    df = df.reset_index(drop=True)
+    chart_payload = dict(payload)
+    chart_payload["colnames"] = list(df.columns)
+    chart_payload["indexnames"] = list(df.index)
+    chart_payload["coltypes"] = extract_dataframe_dtypes(df)
+    chart_payload["data"] = df.to_dict(orient="records")
+    chart_payload["rowcount"] = len(df.index)
+    return chart_payload
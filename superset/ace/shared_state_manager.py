@@ -0,0 +1,471 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import json
+import time
+import traceback
+import uuid
+from bisect import bisect_right
+from threading import Lock
+from typing import Tuple
+
+from superset.ace.ds_state_manager import DashStateManager
+from superset.ace.payload_store import (payload_store, serialize_payload,
+                                        deserialize_payload)
+from superset.ace.state_store import BaseStateStore, TrimmedLogError
+from superset.ace.util_class import (START_TS, RESPONSE_CODE, RESPONSE, IV, Node,
+                                     NodeType, Dependency, Checkpoint)
+
+# max number of seconds a subscription waits before looking for the
+# versions added by other processes
+SYNC_INTERVAL = 0.5
+# seconds a process owns its txns for without renewing its lease
+DEFAULT_LEASE_DURATION = 120
+# the logs are compacted once they have this many new events
+MIN_COMPACTION_EVENTS = 1024
+
+TXN_EVENT = "txn"
+VERSION_EVENT = "version"
+COMMIT_EVENT = "commit"
+CONFIG_EVENT = "config"
+ABORT_EVENT = "abort"
+
+# the result of a chart of an aborted txn without an older result
+ABORTED_RESULT = {RESPONSE_CODE: 500,
+                  RESPONSE: "The refresh was aborted, its process stopped"}
+
+
+# Raised by submit_one_txn when the replica turned stale while submitting the
+# txn. The txn is in the store: the replica of the same owner that replaces
+# the stale one takes it over, see get_own_placeholder.
+class StaleReplicaError(Exception):
+    def __init__(self, ts: int, owner: str) -> None:
+        super().__init__(ts)
+        self.ts = ts
+        self.owner = owner
+
+
+def encode_dashboard_info(generation: str, dependency_list: list) -> bytes:
+    dependencies = [[dependency.prec.node_id, dependency.prec.node_type.value,
+                     dependency.dep.node_id, dependency.dep.node_type.value]
+                    for dependency in dependency_list]
+    return json.dumps({"generation": generation,
+                       "dependencies": dependencies}).encode("utf-8")
+
+
+def decode_dashboard_info(info: bytes) -> Tuple[str, list]:
+    info = json.loads(info)
+    dependency_list = [Dependency(Node(prec_id, NodeType(prec_type)),
+                                  Node(dep_id, NodeType(dep_type)))
+                       for prec_id, prec_type, dep_id, dep_type
+                       in info["dependencies"]]
+    return info["generation"], dependency_list
+
+
+def encode_event(header: dict, payload: bytes = b"") -> bytes:
+    return json.dumps(header).encode("utf-8") + b"\n" + payload
+
+
+def decode_event(record: bytes) -> Tuple[dict, bytes]:
+    header, payload = bytes(record).split(b"\n", 1)
+    return json.loads(header), payload
+
+
+# DashStateManager whose writes go through a state store shared by several
+# processes. Every process serving the dashboard keeps a replica of the state
+# and replays the logs of the store into it before it reads, so all the
+# property combinations read exactly as with a single process. The store
+# allocates the ts of the txns. A txn is scheduled and committed by the
+# process that submitted it; the replicas advance last_committed to ts only
+# once the owner of every txn up to ts has committed it.
+#
+# Each process renews a lease in the store from its garbage collector. Once
+# the lease of the owner of the oldest pending txn has expired, e.g., its
+# worker was recycled, any replica aborts the txns of that owner: their
+# charts keep their previous results and the replicas commit past them. The
+# leases of processes on several hosts assume their clocks are in sync.
+#
+# The oldest replica alive also compacts the logs after its garbage
+# collection: it saves a snapshot of the committed versions and of the
+# versions of the pending txns, and trims the records all the replicas have
+# replayed and the snapshot covers. New replicas start from the snapshot; a
+# replica that finds the records it needs trimmed is stale and is reloaded
+# with the same owner, which keeps its pending txns.
+class SharedDashStateManager(DashStateManager):
+    def __init__(self, dash_id: int, generation: str, dependency_list: list,
+                 store: BaseStateStore,
+                 lease_duration: float = DEFAULT_LEASE_DURATION) -> None:
+        super().__init__(dependency_list)
+        self.dash_id = dash_id
+        self.generation = generation
+        self.store = store
+        self.owner = uuid.uuid4().hex
+        self.sync_lock = Lock()
+        self.admission_lock = Lock()
+        self.num_synced_txns = 0
+        self.num_synced_events = 0
+        # owner of each replayed txn not committed yet, by ts
+        self.txn_owners = {}
+        # the last ts committed, or aborted, by each owner
+        self.owner_commits = {}
+        # the args of the last replayed config, kept in the snapshots
+        self.config_args = None
+        # viewport and placeholders of the txns submitted by this process
+        self.own_txns = {}
+        self.own_placeholders = {}
+        self.lease_duration = lease_duration
+        self.lease_expires_at = 0.0
+        self.num_compacted_events = 0
+        self.is_stale = False
+        # when the dashboard of the store was last found to be this one's
+        self.validated_at = time.time()
+
+    @classmethod
+    def create(cls, dash_id: int, dependency_list: list, store: BaseStateStore,
+               lease_duration: float = DEFAULT_LEASE_DURATION):
+        generation = uuid.uuid4().hex
+        store.save_dashboard(dash_id, encode_dashboard_info(generation,
+                                                            dependency_list))
+        ds_state_manager = cls(dash_id, generation, dependency_list, store,
+                               lease_duration)
+        ds_state_manager.renew_lease()
+        return ds_state_manager
+
+    # A replica replacing a stale one passes its owner, to take over its txns
+    @classmethod
+    def load(cls, dash_id: int, info: bytes, store: BaseStateStore,
+             lease_duration: float = DEFAULT_LEASE_DURATION, owner: str = None):
+        generation, dependency_list = decode_dashboard_info(info)
+        ds_state_manager = cls(dash_id, generation, dependency_list, store,
+                               lease_duration)
+        if owner is not None:
+            ds_state_manager.owner = owner
+        ds_state_manager.restore_snapshot()
+        ds_state_manager.renew_lease()
+        ds_state_manager.sync()
+        return ds_state_manager
+
+    def delete(self) -> None:
+        self.store.delete_dashboard(self.dash_id, self.generation)
+
+    # a replica that is replaced stops holding back the compaction
+    def release_lease(self) -> None:
+        self.store.delete_lease(self.dash_id, self.generation, self.owner)
+
+    def submit_one_txn(self, node_id_set: set,
+                       node_ids_in_view_port: set,
+                       duration: int) -> Tuple[int, list]:
+        # the lease covers the txn before the txn is in the store
+        if time.time() > self.lease_expires_at - self.lease_duration / 2:
+            self.renew_lease()
+        record = encode_event({"type": TXN_EVENT, "owner": self.owner,
+                               "node_ids": sorted(node_id_set)})
+        self.sync_lock.acquire()
+        ts = self.store.append_txn(self.dash_id, self.generation, record)
+        self.own_txns[ts] = (node_ids_in_view_port, duration)
+        self.sync_lock.release()
+        self.sync()
+        ret_list = self.own_placeholders.pop(ts, None)
+        if ret_list is None:
+            raise StaleReplicaError(ts, self.owner)
+        return ts, ret_list
+
+    # the node groups of txn ts of this owner, submitted by the stale replica
+    # this one replaced
+    def get_own_placeholder(self, ts: int, node_id_set: set) -> list:
+        ret_list = self.own_placeholders.pop(ts, None)
+        if ret_list is None:
+            # the snapshot the replica started from covers the txn
+            ret_list = list(self.view_graph.get_impacted_groups(node_id_set))
+        return ret_list
+
+    # The queue depth is the one of this replica: each process admits the
+    # txns of its requests atomically, but processes admitting txns at the
+    # same time may go past max_pending_txns by one txn each
+    def try_submit_one_txn(self, node_id_set: set,
+                           node_ids_in_view_port: set,
+                           duration: int) -> Tuple[int, list]:
+        self.admission_lock.acquire()
+        try:
+            if not self.admit_txn():
+                return None
+            return self.submit_one_txn(node_id_set, node_ids_in_view_port, duration)
+        finally:
+            self.admission_lock.release()
+
+    def finish_one_update(self, node_id: int, ts: int, result: dict) -> None:
+        record = encode_event({"type": VERSION_EVENT, "node_id": node_id, "ts": ts},
+                              payload_store.serialize(result))
+        self.store.append_event(self.dash_id, self.generation, record)
+        self.sync()
+
+    def commit_one_txn(self, ts: int) -> None:
+        record = encode_event({"type": COMMIT_EVENT, "owner": self.owner, "ts": ts})
+        self.store.append_event(self.dash_id, self.generation, record)
+        self.sync()
+
+    def config_state_manager(self, *args) -> None:
+        record = encode_event({"type": CONFIG_EVENT, "args": list(args)})
+        self.store.append_event(self.dash_id, self.generation, record)
+        self.sync()
+
+    def _read_view_port(self, node_id_set: set, duration: int) -> tuple:
+        self.sync()
+        return super()._read_view_port(node_id_set, duration)
+
+    def get_queue_depth(self) -> int:
+        self.sync()
+        return super().get_queue_depth()
+
+    # other processes do not notify this one, look for their versions
+    # every SYNC_INTERVAL seconds
+    def wait_for_new_versions(self, seq: int, timeout: float) -> int:
+        return super().wait_for_new_versions(seq, min(timeout, SYNC_INTERVAL))
+
+    # Replays the records of the store this replica has not seen yet. The
+    # events are read first: the txn of a version is in the store before
+    # the version is.
+    def sync(self) -> None:
+        self.sync_lock.acquire()
+        try:
+            try:
+                events = self.store.read_events(self.dash_id, self.generation,
+                                                self.num_synced_events)
+                txns = self.store.read_txns(self.dash_id, self.generation,
+                                            self.num_synced_txns)
+            except TrimmedLogError:
+                self.is_stale = True
+                return
+            for record in txns:
+                self._replay_txn(record)
+            for record in events:
+                self._replay_event(record)
+                self.num_synced_events += 1
+            self._replay_commits()
+        finally:
+            self.sync_lock.release()
+
+    def _replay_txn(self, record: bytes) -> None:
+        header, _ = decode_event(record)
+        ts = self.num_synced_txns
+        node_ids_in_view_port, duration = self.own_txns.pop(ts, (set(), 0))
+        # the replica allocates the same ts since it replays the txns in order
+        ts, ret_list = super().submit_one_txn(set(header["node_ids"]),
+                                              node_ids_in_view_port, duration)
+        self.txn_owners[ts] = header["owner"]
+        self.num_synced_txns += 1
+        if header["owner"] == self.owner:
+            self.own_placeholders[ts] = ret_list
+
+    def _replay_event(self, record: bytes) -> None:
+        header, payload = decode_event(record)
+        if header["type"] == VERSION_EVENT:
+            super().finish_one_update(header["node_id"], header["ts"],
+                                      deserialize_payload(payload))
+        elif header["type"] == COMMIT_EVENT:
+            self.owner_commits[header["owner"]] = max(
+                self.owner_commits.get(header["owner"], START_TS), header["ts"])
+        elif header["type"] == CONFIG_EVENT:
+            self.config_args = header["args"]
+            super().config_state_manager(*header["args"])
+        elif header["type"] == ABORT_EVENT:
+            self._abort_txns(header["owner"], header["ts"])
+
+    def _replay_commits(self) -> None:
+        last_committed = self.last_committed
+        ts = last_committed
+        while ts + 1 < self.num_synced_txns and \
+            self.owner_commits.get(self.txn_owners[ts + 1], START_TS) >= ts + 1:
+            ts += 1
+        if ts > last_committed:
+            super().commit_one_txn(ts)
+            for committed_ts in range(last_committed + 1, ts + 1):
+                del self.txn_owners[committed_ts]
+
+    # The charts of the txns of owner up to ts that are still IVs get the
+    # newest result before the txn. Every replica replays the abort at the
+    # same point of the logs, so they all write the same versions.
+    def _abort_txns(self, owner: str, ts: int) -> None:
+        last_commit = self.owner_commits.get(owner, START_TS)
+        for aborted_ts in range(last_commit + 1, ts + 1):
+            if self.txn_owners.get(aborted_ts, None) != owner:
+                continue
+            for node_id, node in self.view_graph.id_to_node.items():
+                version = node.get_version_by_snapshot(aborted_ts)
+                if isinstance(version, IV) and version.ts == aborted_ts:
+                    super().finish_one_update(node_id, aborted_ts,
+                                              self._result_before(node, aborted_ts))
+        self.owner_commits[owner] = max(last_commit, ts)
+
+    @staticmethod
+    def _result_before(node: Node, ts: int) -> dict:
+        ts_list, iv_flags, payloads, _ = node.versions.state
+        idx = bisect_right(ts_list, ts - 1) - 1
+        while idx >= 0 and iv_flags[idx]:
+            idx -= 1
+        if idx < 0 or payloads[idx].ts == START_TS:
+            return ABORTED_RESULT
+        return payloads[idx].result
+
+    # The following functions are used by a garbage collector
+    def clean_unused_versions(self) -> Tuple[int, int]:
+        ret = super().clean_unused_versions()
+        if not self.is_released:
+            try:
+                self.maintain_store()
+            except Exception:  # pylint: disable=broad-except
+                traceback.print_exc()
+        return ret
+
+    def renew_lease(self) -> None:
+        expires_at = time.time() + self.lease_duration
+        lease = json.dumps({"expires_at": expires_at,
+                            "txns": self.num_synced_txns,
+                            "events": self.num_synced_events}).encode("utf-8")
+        self.store.save_lease(self.dash_id, self.generation, self.owner, lease)
+        self.lease_expires_at = expires_at
+
+    def maintain_store(self) -> None:
+        self.sync()
+        self.renew_lease()
+        cur_time = time.time()
+        leases = {}
+        for owner, lease in self.store.load_leases(self.dash_id,
+                                                   self.generation).items():
+            leases[owner] = json.loads(lease)
+        live_leases = {owner: lease for owner, lease in leases.items()
+                       if lease["expires_at"] > cur_time}
+        self._abort_orphaned_txns(live_leases)
+        if self.owner == min(live_leases, default=self.owner):
+            self._compact(leases, live_leases)
+
+    # aborts the txns of the owners without a live lease that the commits
+    # wait for
+    def _abort_orphaned_txns(self, live_leases: dict) -> None:
+        while True:
+            self.sync_lock.acquire()
+            owner = self.txn_owners.get(self.last_committed + 1, None)
+            if owner is None or owner in live_leases:
+                self.sync_lock.release()
+                return
+            ts = max(ts for ts, txn_owner in self.txn_owners.items()
+                     if txn_owner == owner)
+            self.sync_lock.release()
+            record = encode_event({"type": ABORT_EVENT, "owner": owner, "ts": ts})
+            self.store.append_event(self.dash_id, self.generation, record)
+            self.sync()
+            if self.is_stale:
+                return
+
+    def _compact(self, leases: dict, live_leases: dict) -> None:
+        if self.num_synced_events - self.num_compacted_events < MIN_COMPACTION_EVENTS:
+            return
+        snapshot, last_committed, num_events = self._take_snapshot()
+        self.store.save_snapshot(self.dash_id, self.generation, snapshot)
+        # the replicas still replaying older records keep them, until a
+        # later pass
+        num_txns = min([last_committed + 1] +
+                       [lease["txns"] for lease in live_leases.values()])
+        num_events = min([num_events] +
+                         [lease["events"] for lease in live_leases.values()])
+        self.store.trim_logs(self.dash_id, self.generation, max(num_txns, 0),
+                             num_events)
+        self.num_compacted_events = num_events
+        pending_owners = set(self.txn_owners.values())
+        for owner in leases:
+            if owner not in live_leases and owner not in pending_owners:
+                self.store.delete_lease(self.dash_id, self.generation, owner)
+
+    # The committed version of each node and the versions of the pending
+    # txns, after num_events events
+    def _take_snapshot(self) -> Tuple[bytes, int, int]:
+        self.sync_lock.acquire()
+        self.global_lock.acquire()
+        last_committed = self.last_committed
+        versions = []
+        fragments = []
+        for node_id, node in self.view_graph.id_to_node.items():
+            ts_list, iv_flags, payloads, _ = node.versions.state
+            idx = bisect_right(ts_list, last_committed) - 1
+            while idx >= 0 and iv_flags[idx]:
+                idx -= 1
+            if node.node_type != NodeType.VIZ:
+                # replaying the pending txns writes their versions again
+                end = idx + 1
+            else:
+                end = len(ts_list)
+            for cur_idx in range(max(idx, 0), end):
+                version = payloads[cur_idx]
+                if iv_flags[cur_idx] or version.ts == START_TS:
+                    continue
+                fragment = version.fragment
+                if fragment is None:
+                    fragment = serialize_payload(version.result)
+                versions.append([node_id, version.ts, len(fragment)])
+                fragments.append(bytes(fragment))
+        self.global_lock.release()
+        num_txns = self.num_synced_txns
+        num_events = self.num_synced_events
+        header = {"last_committed": last_committed,
+                  "txns": num_txns,
+                  "events": num_events,
+                  "config": self.config_args,
+                  "owner_commits": self.owner_commits,
+                  "versions": versions}
+        snapshot = encode_event(header, b"".join(fragments))
+        self.sync_lock.release()
+        return snapshot, last_committed, num_events
+
+    # Must be called before the first sync
+    def restore_snapshot(self) -> None:
+        snapshot = self.store.load_snapshot(self.dash_id, self.generation)
+        if snapshot is None:
+            return
+        header, payload = decode_event(snapshot)
+        last_committed = header["last_committed"]
+        if header["config"] is not None:
+            self.config_args = header["config"]
+            super().config_state_manager(*header["config"])
+        committed_versions = {}
+        pending_versions = []
+        offset = 0
+        for node_id, ts, length in header["versions"]:
+            fragment = payload[offset:offset + length]
+            offset += length
+            if ts <= last_committed:
+                committed_versions[node_id] = (ts, fragment)
+            else:
+                pending_versions.append((node_id, ts, fragment))
+        self.sync_lock.acquire()
+        try:
+            if last_committed > START_TS:
+                self.restore_checkpoint(Checkpoint(last_committed,
+                                                   committed_versions, {}))
+            self.num_synced_txns = last_committed + 1
+            txns = self.store.read_txns(self.dash_id, self.generation,
+                                        self.num_synced_txns)
+            for record in txns[:header["txns"] - self.num_synced_txns]:
+                self._replay_txn(record)
+            for node_id, ts, fragment in pending_versions:
+                super().finish_one_update(node_id, ts, deserialize_payload(fragment))
+            self.owner_commits = header["owner_commits"]
+            self.num_synced_events = header["events"]
+            self.num_compacted_events = header["events"]
+        except TrimmedLogError:
+            self.is_stale = True
+        finally:
+            self.sync_lock.release()
@@ -0,0 +1,517 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import fcntl
+import glob
+import mmap
+import os
+import struct
+from abc import ABC, abstractmethod
+from threading import Lock
+
+from redis import WatchError
+
+# first index, next index and end offset of the records of a MmapLog
+LOG_HEADER = struct.Struct("<QQQ")
+RECORD_LEN = struct.Struct("<I")
+
+
+# Raised when reading records a compaction has dropped, see trim_logs
+class TrimmedLogError(Exception):
+    pass
+
+
+# Storage shared by the processes serving ACE, see SharedDashStateManager.
+# For each dashboard it keeps an info record and two append-only logs of
+# byte records: the submitted txns, whose index in the log is their ts, and
+# the events (new versions, commits, configs, aborts). The info record names
+# the generation of the logs so that a dashboard state created again starts
+# from empty logs.
+#
+# The logs are compacted: a snapshot of the state up to some index of each
+# log is saved and the records below are trimmed. Indices never shift, so
+# reading below the first kept index raises TrimmedLogError. Each process
+# also holds a lease record, which it renews while it is alive.
+class BaseStateStore(ABC):
+    @abstractmethod
+    def save_dashboard(self, dash_id: int, info: bytes) -> None:
+        pass
+
+    @abstractmethod
+    def load_dashboard(self, dash_id: int) -> bytes:
+        pass
+
+    @abstractmethod
+    def delete_dashboard(self, dash_id: int, generation: str) -> None:
+        pass
+
+    # returns the index of the record, i.e., the ts of the txn
+    @abstractmethod
+    def append_txn(self, dash_id: int, generation: str, record: bytes) -> int:
+        pass
+
+    @abstractmethod
+    def read_txns(self, dash_id: int, generation: str, start: int) -> list:
+        pass
+
+    @abstractmethod
+    def append_event(self, dash_id: int, generation: str, record: bytes) -> int:
+        pass
+
+    @abstractmethod
+    def read_events(self, dash_id: int, generation: str, start: int) -> list:
+        pass
+
+    # drops the txns below index num_txns and the events below num_events
+    @abstractmethod
+    def trim_logs(self, dash_id: int, generation: str, num_txns: int,
+                  num_events: int) -> None:
+        pass
+
+    @abstractmethod
+    def save_snapshot(self, dash_id: int, generation: str, snapshot: bytes) -> None:
+        pass
+
+    @abstractmethod
+    def load_snapshot(self, dash_id: int, generation: str) -> bytes:
+        pass
+
+    @abstractmethod
+    def save_lease(self, dash_id: int, generation: str, owner: str,
+                   lease: bytes) -> None:
+        pass
+
+    # owner -> lease
+    @abstractmethod
+    def load_leases(self, dash_id: int, generation: str) -> dict:
+        pass
+
+    @abstractmethod
+    def delete_lease(self, dash_id: int, generation: str, owner: str) -> None:
+        pass
+
+
+# Store in the memory of one process, e.g., to test SharedDashStateManager
+# with several replicas
+class LocalStateStore(BaseStateStore):
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.infos = {}
+        # (dash_id, generation, name) -> [first index, records]
+        self.logs = {}
+        self.snapshots = {}
+        self.leases = {}
+
+    def save_dashboard(self, dash_id: int, info: bytes) -> None:
+        self.lock.acquire()
+        self.infos[dash_id] = info
+        self.lock.release()
+
+    def load_dashboard(self, dash_id: int) -> bytes:
+        return self.infos.get(dash_id, None)
+
+    def delete_dashboard(self, dash_id: int, generation: str) -> None:
+        self.lock.acquire()
+        self.infos.pop(dash_id, None)
+        for name in ("txns", "events"):
+            self.logs.pop((dash_id, generation, name), None)
+        self.snapshots.pop((dash_id, generation), None)
+        self.leases.pop((dash_id, generation), None)
+        self.lock.release()
+
+    def _append(self, key: tuple, record: bytes) -> int:
+        self.lock.acquire()
+        log = self.logs.setdefault(key, [0, []])
+        log[1].append(bytes(record))
+        idx = log[0] + len(log[1]) - 1
+        self.lock.release()
+        return idx
+
+    def _read_from(self, key: tuple, start: int) -> list:
+        self.lock.acquire()
+        first, records = self.logs.get(key, (0, []))
+        self.lock.release()
+        if start < first:
+            raise TrimmedLogError(start)
+        return records[start - first:]
+
+    def append_txn(self, dash_id: int, generation: str, record: bytes) -> int:
+        return self._append((dash_id, generation, "txns"), record)
+
+    def read_txns(self, dash_id: int, generation: str, start: int) -> list:
+        return self._read_from((dash_id, generation, "txns"), start)
+
+    def append_event(self, dash_id: int, generation: str, record: bytes) -> int:
+        return self._append((dash_id, generation, "events"), record)
+
+    def read_events(self, dash_id: int, generation: str, start: int) -> list:
+        return self._read_from((dash_id, generation, "events"), start)
+
+    def trim_logs(self, dash_id: int, generation: str, num_txns: int,
+                  num_events: int) -> None:
+        self.lock.acquire()
+        for name, start in (("txns", num_txns), ("events", num_events)):
+            log = self.logs.setdefault((dash_id, generation, name), [0, []])
+            if start > log[0]:
+                # a new list, readers may hold the old one
+                log[1] = log[1][start - log[0]:]
+                log[0] = start
+        self.lock.release()
+
+    def save_snapshot(self, dash_id: int, generation: str, snapshot: bytes) -> None:
+        self.snapshots[(dash_id, generation)] = snapshot
+
+    def load_snapshot(self, dash_id: int, generation: str) -> bytes:
+        return self.snapshots.get((dash_id, generation), None)
+
+    def save_lease(self, dash_id: int, generation: str, owner: str,
+                   lease: bytes) -> None:
+        self.lock.acquire()
+        self.leases.setdefault((dash_id, generation), {})[owner] = lease
+        self.lock.release()
+
+    def load_leases(self, dash_id: int, generation: str) -> dict:
+        self.lock.acquire()
+        leases = dict(self.leases.get((dash_id, generation), {}))
+        self.lock.release()
+        return leases
+
+    def delete_lease(self, dash_id: int, generation: str, owner: str) -> None:
+        self.lock.acquire()
+        self.leases.get((dash_id, generation), {}).pop(owner, None)
+        self.lock.release()
+
+
+# Store on a Redis server, shared by all hosts. client is any client speaking
+# the Redis protocol with the redis-py interface, e.g., redis.Redis. A log is
+# a list and the index of its first record, updated together in MULTI/EXEC
+# transactions so that an append atomically allocates the index of its record.
+class RedisStateStore(BaseStateStore):
+    def __init__(self, client, prefix: str = "ace") -> None:
+        self.client = client
+        self.prefix = prefix
+
+    def _info_key(self, dash_id: int) -> str:
+        return f"{self.prefix}:{dash_id}"
+
+    def _log_key(self, dash_id: int, generation: str, name: str) -> str:
+        return f"{self.prefix}:{dash_id}:{generation}:{name}"
+
+    def save_dashboard(self, dash_id: int, info: bytes) -> None:
+        self.client.set(self._info_key(dash_id), info)
+
+    def load_dashboard(self, dash_id: int) -> bytes:
+        return self.client.get(self._info_key(dash_id))
+
+    def delete_dashboard(self, dash_id: int, generation: str) -> None:
+        self.client.delete(self._info_key(dash_id),
+                           *[self._log_key(dash_id, generation, name)
+                             for name in ("txns", "txns:first", "events",
+                                          "events:first", "snapshot", "leases")])
+
+    def _append(self, key: str, record: bytes) -> int:
+        pipe = self.client.pipeline()
+        pipe.get(key + ":first")
+        pipe.rpush(key, record)
+        first, length = pipe.execute()
+        return int(first or 0) + length - 1
+
+    def _read_from(self, key: str, start: int) -> list:
+        while True:
+            first = int(self.client.get(key + ":first") or 0)
+            if start < first:
+                raise TrimmedLogError(start)
+            pipe = self.client.pipeline()
+            pipe.get(key + ":first")
+            pipe.lrange(key, start - first, -1)
+            cur_first, records = pipe.execute()
+            # retry if trimmed in the meantime
+            if int(cur_first or 0) == first:
+                return records
+
+    def append_txn(self, dash_id: int, generation: str, record: bytes) -> int:
+        return self._append(self._log_key(dash_id, generation, "txns"), record)
+
+    def read_txns(self, dash_id: int, generation: str, start: int) -> list:
+        return self._read_from(self._log_key(dash_id, generation, "txns"), start)
+
+    def append_event(self, dash_id: int, generation: str, record: bytes) -> int:
+        return self._append(self._log_key(dash_id, generation, "events"), record)
+
+    def read_events(self, dash_id: int, generation: str, start: int) -> list:
+        return self._read_from(self._log_key(dash_id, generation, "events"), start)
+
+    def trim_logs(self, dash_id: int, generation: str, num_txns: int,
+                  num_events: int) -> None:
+        for name, start in (("txns", num_txns), ("events", num_events)):
+            key = self._log_key(dash_id, generation, name)
+            with self.client.pipeline() as pipe:
+                try:
+                    pipe.watch(key + ":first")
+                    first = int(pipe.get(key + ":first") or 0)
+                    if start <= first:
+                        continue
+                    pipe.multi()
+                    pipe.ltrim(key, start - first, -1)
+                    pipe.set(key + ":first", start)
+                    pipe.execute()
+                except WatchError:
+                    # trimmed by another process in the meantime
+                    pass
+
+    def save_snapshot(self, dash_id: int, generation: str, snapshot: bytes) -> None:
+        self.client.set(self._log_key(dash_id, generation, "snapshot"), snapshot)
+
+    def load_snapshot(self, dash_id: int, generation: str) -> bytes:
+        return self.client.get(self._log_key(dash_id, generation, "snapshot"))
+
+    def save_lease(self, dash_id: int, generation: str, owner: str,
+                   lease: bytes) -> None:
+        self.client.hset(self._log_key(dash_id, generation, "leases"), owner, lease)
+
+    def load_leases(self, dash_id: int, generation: str) -> dict:
+        leases = self.client.hgetall(self._log_key(dash_id, generation, "leases"))
+        return {owner.decode("utf-8") if isinstance(owner, bytes) else owner: lease
+                for owner, lease in leases.items()}
+
+    def delete_lease(self, dash_id: int, generation: str, owner: str) -> None:
+        self.client.hdel(self._log_key(dash_id, generation, "leases"), owner)
+
+
+# Append-only log of byte records in a file shared by the processes of one
+# host. Writers append under an exclusive flock and publish the record by
+# updating the header last; readers map the file and parse the records
+# counted by the header. Trimming writes the kept records to a new file
+# that replaces the log; the processes reopen the log when they see it.
+class MmapLog:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        # flock does not exclude the threads of one process
+        self.lock = Lock()
+        self.fd = None
+        self.buf = None
+        self._open()
+
+    def _open(self) -> None:
+        if self.buf is not None:
+            self.buf.close()
+            self.buf = None
+        if self.fd is not None:
+            os.close(self.fd)
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        # index and offset of the next record to read
+        self.read_pos = None
+
+    # flocks the current file of the log, reopening it if it was replaced
+    def _lock_file(self, operation: int) -> None:
+        while True:
+            fcntl.flock(self.fd, operation)
+            try:
+                if os.stat(self.path).st_ino == os.fstat(self.fd).st_ino:
+                    return
+            except FileNotFoundError:
+                pass
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            self._open()
+
+    def _read_header(self) -> tuple:
+        header = os.pread(self.fd, LOG_HEADER.size, 0)
+        if len(header) < LOG_HEADER.size:
+            return 0, 0, LOG_HEADER.size
+        return LOG_HEADER.unpack(header)
+
+    def append(self, record: bytes) -> int:
+        self.lock.acquire()
+        self._lock_file(fcntl.LOCK_EX)
+        try:
+            first, count, end = self._read_header()
+            os.pwrite(self.fd, RECORD_LEN.pack(len(record)) + record, end)
+            os.pwrite(self.fd, LOG_HEADER.pack(first, count + 1,
+                                               end + RECORD_LEN.size + len(record)), 0)
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            self.lock.release()
+        return count
+
+    def read_from(self, start: int) -> list:
+        self.lock.acquire()
+        try:
+            self._lock_file(fcntl.LOCK_SH)
+            try:
+                first, count, end = self._read_header()
+            finally:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+            if start < first:
+                raise TrimmedLogError(start)
+            if start >= count:
+                return []
+            if self.buf is None or len(self.buf) < end:
+                if self.buf is not None:
+                    self.buf.close()
+                self.buf = mmap.mmap(self.fd, end, access=mmap.ACCESS_READ)
+            idx, offset = self.read_pos or (first, LOG_HEADER.size)
+            if idx > start:
+                idx, offset = first, LOG_HEADER.size
+            records = []
+            while idx < count:
+                length = RECORD_LEN.unpack_from(self.buf, offset)[0]
+                offset += RECORD_LEN.size
+                if idx >= start:
+                    records.append(self.buf[offset:offset + length])
+                offset += length
+                idx += 1
+            self.read_pos = (idx, offset)
+            return records
+        finally:
+            self.lock.release()
+
+    def trim(self, start: int) -> None:
+        self.lock.acquire()
+        self._lock_file(fcntl.LOCK_EX)
+        try:
+            first, count, end = self._read_header()
+            if start <= first:
+                return
+            start = min(start, count)
+            offset = LOG_HEADER.size
+            with mmap.mmap(self.fd, end, access=mmap.ACCESS_READ) as buf:
+                for _ in range(first, start):
+                    offset += RECORD_LEN.size + RECORD_LEN.unpack_from(buf, offset)[0]
+                kept = buf[offset:end]
+            with open(self.path + ".tmp", "wb") as log_file:
+                log_file.write(LOG_HEADER.pack(start, count,
+                                               LOG_HEADER.size + len(kept)))
+                log_file.write(kept)
+            # the processes waiting for the flock of the old file reopen it
+            os.replace(self.path + ".tmp", self.path)
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            self.lock.release()
+
+    def close(self) -> None:
+        self.lock.acquire()
+        if self.buf is not None:
+            self.buf.close()
+            self.buf = None
+        os.close(self.fd)
+        self.lock.release()
+
+
+# Store in memory-mapped files of a local directory, shared by the processes
+# of one host, e.g., the workers of one gunicorn server
+class MmapStateStore(BaseStateStore):
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.lock = Lock()
+        self.logs = {}
+
+    def _info_path(self, dash_id: int) -> str:
+        return os.path.join(self.directory, f"{dash_id}.info")
+
+    def _path(self, dash_id: int, generation: str, name: str) -> str:
+        return os.path.join(self.directory, f"{dash_id}-{generation}.{name}")
+
+    def _get_log(self, dash_id: int, generation: str, name: str) -> MmapLog:
+        path = self._path(dash_id, generation, name)
+        self.lock.acquire()
+        log = self.logs.get(path, None)
+        if log is None:
+            log = MmapLog(path)
+            self.logs[path] = log
+        self.lock.release()
+        return log
+
+    @staticmethod
+    def _write_file(path: str, data: bytes) -> None:
+        with open(path + ".tmp", "wb") as data_file:
+            data_file.write(data)
+        os.replace(path + ".tmp", path)
+
+    @staticmethod
+    def _read_file(path: str) -> bytes:
+        try:
+            with open(path, "rb") as data_file:
+                return data_file.read()
+        except FileNotFoundError:
+            return None
+
+    def save_dashboard(self, dash_id: int, info: bytes) -> None:
+        self._write_file(self._info_path(dash_id), info)
+
+    def load_dashboard(self, dash_id: int) -> bytes:
+        return self._read_file(self._info_path(dash_id))
+
+    def delete_dashboard(self, dash_id: int, generation: str) -> None:
+        paths = [self._info_path(dash_id), self._path(dash_id, generation, "snapshot")]
+        paths.extend(glob.glob(self._path(dash_id, generation, "*.lease")))
+        self.lock.acquire()
+        for name in ("txns", "events"):
+            path = self._path(dash_id, generation, name)
+            log = self.logs.pop(path, None)
+            if log is not None:
+                log.close()
+            paths.append(path)
+        self.lock.release()
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def append_txn(self, dash_id: int, generation: str, record: bytes) -> int:
+        return self._get_log(dash_id, generation, "txns").append(record)
+
+    def read_txns(self, dash_id: int, generation: str, start: int) -> list:
+        return self._get_log(dash_id, generation, "txns").read_from(start)
+
+    def append_event(self, dash_id: int, generation: str, record: bytes) -> int:
+        return self._get_log(dash_id, generation, "events").append(record)
+
+    def read_events(self, dash_id: int, generation: str, start: int) -> list:
+        return self._get_log(dash_id, generation, "events").read_from(start)
+
+    def trim_logs(self, dash_id: int, generation: str, num_txns: int,
+                  num_events: int) -> None:
+        self._get_log(dash_id, generation, "txns").trim(num_txns)
+        self._get_log(dash_id, generation, "events").trim(num_events)
+
+    def save_snapshot(self, dash_id: int, generation: str, snapshot: bytes) -> None:
+        self._write_file(self._path(dash_id, generation, "snapshot"), snapshot)
+
+    def load_snapshot(self, dash_id: int, generation: str) -> bytes:
+        return self._read_file(self._path(dash_id, generation, "snapshot"))
+
+    def save_lease(self, dash_id: int, generation: str, owner: str,
+                   lease: bytes) -> None:
+        self._write_file(self._path(dash_id, generation, f"{owner}.lease"), lease)
+
+    def load_leases(self, dash_id: int, generation: str) -> dict:
+        leases = {}
+        suffix = ".lease"
+        prefix = self._path(dash_id, generation, "")
+        for path in glob.glob(self._path(dash_id, generation, "*" + suffix)):
+            lease = self._read_file(path)
+            if lease is not None:
+                leases[path[len(prefix):-len(suffix)]] = lease
+        return leases
+
+    def delete_lease(self, dash_id: int, generation: str, owner: str) -> None:
+        try:
+            os.remove(self._path(dash_id, generation, f"{owner}.lease"))
+        except FileNotFoundError:
+            pass
@@ -15,6 +15,8 @@
 # specific language governing permissions and limitations
 # under the License.
 
+from array import array
+from bisect import bisect_left, bisect_right
 from enum import Enum
 from typing import NamedTuple
 from threading import Lock
@@ -22,6 +24,14 @@ from threading import Lock
 START_TS = -1
 RESPONSE_CODE = "response_code"
 RESPONSE = "response"
+# what ace/<pk>/refresh does with a txn over the max_pending_txns of a
+# dashboard: reject it, or merge it into the pending txn if possible
+ADMISSION_REJECT = "reject"
+ADMISSION_MERGE = "merge"
+# weight of the newest interval in the moving average of the commit interval
+COMMIT_INTERVAL_ALPHA = 0.2
+# nodes share NODE_LOCK_STRIPES locks instead of owning one each
+NODE_LOCK_STRIPES = 64
 
 
 class PropertyCombination(Enum):
@@ -33,6 +43,8 @@ class PropertyCombination(Enum):
 
 
 class BaseVersion:
+    __slots__ = ("ts",)
+
     def __init__(self, ts: int) -> None:
         self.ts = ts
 
@@ -41,6 +53,8 @@ class BaseVersion:
 
 
 class IV(BaseVersion):
+    __slots__ = ("code",)
+
     def __init__(self, ts: int) -> None:
         super().__init__(ts)
         self.code = 200
@@ -51,14 +65,35 @@ class IV(BaseVersion):
 
 
 class Version(BaseVersion):
-    def __init__(self, ts: int, result: dict) -> None:
+    __slots__ = ("result", "num_bytes", "digest", "fragment")
+
+    # digest is the key of result in the payload store and fragment its
+    # serialization, if it is stored there
+    def __init__(self, ts: int, result: dict, num_bytes: int = 0,
+                 digest: str = None, fragment: bytes = None) -> None:
         super().__init__(ts)
         self.result = result
+        self.num_bytes = num_bytes
+        self.digest = digest
+        self.fragment = fragment
 
     def to_basic_type_dict(self) -> dict:
         return {"ts": self.ts,
                 "version_result": self.result}
 
+    def equal_payload(self, other) -> bool:
+        return self.digest is not None and isinstance(other, Version) \
+            and self.digest == other.digest
+
+
+# A Version whose result the reader has already read at an older ts
+class UnchangedVersion(BaseVersion):
+    __slots__ = ()
+
+    def to_basic_type_dict(self) -> dict:
+        return {"ts": self.ts,
+                "version_result": "UNCHANGED"}
+
 
 class NodeType(Enum):
     BASE_TABLE = 1
@@ -66,62 +101,213 @@ class NodeType(Enum):
     VIZ = 3
 
 
+# Versions of one node sorted by ts and stored as parallel arrays: the ts and
+# IV flags are integer arrays, the versions a list.
+#
+# Writers are serialized by Node.local_lock, readers take no lock. The arrays
+# and the index of the newest Version (i.e., not an IV) are published
+# together in the `state` tuple. Appends and in-place replacements mutate the
+# published arrays in an order that keeps every index a reader obtains from
+# ts_list valid; anything that shifts indices builds new arrays and
+# publishes them with a single assignment.
+class VersionChain:
+    __slots__ = ("state",)
+
+    def __init__(self) -> None:
+        self.state = (array("q"), array("b"), [], -1)
+
+    def __len__(self) -> int:
+        return len(self.state[0])
+
+    @property
+    def ts_list(self) -> list:
+        return self.state[0]
+
+    @property
+    def iv_flags(self) -> list:
+        return self.state[1]
+
+    @property
+    def payloads(self) -> list:
+        return self.state[2]
+
+    def append(self, version: BaseVersion) -> BaseVersion:
+        ts_list, iv_flags, payloads, visible_idx = self.state
+        if len(ts_list) != 0 and version.ts <= ts_list[-1]:
+            return self.insert(version)
+        is_iv = isinstance(version, IV)
+        payloads.append(version)
+        iv_flags.append(is_iv)
+        ts_list.append(version.ts)
+        if not is_iv:
+            self.state = (ts_list, iv_flags, payloads, len(ts_list) - 1)
+        return None
+
+    # returns the version replaced at the same ts, if any
+    def insert(self, version: BaseVersion) -> BaseVersion:
+        ts_list, iv_flags, payloads, visible_idx = self.state
+        is_iv = isinstance(version, IV)
+        idx = bisect_left(ts_list, version.ts)
+        replaced_version = None
+        if idx < len(ts_list) and ts_list[idx] == version.ts:
+            # in-place replacement, e.g. an IV turned into a Version
+            replaced_version = payloads[idx]
+            payloads[idx] = version
+            iv_flags[idx] = is_iv
+        else:
+            ts_list = ts_list[:idx] + array("q", [version.ts]) + ts_list[idx:]
+            iv_flags = iv_flags[:idx] + array("b", [is_iv]) + iv_flags[idx:]
+            payloads = payloads[:idx] + [version] + payloads[idx:]
+            if visible_idx >= idx:
+                visible_idx += 1
+        if not is_iv and idx > visible_idx:
+            visible_idx = idx
+        elif is_iv and idx == visible_idx:
+            visible_idx = idx - 1
+            while visible_idx >= 0 and iv_flags[visible_idx]:
+                visible_idx -= 1
+        self.state = (ts_list, iv_flags, payloads, visible_idx)
+        return replaced_version
+
+    def get_by_snapshot(self, ts: int) -> BaseVersion:
+        ts_list, _, payloads, _ = self.state
+        idx = bisect_right(ts_list, ts) - 1
+        if idx < 0:
+            return None
+        return payloads[idx]
+
+    def get_visible(self) -> BaseVersion:
+        _, _, payloads, visible_idx = self.state
+        if visible_idx < 0:
+            return None
+        return payloads[visible_idx]
+
+    def truncate_before(self, ts: int) -> list:
+        # keep the newest Version at or below ts so that both snapshot
+        # reads at ts and visible reads still find a result
+        ts_list, iv_flags, payloads, visible_idx = self.state
+        idx = bisect_right(ts_list, ts) - 1
+        while idx > 0 and iv_flags[idx]:
+            idx -= 1
+        if idx <= 0:
+            return []
+        self.state = (ts_list[idx:], iv_flags[idx:], payloads[idx:],
+                      visible_idx - idx)
+        return payloads[:idx]
+
+
+node_locks = [Lock() for _ in range(NODE_LOCK_STRIPES)]
+
+
 class Node:
+    __slots__ = ("node_id", "node_type", "versions")
+
     def __init__(self, node_id: int, node_type: NodeType):
         self.node_id = node_id
         self.node_type = node_type
-        self.versions = list()
-        self.local_lock = Lock()
+        self.versions = VersionChain()
+
+    @property
+    def local_lock(self) -> Lock:
+        return node_locks[hash(self.node_id) % NODE_LOCK_STRIPES]
 
     def add_iv(self, iv: IV):
         self.local_lock.acquire()
         self.versions.append(iv)
         self.local_lock.release()
 
-    def add_version(self, version: Version):
+    # for a version at a newer ts than the ones of the node
+    def append_version(self, version: Version) -> None:
         self.local_lock.acquire()
-        iv_index = 0
-        for iv_index in range(len(self.versions)):
-            basic_version = self.versions[iv_index]
-            if isinstance(basic_version, IV) and basic_version.ts == version.ts:
-                break
-        if iv_index < len(self.versions):
-            del self.versions[iv_index]
-            self.versions.insert(iv_index, version)
-        else:
-            self.versions.append(version)
+        self.versions.append(version)
         self.local_lock.release()
 
-    def get_version_by_snapshot(self, ts: int) -> BaseVersion:
+    def add_version(self, version: Version) -> BaseVersion:
         self.local_lock.acquire()
-        ret_version = None
-        max_ts = START_TS - 1
-        for version in self.versions:
-            if max_ts < version.ts <= ts:
-                ret_version = version
-                max_ts = version.ts
+        replaced_version = self.versions.insert(version)
         self.local_lock.release()
-        return ret_version
+        return replaced_version
+
+    # readers do not take local_lock, see VersionChain
+    def get_version_by_snapshot(self, ts: int) -> BaseVersion:
+        return self.versions.get_by_snapshot(ts)
 
     def get_visible_version(self) -> BaseVersion:
-        self.local_lock.acquire()
-        ret_version = None
-        max_ts = START_TS - 1
-        for version in self.versions:
-            if version.ts > max_ts and isinstance(version, Version):
-                ret_version = version
-                max_ts = version.ts
-        self.local_lock.release()
-        return ret_version
+        return self.versions.get_visible()
 
-    def clean_unused_versions(self, ts: int) -> None:
+    def clean_unused_versions(self, ts: int) -> list:
         self.local_lock.acquire()
-        lower_bound = START_TS - 1
-        for version in self.versions:
-            if lower_bound < version.ts <= ts:
-                lower_bound = version.ts
-        self.versions = [ver for ver in self.versions if ver.ts <= lower_bound]
+        removed_versions = self.versions.truncate_before(ts)
         self.local_lock.release()
+        return removed_versions
+
+
+# A counter per ts, for the consecutive ts from the oldest one kept on, in a
+# ring buffer that doubles when full
+class TsCounters:
+    __slots__ = ("first_ts", "start", "size", "counts")
+
+    def __init__(self, first_ts: int) -> None:
+        self.first_ts = first_ts
+        self.start = 0
+        self.size = 0
+        self.counts = array("q", [0] * 16)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _index(self, ts: int) -> int:
+        offset = ts - self.first_ts
+        if offset < 0 or offset >= self.size:
+            raise KeyError(ts)
+        return (self.start + offset) % len(self.counts)
+
+    def __getitem__(self, ts: int) -> int:
+        return self.counts[self._index(ts)]
+
+    # the ts after the newest one are added, with a count of 0
+    def __setitem__(self, ts: int, count: int) -> None:
+        while ts >= self.first_ts + self.size:
+            if self.size == len(self.counts):
+                counts = array("q", [self[cur_ts] for cur_ts in
+                                     range(self.first_ts, self.first_ts + self.size)])
+                counts.extend([0] * self.size)
+                self.counts = counts
+                self.start = 0
+            self.counts[(self.start + self.size) % len(self.counts)] = 0
+            self.size += 1
+        self.counts[self._index(ts)] = count
+
+    # the counts of lo_ts to hi_ts, inclusive
+    def get_range(self, lo_ts: int, hi_ts: int) -> tuple:
+        if hi_ts < lo_ts:
+            return ()
+        self._index(hi_ts)
+        lo = self._index(lo_ts)
+        end = lo + hi_ts - lo_ts + 1
+        if end <= len(self.counts):
+            return tuple(self.counts[lo:end])
+        return tuple(self.counts[lo:]) + tuple(self.counts[:end - len(self.counts)])
+
+    def discard_before(self, ts: int) -> None:
+        num_discarded = min(max(ts - self.first_ts, 0), self.size)
+        self.start = (self.start + num_discarded) % len(self.counts)
+        self.size -= num_discarded
+        self.first_ts += num_discarded
+
+
+class ReadEpoch(NamedTuple):
+    last_committed: int
+    last_submitted: int
+    # num_ivs[i] is the number of IVs of ts last_committed + i
+    num_ivs: tuple
+
+
+class Checkpoint(NamedTuple):
+    last_committed: int
+    # node_id -> (ts, serialized result)
+    versions: dict
+    node_metrics: dict
 
 
 class Dependency(NamedTuple):
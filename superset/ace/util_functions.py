@@ -14,38 +14,184 @@
 # KIND, either express or implied.  See the License for the
 # specific language governing permissions and limitations
 # under the License.
-from typing import Tuple
+import time
+from threading import Lock
+from typing import Iterator, Tuple
+
+import redis
+from flask import current_app
 
 from superset.ace.util_class import Node
 from superset.ace.util_class import NodeType
 from superset.ace.util_class import Dependency
+from superset.ace.util_class import ADMISSION_MERGE, ADMISSION_REJECT
 from superset.ace.ds_state_manager import DashStateManager
-from superset.ace.scheduler import Scheduler
+from superset.ace.shared_state_manager import (SharedDashStateManager,
+                                               StaleReplicaError,
+                                               decode_dashboard_info)
+from superset.ace.state_store import (BaseStateStore, RedisStateStore,
+                                      MmapStateStore)
+from superset.ace.scheduler_service import SchedulerService
+from superset.ace.cost_model import ChartCostModel
+from superset.ace.version_gc import VersionGarbageCollector
+from superset.ace.checkpoint import (CheckpointWriter, checkpoint_path,
+                                     load_checkpoint)
+from superset.ace.payload_store import payload_store
+from superset.ace.filter_scope import (FILTER_BOX_VIZ_TYPE, get_chart_order,
+                                       get_filter_box_columns, get_filter_node_id,
+                                       get_filter_scopes)
+from superset.ace.viewport_predictor import PREDICTOR_NONE
 
 from superset.models.dashboard import Dashboard
-from superset.extensions import (
-    ace_state_manager,
-    ace_scheduler_manager,
-)
+from superset.extensions import ace_state_manager
 
 DURATION = 1
 
+scheduler_service = None
+scheduler_service_lock = Lock()
+version_gc = None
+version_gc_lock = Lock()
+state_store = None
+state_store_lock = Lock()
+# serializes the loads of the replicas of the shared states
+replica_lock = Lock()
+checkpoint_writer = None
+checkpoint_writer_lock = Lock()
+
 
-def add_ds_state_manager(dashboard: Dashboard) -> None:
+# Returns the node id of each filter of the dashboard and the ids of the
+# charts in its scope, see filter_scope.py
+def add_ds_state_manager(dashboard: Dashboard) -> Tuple[dict, dict]:
     dash_id = dashboard.id
     dependency_list = []
-    for s in dashboard.slices:
+    chart_nodes = {}
+    filter_box_columns = {}
+    # in layout order, which the viewport predictors rely on
+    chart_order = {chart_id: idx for idx, chart_id
+                   in enumerate(get_chart_order(dashboard.position))}
+    for s in sorted(dashboard.slices,
+                    key=lambda slc: (chart_order.get(int(slc.id), len(chart_order)),
+                                     int(slc.id))):
         dep_node = Node(int(s.id), NodeType.VIZ)
         prec_node = Node(int(s.datasource_id), NodeType.BASE_TABLE)
         dependency_list.append(Dependency(prec_node, dep_node))
+        chart_nodes[dep_node.node_id] = dep_node
+        if s.viz_type == FILTER_BOX_VIZ_TYPE:
+            filter_box_columns[dep_node.node_id] = get_filter_box_columns(s.form_data)
+
+    filter_node_ids = {}
+    filter_scopes = {}
+    for filter_id, chart_ids in get_filter_scopes(dashboard.params_dict,
+                                                  dashboard.position,
+                                                  set(chart_nodes),
+                                                  filter_box_columns).items():
+        if len(chart_ids) == 0:
+            continue
+        filter_node = Node(get_filter_node_id(filter_id), NodeType.FILTER)
+        for chart_id in sorted(chart_ids):
+            dependency_list.append(Dependency(filter_node, chart_nodes[chart_id]))
+        filter_node_ids[filter_id] = filter_node.node_id
+        filter_scopes[filter_id] = sorted(chart_ids)
+
+    store = get_state_store(current_app)
+    if store is None:
+        ds_state_manager = DashStateManager(dependency_list)
+        # warm start from the state checkpointed before a restart
+        writer = get_checkpoint_writer(current_app)
+        if writer is not None:
+            checkpoint = load_checkpoint(checkpoint_path(writer.directory, dash_id))
+            if checkpoint is not None:
+                ds_state_manager.restore_checkpoint(checkpoint)
+    else:
+        ds_state_manager = SharedDashStateManager.create(
+            dash_id, dependency_list, store,
+            current_app.config["ACE_STATE_STORE_LEASE"])
+    watch_ds_state_manager(dash_id, ds_state_manager)
+    return filter_node_ids, filter_scopes
 
-    ds_state_manager = DashStateManager(dependency_list)
+
+def watch_ds_state_manager(dash_id: int, ds_state_manager: DashStateManager) -> None:
+    payload_store.configure(current_app.config["ACE_PAYLOAD_FORMAT"])
+    get_version_gc(current_app).watch(ds_state_manager)
+    old_ds_state_manager = ace_state_manager.get(dash_id, None)
     ace_state_manager[dash_id] = ds_state_manager
+    if old_ds_state_manager is not None:
+        # a replica of the same owner takes over the txns of the stale one
+        keeps_txns = isinstance(old_ds_state_manager, SharedDashStateManager) and \
+            isinstance(ds_state_manager, SharedDashStateManager) and \
+            old_ds_state_manager.owner == ds_state_manager.owner
+        if scheduler_service is not None:
+            scheduler_service.replace_state_manager(dash_id, ds_state_manager,
+                                                    keeps_txns)
+        if isinstance(old_ds_state_manager, SharedDashStateManager) and \
+            not keeps_txns:
+            old_ds_state_manager.release_lease()
+        old_ds_state_manager.release_all_payloads()
 
 
 def remove_ds_state_manager(dash_id: int) -> None:
-    if dash_id in ace_state_manager:
-        del ace_state_manager[dash_id]
+    ds_state_manager = ace_state_manager.pop(dash_id, None)
+    if ds_state_manager is not None:
+        if isinstance(ds_state_manager, SharedDashStateManager):
+            ds_state_manager.delete()
+        ds_state_manager.release_all_payloads()
+    if checkpoint_writer is not None:
+        checkpoint_writer.forget(dash_id)
+
+
+# The state of dash_id in this process. With a shared state store, the state
+# may have been created, or created again, by another process: this process
+# then loads a replica of it from the store, as it does when the replica
+# missed records trimmed from the logs of the store. The replica catches up
+# with the store when it is read, the dashboard is looked up in the store
+# every ACE_STATE_STORE_VALIDATE_INTERVAL seconds.
+def get_ds_state_manager(dash_id: int) -> DashStateManager:
+    store = get_state_store(current_app)
+    if store is None:
+        return ace_state_manager[dash_id]
+    ds_state_manager = ace_state_manager.get(dash_id, None)
+    if ds_state_manager is not None and not ds_state_manager.is_stale and \
+        time.time() - ds_state_manager.validated_at < \
+            current_app.config["ACE_STATE_STORE_VALIDATE_INTERVAL"]:
+        return ds_state_manager
+    replica_lock.acquire()
+    try:
+        info = store.load_dashboard(dash_id)
+        if info is None:
+            # deleted by another process
+            ds_state_manager = ace_state_manager.pop(dash_id, None)
+            if ds_state_manager is not None:
+                ds_state_manager.release_all_payloads()
+            raise KeyError(dash_id)
+        generation = decode_dashboard_info(info)[0]
+        ds_state_manager = ace_state_manager.get(dash_id, None)
+        if ds_state_manager is None or ds_state_manager.is_stale or \
+            ds_state_manager.generation != generation:
+            owner = None
+            if ds_state_manager is not None and \
+                ds_state_manager.generation == generation:
+                owner = ds_state_manager.owner
+            ds_state_manager = SharedDashStateManager.load(
+                dash_id, info, store, current_app.config["ACE_STATE_STORE_LEASE"],
+                owner)
+            watch_ds_state_manager(dash_id, ds_state_manager)
+        else:
+            ds_state_manager.validated_at = time.time()
+        return ds_state_manager
+    finally:
+        replica_lock.release()
+
+
+def get_state_store(app) -> BaseStateStore:
+    global state_store
+    state_store_lock.acquire()
+    if state_store is None and app.config["ACE_STATE_STORE"] == "redis":
+        state_store = RedisStateStore(
+            redis.Redis.from_url(app.config["ACE_STATE_STORE_URL"]))
+    elif state_store is None and app.config["ACE_STATE_STORE"] == "mmap":
+        state_store = MmapStateStore(app.config["ACE_STATE_STORE_DIR"])
+    state_store_lock.release()
+    return state_store
 
 
 def config_ace(dash_id: int,
@@ -60,43 +206,169 @@ def config_ace(dash_id: int,
                username: str,
                password: str,
                host: str,
-               port: str) -> None:
-    if dash_id in ace_state_manager:
-        ds_manager = ace_state_manager[dash_id]
-        ds_manager.config_state_manager(mvc_properties,
-                                        k_relaxed,
-                                        opt_viewport,
-                                        opt_exec_time,
-                                        opt_metrics,
-                                        opt_skip_write,
-                                        enable_stats_cache,
-                                        db_name,
-                                        username,
-                                        password,
-                                        host,
-                                        port)
+               port: str,
+               num_refresh_workers: int = 1,
+               scheduler_weight: float = 1.0,
+               opt_shared_scan: bool = False,
+               watermark_columns: dict = None,
+               max_pending_txns: int = 0,
+               admission_mode: str = ADMISSION_REJECT,
+               adaptive_k: bool = False,
+               target_invisibility: float = 0.1,
+               target_staleness: float = 0.1,
+               viewport_predictor: str = PREDICTOR_NONE) -> None:
+    try:
+        ds_manager = get_ds_state_manager(dash_id)
+    except KeyError:
+        return
+    ds_manager.config_state_manager(mvc_properties,
+                                    k_relaxed,
+                                    opt_viewport,
+                                    opt_exec_time,
+                                    opt_metrics,
+                                    opt_skip_write,
+                                    enable_stats_cache,
+                                    db_name,
+                                    username,
+                                    password,
+                                    host,
+                                    port,
+                                    num_refresh_workers,
+                                    scheduler_weight,
+                                    opt_shared_scan,
+                                    watermark_columns,
+                                    max_pending_txns,
+                                    admission_mode,
+                                    adaptive_k,
+                                    target_invisibility,
+                                    target_staleness,
+                                    viewport_predictor)
 
 
 def read_view_port(dash_id: int, node_id_set: set) -> dict:
-    return ace_state_manager[dash_id].read_view_port(node_id_set, DURATION)
+    return get_ds_state_manager(dash_id).read_view_port(node_id_set, DURATION)
+
+
+def read_view_port_json(dash_id: int, node_id_set: set) -> bytes:
+    return get_ds_state_manager(dash_id).read_view_port_json(node_id_set, DURATION)
+
+
+def subscribe_view_port_json(dash_id: int, node_id_set: set, last_ts: int,
+                             timeout: float) -> bytes:
+    timeout = min(timeout, current_app.config["ACE_SUBSCRIBE_TIMEOUT"])
+    return get_ds_state_manager(dash_id).subscribe_view_port_json(
+        node_id_set, last_ts, DURATION, timeout)
+
+
+def stream_view_port_json(dash_id: int, node_id_set: set,
+                          last_ts: int) -> Iterator[bytes]:
+    return get_ds_state_manager(dash_id).stream_view_port_json(
+        node_id_set, last_ts, DURATION,
+        current_app.config["ACE_SUBSCRIBE_TIMEOUT"],
+        current_app.config["ACE_SUBSCRIBE_STREAM_DURATION"])
+
+
+# Admission control of ace/<pk>/refresh. Returns ADMITTED and the ts and node
+# groups of the submitted txn, MERGED and the ts of the pending txn it is merged
+# into, or REJECTED and the seconds after which the client should retry.
+ADMITTED = "admitted"
+MERGED = "merged"
+REJECTED = "rejected"
+
+
+def admit_one_txn(dash_id: int, app, node_id_set: set,
+                  node_ids_in_view_port: set,
+                  charts_form_data: dict) -> Tuple[str, int, list]:
+    ds_state_manager = get_ds_state_manager(dash_id)
+    try:
+        ret = ds_state_manager.try_submit_one_txn(node_id_set, node_ids_in_view_port,
+                                                  DURATION)
+    except StaleReplicaError as error:
+        ds_state_manager = get_ds_state_manager(dash_id)
+        if ds_state_manager.owner != error.owner:
+            # the dashboard was created again, the txn is gone with its state
+            return admit_one_txn(dash_id, app, node_id_set, node_ids_in_view_port,
+                                 charts_form_data)
+        return ADMITTED, error.ts, ds_state_manager.get_own_placeholder(
+            error.ts, node_id_set)
+    if ret is not None:
+        return ADMITTED, ret[0], ret[1]
+    if ds_state_manager.admission_mode == ADMISSION_MERGE:
+        chart_ids = ds_state_manager.get_impacted_charts(node_id_set)
+        ts = get_scheduler_service(app).merge_into_pending_txn(
+            dash_id, chart_ids, charts_form_data)
+        if ts is not None:
+            ds_state_manager.count_merged_txn()
+            return MERGED, ts, None
+    ds_state_manager.count_rejected_txn()
+    return REJECTED, ds_state_manager.get_retry_after(), None
+
+
+def get_version_gc(app) -> VersionGarbageCollector:
+    global version_gc
+    version_gc_lock.acquire()
+    if version_gc is None:
+        version_gc = VersionGarbageCollector(app.config["ACE_GC_INTERVAL"],
+                                             app.config["ACE_GC_MEMORY_BUDGET"])
+        version_gc.start()
+    version_gc_lock.release()
+    return version_gc
+
+
+def get_checkpoint_writer(app) -> CheckpointWriter:
+    global checkpoint_writer
+    checkpoint_writer_lock.acquire()
+    if checkpoint_writer is None and app.config["ACE_CHECKPOINT_INTERVAL"] > 0:
+        checkpoint_writer = CheckpointWriter(app.config["ACE_CHECKPOINT_INTERVAL"],
+                                             app.config["ACE_CHECKPOINT_DIR"])
+        checkpoint_writer.start()
+    checkpoint_writer_lock.release()
+    return checkpoint_writer
+
+
+def get_ace_stats(dash_id: int) -> dict:
+    try:
+        ds_state_manager = get_ds_state_manager(dash_id)
+    except KeyError:
+        return None
+    stats = {"gc": ds_state_manager.get_gc_stats(),
+             "admission": ds_state_manager.get_admission_stats(),
+             "payload_store": payload_store.get_stats()}
+    if ds_state_manager.k_controller is not None:
+        stats["k_controller"] = ds_state_manager.k_controller.get_stats()
+    if version_gc is not None:
+        stats["process_gc"] = version_gc.get_stats()
+    if checkpoint_writer is not None:
+        stats["checkpoint"] = checkpoint_writer.get_stats()
+    if scheduler_service is not None:
+        stats["cost_model"] = scheduler_service.cost_model.get_stats()
+        stats["cancelled_queries"] = scheduler_service.query_canceller.num_cancelled
+    return stats
 
 
-def submit_one_txn(dash_id: int, node_id_set: set,
-                   node_ids_in_view_port: set) -> Tuple[int, list]:
-    return ace_state_manager[dash_id].submit_one_txn(
-        node_id_set,
-        node_ids_in_view_port, DURATION)
+def get_scheduler_service(app) -> SchedulerService:
+    global scheduler_service
+    scheduler_service_lock.acquire()
+    if scheduler_service is None:
+        scheduler_service = SchedulerService(
+            app.config["ACE_SCHEDULER_NUM_WORKERS"],
+            app.config["ACE_SCHEDULER_IDLE_TIMEOUT"],
+            app.config["ACE_MAX_QUERIES_PER_DATABASE"],
+            app.config["ACE_COST_ESTIMATION_WORKERS"],
+            ChartCostModel(app.config["ACE_COST_MODEL_ALPHA"],
+                           app.config["ACE_COST_MODEL_MIN_SAMPLES"],
+                           app.config["ACE_COST_MODEL_PATH"]))
+        scheduler_service.start()
+    scheduler_service_lock.release()
+    return scheduler_service
 
 
-def get_or_create_one_scheduler(dash_id, app) -> Scheduler:
-    if dash_id not in ace_scheduler_manager:
-        ace_scheduler_manager[dash_id] = Scheduler(dash_id, app)
-        ace_scheduler_manager[dash_id].start()
-    return ace_scheduler_manager[dash_id]
+def schedule_one_txn(dash_id: int, app, ts: int, node_groups: list,
+                     charts_form_data: dict) -> None:
+    get_scheduler_service(app).submit_one_txn(dash_id, app, ts, node_groups,
+                                              charts_form_data)
 
 
 def shut_down_one_scheduler(dash_id) -> None:
-    if dash_id in ace_scheduler_manager:
-        ace_scheduler_manager[dash_id].shut_down()
-        ace_scheduler_manager[dash_id].join(1)
-        del ace_scheduler_manager[dash_id]
+    if scheduler_service is not None:
+        scheduler_service.unregister(dash_id)
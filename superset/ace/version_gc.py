@@ -0,0 +1,77 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import traceback
+from threading import (Thread, Event, Lock)
+
+from superset.extensions import ace_state_manager
+
+
+# Reclaims the versions of all dashboards that no reader or pending txn can
+# read any more, i.e., those below the low watermark of each
+# DashStateManager. It runs every `interval` seconds and whenever a
+# dashboard goes over its memory budget.
+class VersionGarbageCollector(Thread):
+    def __init__(self, interval: int, memory_budget: int) -> None:
+        super().__init__(name="ace-version-gc", daemon=True)
+        self.interval = interval
+        self.memory_budget = memory_budget
+        self.gc_event = Event()
+        self.stats_lock = Lock()
+        self.num_runs = 0
+        self.reclaimed_versions = 0
+        self.reclaimed_bytes = 0
+        self.finish = False
+
+    def watch(self, ds_state_manager) -> None:
+        ds_state_manager.memory_budget = self.memory_budget
+        ds_state_manager.gc_event = self.gc_event
+
+    def run(self) -> None:
+        while not self.finish:
+            self.gc_event.wait(self.interval)
+            self.gc_event.clear()
+            if not self.finish:
+                self.collect()
+
+    def collect(self) -> None:
+        num_versions = 0
+        num_bytes = 0
+        for ds_state_manager in list(ace_state_manager.values()):
+            try:
+                cur_versions, cur_bytes = ds_state_manager.clean_unused_versions()
+                num_versions += cur_versions
+                num_bytes += cur_bytes
+            except Exception:  # pylint: disable=broad-except
+                traceback.print_exc()
+        self.stats_lock.acquire()
+        self.num_runs += 1
+        self.reclaimed_versions += num_versions
+        self.reclaimed_bytes += num_bytes
+        self.stats_lock.release()
+
+    def get_stats(self) -> dict:
+        self.stats_lock.acquire()
+        stats = {"num_runs": self.num_runs,
+                 "reclaimed_versions": self.reclaimed_versions,
+                 "reclaimed_bytes": self.reclaimed_bytes}
+        self.stats_lock.release()
+        return stats
+
+    def shut_down(self) -> None:
+        self.finish = True
+        self.gc_event.set()
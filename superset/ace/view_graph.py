@@ -15,14 +15,36 @@
 # specific language governing permissions and limitations
 # under the License.
 
+from collections import OrderedDict
+
 from superset.ace.util_class import *
-from queue import SimpleQueue
+
+# max number of node sets whose impacted nodes are cached
+MAX_CACHED_NODE_SETS = 256
+# node sets impacting up to MAX_WALKED_NODES nodes are walked node by node,
+# the larger ones are or-ed from the closures of their nodes
+MAX_WALKED_NODES = 512
+# the result of the Versions of impacted base tables and filters
+DONE_RESULT = {RESPONSE_CODE: 200, RESPONSE: "Done"}
 
 
+# Each node has a bit. The set of nodes a node impacts, i.e., its transitive
+# closure, is computed once as a bitset and kept until the graph changes. The
+# node groups impacted by recurring node sets, e.g., all the base tables, are
+# cached as well.
+#
+# A bitset costs time in the number of nodes of the graph to build and to
+# turn back into node ids, so the groups of a node set impacting few nodes
+# are collected by walking the graph instead.
 class ViewGraph:
     def __init__(self) -> None:
         self.id_to_node = {}
         self.prec_to_dep = {}
+        self.id_to_bit_idx = {}
+        self.bit_to_id = []
+        self.type_masks = {node_type: 0 for node_type in NodeType}
+        self.closures = {}
+        self.node_set_to_groups = OrderedDict()
 
     def insert(self, dependency: Dependency) -> None:
         dep = dependency.dep
@@ -30,11 +52,28 @@ class ViewGraph:
 
         self.id_to_node[dep.node_id] = dep
         self.id_to_node[prec.node_id] = prec
+        self.assign_bit(dep)
+        self.assign_bit(prec)
 
         dep_list = self.prec_to_dep.get(prec.node_id, list())
         dep_list.append(dep.node_id)
         self.prec_to_dep[prec.node_id] = dep_list
 
+        self.closures = {}
+        self.node_set_to_groups = OrderedDict()
+
+    # the type of a node is the one of the last node inserted with its id
+    def assign_bit(self, node: Node) -> None:
+        bit_idx = self.id_to_bit_idx.get(node.node_id, None)
+        if bit_idx is None:
+            bit_idx = len(self.bit_to_id)
+            self.id_to_bit_idx[node.node_id] = bit_idx
+            self.bit_to_id.append(node.node_id)
+        bit = 1 << bit_idx
+        for node_type in self.type_masks:
+            self.type_masks[node_type] &= ~bit
+        self.type_masks[node.node_type] |= bit
+
     def create_initial_snapshot(self, ts: int) -> None:
         for node_id in self.id_to_node:
             result = {RESPONSE_CODE: 400,
@@ -43,51 +82,99 @@ class ViewGraph:
             node = self.id_to_node[node_id]
             node.add_version(version)
 
-    def create_snapshot_placeholder(self,
-                                    node_id_set: set, ts: int) -> list:
+    # bitset of node_id and every node that depends on it, directly or not
+    def get_closure(self, node_id: int) -> int:
+        closure = self.closures.get(node_id, None)
+        if closure is not None:
+            return closure
+        # the bits of the nodes walked are set in a buffer, the closures
+        # already known are or-ed in
+        closure = 0
+        buffer = bytearray((len(self.bit_to_id) + 7) >> 3)
+        visited = set()
+        pending = [node_id]
+        while len(pending) != 0:
+            cur_node_id = pending.pop()
+            if cur_node_id in visited:
+                continue
+            visited.add(cur_node_id)
+            cur_closure = self.closures.get(cur_node_id, None)
+            if cur_closure is not None:
+                closure |= cur_closure
+                continue
+            bit_idx = self.id_to_bit_idx[cur_node_id]
+            buffer[bit_idx >> 3] |= 1 << (bit_idx & 7)
+            pending.extend(self.prec_to_dep.get(cur_node_id, ()))
+        closure |= int.from_bytes(buffer, "little")
+        self.closures[node_id] = closure
+        return closure
+
+    def mask_to_ids(self, mask: int) -> tuple:
+        bit_to_id = self.bit_to_id
+        # bits[idx] is the bit idx of mask
+        bits = bin(mask)[:1:-1]
+        node_ids = []
+        bit_idx = bits.find("1")
+        while bit_idx != -1:
+            node_ids.append(bit_to_id[bit_idx])
+            bit_idx = bits.find("1", bit_idx + 1)
+        return tuple(node_ids)
+
+    # the base tables, filters and charts impacted by node_id_set, as frozensets
+    def get_impacted_groups(self, node_id_set: set) -> tuple:
+        key = frozenset(node_id_set)
+        groups = self.node_set_to_groups.get(key, None)
+        if groups is not None:
+            self.node_set_to_groups.move_to_end(key)
+            return groups
+        groups = self.walk_impacted_groups(key)
+        if groups is None:
+            mask = 0
+            for node_id in key:
+                mask |= self.get_closure(node_id)
+            groups = tuple(frozenset(self.mask_to_ids(mask & self.type_masks[node_type]))
+                           for node_type in (NodeType.BASE_TABLE, NodeType.FILTER,
+                                             NodeType.VIZ))
+        self.node_set_to_groups[key] = groups
+        if len(self.node_set_to_groups) > MAX_CACHED_NODE_SETS:
+            self.node_set_to_groups.popitem(last=False)
+        return groups
+
+    # the groups of get_impacted_groups, or None if node_id_set impacts more
+    # than MAX_WALKED_NODES nodes
+    def walk_impacted_groups(self, node_id_set: frozenset) -> tuple:
         impacted_set = set()
-        base_table_set = set()
-        filter_set = set()
-        viz_set = set()
-
-        pending_queue = SimpleQueue()
-        for node_id in node_id_set:
-            pending_queue.put(node_id)
-
-        while not pending_queue.empty():
-            cur_node_id = pending_queue.get()
-            cur_node = self.id_to_node[cur_node_id]
-
+        pending = list(node_id_set)
+        while len(pending) != 0:
+            cur_node_id = pending.pop()
+            if cur_node_id in impacted_set:
+                continue
+            if len(impacted_set) == MAX_WALKED_NODES:
+                return None
             impacted_set.add(cur_node_id)
-            result = {
-                RESPONSE_CODE: 200,
-                RESPONSE: "Done"
-            }
-
-            if cur_node.node_type == NodeType.BASE_TABLE:
-                cur_node.add_version(Version(ts, result))
-                base_table_set.add(cur_node.node_id)
-
-            elif cur_node.node_type == NodeType.FILTER:
-                cur_node.add_version(Version(ts, result))
-                filter_set.add(cur_node.node_id)
-
-            else:
-                cur_node.add_iv(IV(ts))
-                viz_set.add(cur_node.node_id)
+            pending.extend(self.prec_to_dep.get(cur_node_id, ()))
+        groups = ([], [], [])
+        id_to_node = self.id_to_node
+        for node_id in impacted_set:
+            groups[id_to_node[node_id].node_type.value - 1].append(node_id)
+        return tuple(frozenset(group) for group in groups)
 
-            if cur_node.node_id in self.prec_to_dep:
-                dep_id_list = self.prec_to_dep[cur_node.node_id]
-                for dep_node_id in dep_id_list:
-                    if dep_node_id not in impacted_set:
-                        pending_queue.put(dep_node_id)
-
-        ret_list = list()
-        ret_list.append(base_table_set)
-        ret_list.append(filter_set)
-        ret_list.append(viz_set)
-
-        return ret_list
+    def create_snapshot_placeholder(self,
+                                    node_id_set: set, ts: int) -> list:
+        base_table_ids, filter_ids, viz_ids = self.get_impacted_groups(node_id_set)
+        id_to_node = self.id_to_node
+        # Versions and IVs are never modified, so the nodes share them
+        # ts is the newest ts, so the versions are appended
+        done_version = Version(ts, DONE_RESULT)
+        for node_id in base_table_ids:
+            id_to_node[node_id].append_version(done_version)
+        for node_id in filter_ids:
+            id_to_node[node_id].append_version(done_version)
+        iv = IV(ts)
+        for node_id in viz_ids:
+            id_to_node[node_id].add_iv(iv)
+        # the groups of recurring node sets are shared by their txns
+        return [base_table_ids, filter_ids, viz_ids]
 
     def read_snapshot(self, ts: int, node_id_set: set) -> dict:
         snapshot = {}
@@ -105,9 +192,14 @@ class ViewGraph:
             res[node_id] = version
         return res
 
-    def add_version(self, node_id: int, ts: int, result: dict):
-        self.id_to_node[node_id].add_version(Version(ts, result))
+    def add_version(self, node_id: int, ts: int, result: dict,
+                    num_bytes: int = 0, digest: str = None,
+                    fragment: bytes = None) -> BaseVersion:
+        return self.id_to_node[node_id].add_version(
+            Version(ts, result, num_bytes, digest, fragment))
 
-    def clean_unused_versions(self, ts: int):
+    def clean_unused_versions(self, ts: int) -> list:
+        removed_versions = []
         for node in self.id_to_node.values():
-            node.clean_unused_versions(ts)
+            removed_versions.extend(node.clean_unused_versions(ts))
+        return removed_versions
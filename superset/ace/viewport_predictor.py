@@ -0,0 +1,128 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+from collections import Counter, OrderedDict
+
+PREDICTOR_NONE = ""
+PREDICTOR_MARKOV = "markov"
+PREDICTOR_MOMENTUM = "momentum"
+# max number of viewports the Markov model keeps the transitions of, in LRU
+# order
+MAX_MARKOV_STATES = 256
+# weight of the newest move in the moving average of the scroll velocity
+MOMENTUM_ALPHA = 0.5
+
+
+# Predicts the charts about to enter the viewport of a dashboard from the
+# sequence of node sets its readers read. predict returns node id -> score in
+# (0, 1], e.g., the probability that the next viewport shows the chart.
+class ViewportPredictor:
+    def __init__(self) -> None:
+        self.cur_view_port = frozenset()
+
+    # returns whether the viewport has changed, i.e., the prediction may have
+    def observe(self, view_port: frozenset) -> bool:
+        if view_port == self.cur_view_port:
+            return False
+        self.on_view_port_change(self.cur_view_port, view_port)
+        self.cur_view_port = view_port
+        return True
+
+    def on_view_port_change(self, old_view_port: frozenset,
+                            new_view_port: frozenset) -> None:
+        pass
+
+    def predict(self) -> dict:
+        return {}
+
+
+# A first-order Markov chain over the viewports: the score of a chart is the
+# probability that the viewport after the current one shows it
+class MarkovPredictor(ViewportPredictor):
+    def __init__(self, max_states: int = MAX_MARKOV_STATES) -> None:
+        super().__init__()
+        self.max_states = max_states
+        self.transitions = OrderedDict()
+
+    def on_view_port_change(self, old_view_port: frozenset,
+                            new_view_port: frozenset) -> None:
+        next_view_ports = self.transitions.get(old_view_port, None)
+        if next_view_ports is None:
+            next_view_ports = Counter()
+            self.transitions[old_view_port] = next_view_ports
+            if len(self.transitions) > self.max_states:
+                self.transitions.popitem(last=False)
+        else:
+            self.transitions.move_to_end(old_view_port)
+        next_view_ports[new_view_port] += 1
+
+    def predict(self) -> dict:
+        next_view_ports = self.transitions.get(self.cur_view_port, None)
+        if next_view_ports is None:
+            return {}
+        total = sum(next_view_ports.values())
+        scores = {}
+        for view_port, count in next_view_ports.items():
+            for node_id in view_port - self.cur_view_port:
+                scores[node_id] = scores.get(node_id, 0.0) + count / total
+        return scores
+
+
+# Estimates the scroll velocity, in charts of chart_order per viewport change,
+# from the moves of the center of the viewport, and predicts the charts the
+# next move brings in
+class MomentumPredictor(ViewportPredictor):
+    def __init__(self, chart_order: list, alpha: float = MOMENTUM_ALPHA) -> None:
+        super().__init__()
+        self.chart_order = chart_order
+        self.positions = {node_id: idx for idx, node_id in enumerate(chart_order)}
+        self.alpha = alpha
+        self.velocity = 0.0
+
+    def get_positions(self, view_port: frozenset) -> list:
+        return [self.positions[node_id] for node_id in view_port
+                if node_id in self.positions]
+
+    def on_view_port_change(self, old_view_port: frozenset,
+                            new_view_port: frozenset) -> None:
+        old_positions = self.get_positions(old_view_port)
+        new_positions = self.get_positions(new_view_port)
+        if len(old_positions) == 0 or len(new_positions) == 0:
+            return
+        move = sum(new_positions) / len(new_positions) - \
+            sum(old_positions) / len(old_positions)
+        self.velocity += self.alpha * (move - self.velocity)
+
+    def predict(self) -> dict:
+        positions = self.get_positions(self.cur_view_port)
+        num_charts = int(round(abs(self.velocity)))
+        if len(positions) == 0 or num_charts == 0:
+            return {}
+        if self.velocity > 0:
+            next_positions = range(max(positions) + 1, max(positions) + 1 + num_charts)
+        else:
+            next_positions = range(min(positions) - num_charts, min(positions))
+        return {self.chart_order[idx]: 1.0 for idx in next_positions
+                if 0 <= idx < len(self.chart_order)}
+
+
+def build_viewport_predictor(name: str, chart_order: list) -> ViewportPredictor:
+    if name == PREDICTOR_MARKOV:
+        return MarkovPredictor()
+    if name == PREDICTOR_MOMENTUM:
+        return MomentumPredictor(chart_order)
+    return None
@@ -0,0 +1,88 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import argparse
+import random
+
+from superset.ace.k_controller import KController
+from superset.ace.util_class import IV
+from superset.ace_driver.benchmark.bench_utils import build_state_manager, chart_ids
+
+DURATION = 1
+# GCNB, the property combination whose snapshot k_relaxed picks
+MVC_PROPERTY = 2
+
+
+# Invisibility and staleness of the reads of a dashboard whose refreshes
+# arrive faster than they finish, with a static k_relaxed or with the
+# KController, see k_controller.py
+def run_one(k_relaxed: int, controller: KController, num_charts: int,
+            num_steps: int, seed: int) -> None:
+    rnd = random.Random(seed)
+    ds_state_manager = build_state_manager(num_charts, 3, MVC_PROPERTY, k_relaxed)
+    ds_state_manager.k_controller = controller
+    node_ids = chart_ids(num_charts)
+    id_to_node = ds_state_manager.view_graph.id_to_node
+    result = {"response_code": 200, "response": "Done"}
+    pending_updates = []
+    pending_txns = []
+    num_iv = 0
+    num_stale = 0
+    num_read = 0
+    for _ in range(num_steps):
+        op = rnd.random()
+        if op < 0.1:
+            ts, node_groups = ds_state_manager.submit_one_txn(
+                set(rnd.sample(node_ids, 5)), set(), DURATION)
+            pending_txns.append((ts, set(node_groups[2])))
+            pending_updates.extend((ts, chart_id) for chart_id in node_groups[2])
+        elif op < 0.3 and len(pending_updates) != 0:
+            ts, chart_id = pending_updates.pop(0)
+            ds_state_manager.finish_one_update(chart_id, ts, result)
+            pending_txns[0][1].discard(chart_id)
+            while len(pending_txns) != 0 and len(pending_txns[0][1]) == 0:
+                ds_state_manager.commit_one_txn(pending_txns.pop(0)[0])
+        else:
+            node_id_set = set(rnd.sample(node_ids, 6))
+            ds_state_manager.read_view_port(node_id_set, DURATION)
+            for node_id in node_id_set:
+                version = ds_state_manager.last_read[node_id]
+                if isinstance(version, IV):
+                    num_iv += 1
+                elif version.ts < id_to_node[node_id].versions.ts_list[-1]:
+                    num_stale += 1
+            num_read += len(node_id_set)
+    name = "adaptive" if controller is not None else "static"
+    print(f"{name} k={ds_state_manager.k_relaxed}: "
+          f"invisibility={num_iv / num_read:.3f} "
+          f"staleness={num_stale / num_read:.3f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Invisibility and staleness of static and adaptive k_relaxed")
+    parser.add_argument('--num_charts', type=int, default=15)
+    parser.add_argument('--num_steps', type=int, default=6000)
+    parser.add_argument('--k_relaxed', type=int, nargs='+', default=[0, 1, 2, 4, 8])
+    parser.add_argument('--target_invisibility', type=float, default=0.1)
+    parser.add_argument('--target_staleness', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    for k in args.k_relaxed:
+        run_one(k, None, args.num_charts, args.num_steps, args.seed)
+    run_one(0, KController(0, args.target_invisibility, args.target_staleness),
+            args.num_charts, args.num_steps, args.seed)
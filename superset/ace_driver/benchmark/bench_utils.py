@@ -0,0 +1,60 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import time
+
+from superset.ace.ds_state_manager import DashStateManager
+from superset.ace.util_class import Dependency, Node, NodeType
+
+FIRST_CHART_ID = 1000
+
+
+def get_cur_time_us() -> float:
+    return time.perf_counter() * 1000000
+
+
+def build_state_manager(num_charts: int, num_tables: int,
+                        mvc_property: int, k_relaxed: int) -> DashStateManager:
+    dependency_list = []
+    for chart_idx in range(num_charts):
+        prec_node = Node(chart_idx % num_tables, NodeType.BASE_TABLE)
+        dep_node = Node(FIRST_CHART_ID + chart_idx, NodeType.VIZ)
+        dependency_list.append(Dependency(prec_node, dep_node))
+    ds_state_manager = DashStateManager(dependency_list)
+    ds_state_manager.config_state_manager(mvc_property, k_relaxed,
+                                          True, False, False, True, True,
+                                          "", "", "", "", "")
+    return ds_state_manager
+
+
+def chart_ids(num_charts: int) -> list:
+    return [FIRST_CHART_ID + chart_idx for chart_idx in range(num_charts)]
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    if len(sorted_values) == 0:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))
+    return sorted_values[idx]
+
+
+def report_latency(name: str, latencies: list) -> None:
+    latencies = sorted(latencies)
+    print(f"{name}: count={len(latencies)} "
+          f"p50={percentile(latencies, 50):.1f}us "
+          f"p99={percentile(latencies, 99):.1f}us "
+          f"max={percentile(latencies, 100):.1f}us")
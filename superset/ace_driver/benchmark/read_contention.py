@@ -0,0 +1,109 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import argparse
+import random
+import time
+from threading import Thread
+
+from superset.ace.util_class import START_TS
+from superset.ace_driver.benchmark.bench_utils import (
+    build_state_manager,
+    chart_ids,
+    get_cur_time_us,
+    report_latency,
+)
+
+DURATION = 1
+
+
+class Reader(Thread):
+    def __init__(self, ds_state_manager, node_ids: list,
+                 viewport_range: int, end_time: float):
+        super().__init__()
+        self.ds_state_manager = ds_state_manager
+        self.node_ids = node_ids
+        self.viewport_range = viewport_range
+        self.end_time = end_time
+        self.latencies = []
+
+    def run(self):
+        while time.time() < self.end_time:
+            start = random.randrange(len(self.node_ids) - self.viewport_range + 1)
+            viewport = set(self.node_ids[start:start + self.viewport_range])
+            begin = get_cur_time_us()
+            self.ds_state_manager.read_view_port(viewport, DURATION)
+            self.latencies.append(get_cur_time_us() - begin)
+
+
+class Writer(Thread):
+    def __init__(self, ds_state_manager, node_ids: list, end_time: float):
+        super().__init__()
+        self.ds_state_manager = ds_state_manager
+        self.node_ids = node_ids
+        self.end_time = end_time
+        self.latencies = []
+
+    def run(self):
+        while time.time() < self.end_time:
+            begin = get_cur_time_us()
+            ts, node_groups = self.ds_state_manager.submit_one_txn(
+                set(self.node_ids), set(), DURATION)
+            self.latencies.append(get_cur_time_us() - begin)
+            for node_id in node_groups[-1]:
+                begin = get_cur_time_us()
+                self.ds_state_manager.finish_one_update(node_id, ts, {"ts": ts})
+                self.latencies.append(get_cur_time_us() - begin)
+            self.ds_state_manager.commit_one_txn(ts)
+
+
+def run_benchmark(num_charts: int, num_readers: int, viewport_range: int,
+                  mvc_property: int, k_relaxed: int, seconds: int) -> None:
+    ds_state_manager = build_state_manager(num_charts, 4, mvc_property, k_relaxed)
+    node_ids = chart_ids(num_charts)
+    end_time = time.time() + seconds
+    readers = [Reader(ds_state_manager, node_ids, viewport_range, end_time)
+               for _ in range(num_readers)]
+    writer = Writer(ds_state_manager, node_ids, end_time)
+    for thread in readers + [writer]:
+        thread.start()
+    for thread in readers + [writer]:
+        thread.join()
+
+    read_latencies = []
+    for reader in readers:
+        read_latencies.extend(reader.latencies)
+    print(f"charts={num_charts} readers={num_readers} "
+          f"mvc_property={mvc_property} k_relaxed={k_relaxed} "
+          f"txns={ds_state_manager.last_committed - START_TS}")
+    report_latency("read_view_port", read_latencies)
+    report_latency("write", writer.latencies)
+    print(f"reads/s: {len(read_latencies) / seconds:.0f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Contention between read_view_port and refresh txns")
+    parser.add_argument('--num_charts', type=int, default=40)
+    parser.add_argument('--num_readers', type=int, default=50)
+    parser.add_argument('--viewport_range', type=int, default=8)
+    parser.add_argument('--mvc_property', type=int, default=2)
+    parser.add_argument('--k_relaxed', type=int, default=0)
+    parser.add_argument('--seconds', type=int, default=5)
+    args = parser.parse_args()
+    run_benchmark(args.num_charts, args.num_readers, args.viewport_range,
+                  args.mvc_property, args.k_relaxed, args.seconds)
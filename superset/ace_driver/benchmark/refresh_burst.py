@@ -0,0 +1,111 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+import argparse
+import random
+import time
+
+from superset.extensions import ace_state_manager
+from superset.ace.scheduler import Scheduler
+from superset.ace.scheduler_service import SchedulerService
+from superset.ace_driver.benchmark.bench_utils import (
+    build_state_manager,
+    chart_ids,
+    get_cur_time_us,
+    report_latency,
+)
+
+DURATION = 1
+
+
+# Replaces the chart query by a sleep of query_seconds
+class BenchScheduler(Scheduler):
+    def __init__(self, dash_id: int, query_seconds: float):
+        super().__init__(dash_id, None)
+        self.query_seconds = query_seconds
+        self.num_refreshes = 0
+
+    def refresh_one_chart(self, ts: int, chart_id: int, charts_form_data: dict):
+        time.sleep(self.query_seconds)
+        self.num_refreshes += 1
+        self.ds_state_manager.finish_one_update(chart_id, ts, {"ts": ts})
+
+
+# Submits bursts of refresh txns, each of a random subset of the charts,
+# faster than they can be refreshed, and reports how long submitting takes,
+# how many chart queries run and how long it takes to commit the last txn
+def run_benchmark(num_charts: int, num_workers: int, num_bursts: int,
+                  burst_size: int, charts_per_txn: int, query_seconds: float,
+                  opt_skip_write: bool) -> None:
+    dash_id = 0
+    ds_state_manager = build_state_manager(num_charts, 4, 1, 0)
+    ds_state_manager.opt_skip_write = opt_skip_write
+    ds_state_manager.num_refresh_workers = num_workers
+    ace_state_manager[dash_id] = ds_state_manager
+    service = SchedulerService(num_workers, 600, 0)
+    scheduler = BenchScheduler(dash_id, query_seconds)
+    service.service_lock.acquire()
+    service.register(scheduler)
+    service.service_lock.release()
+    service.start()
+
+    all_chart_ids = chart_ids(num_charts)
+    submit_latencies = []
+    num_txns = 0
+    start_time = time.time()
+    for _ in range(num_bursts):
+        for _ in range(burst_size):
+            node_ids = set(random.sample(all_chart_ids, charts_per_txn))
+            submit_time = get_cur_time_us()
+            ts, node_groups = ds_state_manager.submit_one_txn(
+                node_ids, node_ids, DURATION)
+            service.submit_one_txn(dash_id, None, ts, node_groups, {})
+            submit_latencies.append(get_cur_time_us() - submit_time)
+            num_txns += 1
+        time.sleep(query_seconds)
+    last_ts = ds_state_manager.last_submitted
+    while ds_state_manager.last_committed < last_ts:
+        time.sleep(0.001)
+    drain_seconds = time.time() - start_time
+
+    snapshot = ds_state_manager.read_view_port(set(all_chart_ids), DURATION)
+    num_ivs = sum(1 for result in snapshot["snapshot"].values()
+                  if result["version_result"] == "IV")
+    service.unregister(dash_id)
+    service.shut_down()
+    del ace_state_manager[dash_id]
+
+    report_latency(f"opt_skip_write={opt_skip_write} submit", submit_latencies)
+    print(f"opt_skip_write={opt_skip_write} txns={num_txns} "
+          f"chart queries={scheduler.num_refreshes} "
+          f"(of {num_txns * charts_per_txn} requested) "
+          f"all committed after {drain_seconds:.2f}s, IVs left={num_ivs}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Coalescing of bursts of refresh txns by the scheduler")
+    parser.add_argument('--num_charts', type=int, default=50)
+    parser.add_argument('--num_workers', type=int, default=4)
+    parser.add_argument('--num_bursts', type=int, default=20)
+    parser.add_argument('--burst_size', type=int, default=100)
+    parser.add_argument('--charts_per_txn', type=int, default=10)
+    parser.add_argument('--query_seconds', type=float, default=0.005)
+    parser.add_argument('--no_skip_write', action='store_true')
+    args = parser.parse_args()
+    run_benchmark(args.num_charts, args.num_workers, args.num_bursts,
+                  args.burst_size, args.charts_per_txn, args.query_seconds,
+                  not args.no_skip_write)
@@ -0,0 +1,97 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import argparse
+import random
+import time
+
+from superset.extensions import ace_state_manager
+from superset.ace.scheduler import Scheduler
+from superset.ace.scheduler_service import SchedulerService
+from superset.ace_driver.benchmark.bench_utils import (
+    build_state_manager,
+    chart_ids,
+    get_cur_time_us,
+    report_latency,
+)
+
+DURATION = 1
+
+
+# Replaces the chart query by recording when the scheduler started it
+class BenchScheduler(Scheduler):
+    def __init__(self, dash_id: int):
+        super().__init__(dash_id, None)
+        self.ts_to_submit_time = {}
+        self.first_query_latencies = []
+
+    def refresh_one_chart(self, ts: int, chart_id: int, charts_form_data: dict):
+        submit_time = self.ts_to_submit_time.pop(ts, None)
+        if submit_time is not None:
+            self.first_query_latencies.append(get_cur_time_us() - submit_time)
+        self.ds_state_manager.finish_one_update(chart_id, ts, {"ts": ts})
+
+
+def run_benchmark(num_dashboards: int, num_charts: int, num_workers: int,
+                  idle_seconds: int, num_txns: int) -> None:
+    service = SchedulerService(num_workers, idle_seconds * 10, 0)
+    schedulers = []
+    for dash_id in range(num_dashboards):
+        ace_state_manager[dash_id] = build_state_manager(num_charts, 4, 1, 0)
+        scheduler = BenchScheduler(dash_id)
+        service.service_lock.acquire()
+        service.register(scheduler)
+        service.service_lock.release()
+        schedulers.append(scheduler)
+    service.start()
+
+    cpu_start = time.process_time()
+    time.sleep(idle_seconds)
+    idle_cpu = time.process_time() - cpu_start
+    print(f"dashboards={num_dashboards} idle cpu: "
+          f"{idle_cpu / idle_seconds * 100:.1f}% of one core")
+
+    node_ids = set(chart_ids(num_charts))
+    for _ in range(num_txns):
+        scheduler = random.choice(schedulers)
+        ts, node_groups = scheduler.ds_state_manager.submit_one_txn(
+            node_ids, node_ids, DURATION)
+        scheduler.ts_to_submit_time[ts] = get_cur_time_us()
+        service.submit_one_txn(scheduler.dash_id, None, ts, node_groups, {})
+        time.sleep(0.001)
+    time.sleep(0.5)
+
+    latencies = []
+    for scheduler in schedulers:
+        latencies.extend(scheduler.first_query_latencies)
+        service.unregister(scheduler.dash_id)
+        del ace_state_manager[scheduler.dash_id]
+    service.shut_down()
+    report_latency("submit to first query", latencies)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Submit-to-first-query latency and idle cost of schedulers")
+    parser.add_argument('--num_dashboards', type=int, default=500)
+    parser.add_argument('--num_charts', type=int, default=20)
+    parser.add_argument('--num_workers', type=int, default=8)
+    parser.add_argument('--idle_seconds', type=int, default=5)
+    parser.add_argument('--num_txns', type=int, default=1000)
+    args = parser.parse_args()
+    run_benchmark(args.num_dashboards, args.num_charts, args.num_workers,
+                  args.idle_seconds, args.num_txns)
@@ -0,0 +1,120 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+import argparse
+import random
+from queue import SimpleQueue
+
+from superset.ace.util_class import (Dependency, Node, NodeType, Version, IV,
+                                     RESPONSE_CODE, RESPONSE)
+from superset.ace.view_graph import ViewGraph
+from superset.ace_driver.benchmark.bench_utils import (
+    FIRST_CHART_ID,
+    get_cur_time_us,
+    report_latency,
+)
+
+FIRST_FILTER_ID = -1
+
+
+def build_view_graph(num_charts: int, num_tables: int, num_filters: int,
+                     filter_scope: int, seed: int) -> ViewGraph:
+    rnd = random.Random(seed)
+    charts = [Node(FIRST_CHART_ID + chart_idx, NodeType.VIZ)
+              for chart_idx in range(num_charts)]
+    tables = [Node(table_idx, NodeType.BASE_TABLE) for table_idx in range(num_tables)]
+    view_graph = ViewGraph()
+    for chart_idx, chart in enumerate(charts):
+        view_graph.insert(Dependency(tables[chart_idx % num_tables], chart))
+    for filter_idx in range(num_filters):
+        filter_node = Node(FIRST_FILTER_ID - filter_idx, NodeType.FILTER)
+        for chart in rnd.sample(charts, min(filter_scope, num_charts)):
+            view_graph.insert(Dependency(filter_node, chart))
+    view_graph.create_initial_snapshot(-1)
+    return view_graph
+
+
+# create_snapshot_placeholder before the impacted nodes were memoized
+def bfs_snapshot_placeholder(view_graph: ViewGraph, node_id_set: set, ts: int) -> list:
+    impacted_set = set()
+    groups = [set(), set(), set()]
+    pending_queue = SimpleQueue()
+    for node_id in node_id_set:
+        pending_queue.put(node_id)
+    while not pending_queue.empty():
+        cur_node_id = pending_queue.get()
+        cur_node = view_graph.id_to_node[cur_node_id]
+        impacted_set.add(cur_node_id)
+        result = {RESPONSE_CODE: 200, RESPONSE: "Done"}
+        if cur_node.node_type == NodeType.VIZ:
+            cur_node.add_iv(IV(ts))
+        else:
+            cur_node.add_version(Version(ts, result))
+        groups[cur_node.node_type.value - 1].add(cur_node_id)
+        for dep_node_id in view_graph.prec_to_dep.get(cur_node_id, []):
+            if dep_node_id not in impacted_set:
+                pending_queue.put(dep_node_id)
+    return groups
+
+
+# create_snapshot_placeholder for a node set seen for the first time
+def uncached_snapshot_placeholder(view_graph: ViewGraph, node_id_set: set,
+                                  ts: int) -> list:
+    view_graph.closures = {}
+    view_graph.node_set_to_groups.clear()
+    return view_graph.create_snapshot_placeholder(node_id_set, ts)
+
+
+def run_benchmark(num_charts: int, num_tables: int, num_filters: int,
+                  filter_scope: int, num_txns: int, seed: int) -> None:
+    rnd = random.Random(seed)
+    # recurring refresh sets: all the base tables, one filter, a few charts
+    refresh_sets = [("all base tables", [set(range(num_tables))]),
+                    ("one filter", [{FIRST_FILTER_ID - filter_idx}
+                                    for filter_idx in range(min(num_filters, 8))]),
+                    ("ten charts", [set(rnd.sample(range(FIRST_CHART_ID,
+                                                         FIRST_CHART_ID + num_charts),
+                                                   10))
+                                    for _ in range(8)])]
+    num_nodes = num_charts + num_tables + num_filters
+    for name, placeholder in (("bfs", bfs_snapshot_placeholder),
+                              ("closure", ViewGraph.create_snapshot_placeholder),
+                              ("uncached", uncached_snapshot_placeholder)):
+        view_graph = build_view_graph(num_charts, num_tables, num_filters,
+                                      filter_scope, seed)
+        for set_name, node_id_sets in refresh_sets:
+            latencies = []
+            for ts in range(num_txns):
+                node_id_set = node_id_sets[ts % len(node_id_sets)]
+                start = get_cur_time_us()
+                placeholder(view_graph, node_id_set, ts)
+                latencies.append(get_cur_time_us() - start)
+                view_graph.clean_unused_versions(ts)
+            report_latency(f"{name} nodes={num_nodes} {set_name}", latencies)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Latency of creating the IVs of a refresh txn in the view graph")
+    parser.add_argument('--num_charts', type=int, default=9500)
+    parser.add_argument('--num_tables', type=int, default=100)
+    parser.add_argument('--num_filters', type=int, default=400)
+    parser.add_argument('--filter_scope', type=int, default=50)
+    parser.add_argument('--num_txns', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    run_benchmark(args.num_charts, args.num_tables, args.num_filters,
+                  args.filter_scope, args.num_txns, args.seed)
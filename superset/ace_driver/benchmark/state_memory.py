@@ -0,0 +1,68 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+import argparse
+import gc
+import tracemalloc
+
+from superset.ace.util_class import START_TS
+from superset.ace_driver.benchmark.bench_utils import build_state_manager, chart_ids
+
+DURATION = 1
+
+
+def get_allocated_bytes() -> int:
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+# Bytes of ACE bookkeeping per chart version and per pending txn. All the
+# refreshes return the same result, which the payload store keeps once, so
+# that the payloads themselves are not counted.
+def run_benchmark(num_charts: int, num_tables: int, num_txns: int) -> None:
+    tracemalloc.start()
+    ds_state_manager = build_state_manager(num_charts, num_tables, 1, 0)
+    node_ids = set(chart_ids(num_charts))
+    result = {"response_code": 200, "response": "Done"}
+    ds_state_manager.finish_one_update(min(node_ids), START_TS, result)
+
+    start_bytes = get_allocated_bytes()
+    txns = []
+    for _ in range(num_txns):
+        txns.append(ds_state_manager.submit_one_txn(node_ids, node_ids, DURATION))
+    pending_bytes = get_allocated_bytes() - start_bytes
+    print(f"charts={num_charts} txns={num_txns} "
+          f"bytes per pending txn: {pending_bytes / num_txns:.0f}")
+
+    for ts, node_groups in txns:
+        for chart_id in node_groups[2]:
+            ds_state_manager.finish_one_update(chart_id, ts, result)
+        ds_state_manager.commit_one_txn(ts)
+    committed_bytes = get_allocated_bytes() - start_bytes
+    num_versions = num_txns * num_charts
+    print(f"charts={num_charts} versions={num_versions} "
+          f"bytes per version: {committed_bytes / num_versions:.0f}")
+    tracemalloc.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Memory of the ACE bookkeeping of a dashboard")
+    parser.add_argument('--num_charts', type=int, default=100)
+    parser.add_argument('--num_tables', type=int, default=8)
+    parser.add_argument('--num_txns', type=int, default=1000)
+    args = parser.parse_args()
+    run_benchmark(args.num_charts, args.num_tables, args.num_txns)
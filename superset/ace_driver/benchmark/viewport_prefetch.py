@@ -0,0 +1,97 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import argparse
+
+from superset.ace.viewport_predictor import (PREDICTOR_MARKOV, PREDICTOR_MOMENTUM,
+                                             PREDICTOR_NONE,
+                                             build_viewport_predictor)
+from superset.ace_driver.benchmark.bench_utils import build_state_manager, chart_ids
+
+DURATION = 1
+
+
+# A reader scrolls the viewport up and down the dashboard like the
+# regular_change read behavior of the driver, while every refresh_interval
+# steps a txn refreshes all the charts and the scheduler refreshes one chart
+# per step by priority, from the viewport time of the charts in the txn or
+# with opt_metrics from their total viewport time. Reports the fraction of the
+# charts entering the viewport that already show the result of the newest
+# refresh.
+def run_one(predictor: str, num_charts: int, viewport_range: int, shift_step: int,
+            viewport_interval: int, refresh_interval: int, num_steps: int,
+            opt_metrics: bool) -> None:
+    ds_state_manager = build_state_manager(num_charts, num_charts, 1, 0)
+    ds_state_manager.opt_metrics = opt_metrics
+    ds_state_manager.viewport_predictor = build_viewport_predictor(
+        predictor, ds_state_manager.get_chart_order())
+    node_ids = chart_ids(num_charts)
+    id_to_node = ds_state_manager.view_graph.id_to_node
+    result = {"response_code": 200, "response": "Done"}
+    viewport_start = 0
+    is_up = False
+    view_port = set(node_ids[:viewport_range])
+    pending_txns = []
+    num_arrivals = 0
+    num_fresh_arrivals = 0
+    for step in range(num_steps):
+        if step % refresh_interval == 0:
+            ts, node_groups = ds_state_manager.submit_one_txn(
+                set(node_ids), view_port, DURATION)
+            pending_txns.append((ts, set(node_groups[2])))
+        if len(pending_txns) != 0:
+            ts, remaining = pending_txns[0]
+            chart_id = ds_state_manager.get_top_priority_node(ts, remaining, {})
+            remaining.discard(chart_id)
+            ds_state_manager.finish_one_update(chart_id, ts, result)
+            if len(remaining) == 0:
+                ds_state_manager.commit_one_txn(ts)
+                pending_txns.pop(0)
+        if step % viewport_interval == 0 and step != 0:
+            if is_up and viewport_start == 0 or \
+                not is_up and viewport_start + viewport_range == num_charts:
+                is_up = not is_up
+            viewport_start += -shift_step if is_up else shift_step
+            viewport_start = min(max(viewport_start, 0), num_charts - viewport_range)
+            new_view_port = set(node_ids[viewport_start:viewport_start + viewport_range])
+            for node_id in new_view_port - view_port:
+                node = id_to_node[node_id]
+                num_arrivals += 1
+                if node.get_visible_version().ts == node.versions.ts_list[-1]:
+                    num_fresh_arrivals += 1
+            view_port = new_view_port
+        ds_state_manager.read_view_port(view_port, DURATION)
+    print(f"predictor={predictor or 'none'}: arrivals={num_arrivals} "
+          f"fresh on arrival={num_fresh_arrivals / max(num_arrivals, 1):.3f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Freshness of the charts entering the viewport, with and "
+                    "without viewport prediction")
+    parser.add_argument('--num_charts', type=int, default=30)
+    parser.add_argument('--viewport_range', type=int, default=6)
+    parser.add_argument('--shift_step', type=int, default=2)
+    parser.add_argument('--viewport_interval', type=int, default=5)
+    parser.add_argument('--refresh_interval', type=int, default=40)
+    parser.add_argument('--num_steps', type=int, default=20000)
+    parser.add_argument('--opt_metrics', action='store_true')
+    args = parser.parse_args()
+    for predictor in (PREDICTOR_NONE, PREDICTOR_MARKOV, PREDICTOR_MOMENTUM):
+        run_one(predictor, args.num_charts, args.viewport_range, args.shift_step,
+                args.viewport_interval, args.refresh_interval, args.num_steps,
+                args.opt_metrics)
@@ -18,14 +18,17 @@
 import pprint
 import requests
 import json
+import time
 from requests import HTTPError
 
 
+# The results are replaced by "response". "IV" and "UNCHANGED", i.e., the
+# result read before but at a newer ts, are kept for the callers.
 def clean_read_results(read_results: dict) -> dict:
     snapshot = read_results["snapshot"]
     for node_id_str in snapshot:
         result = snapshot[node_id_str]
-        if result["version_result"] != "IV":
+        if result["version_result"] not in ("IV", "UNCHANGED"):
             result["version_result"] = "response"
     return read_results
 
@@ -96,6 +99,10 @@ class BaseDashBehavior:
         self.refresh_headers = None
 
         self.dash_title_to_id = {}
+        # dash id -> filter id -> its node id in the ACE view graph
+        self.filter_node_ids = {}
+        # dash id -> filter id -> ids of the charts in its scope
+        self.filter_scopes = {}
 
         self.mvc_properties = mvc_properties
         self.k_relaxed = k_relaxed
@@ -154,6 +161,9 @@ class BaseDashBehavior:
                                               headers=self.headers,
                                               json={})
             dash_state_result.raise_for_status()
+            dash_state = json.loads(dash_state_result.text)["result"]
+            self.filter_node_ids[dash_id] = dash_state["filter_node_ids"]
+            self.filter_scopes[dash_id] = dash_state["filter_scopes"]
 
             # config ace
             config_url = f"{self.url_header}/dashboard/ace/{dash_id}/config"
@@ -215,6 +225,9 @@ class BaseDashBehavior:
                                    json=json_body)
             if int(result.status_code) == 401:
                 self.get_new_token()
+            elif int(result.status_code) == 429:
+                # too many pending refreshes, back off as the server asks
+                time.sleep(float(result.headers.get("Retry-After", 1)))
             else:
                 try:
                     result.raise_for_status()
@@ -243,6 +256,32 @@ class BaseDashBehavior:
                     exit(-1)
                 return clean_read_results(json.loads(result.text)["result"])
 
+    # long-polling version of read_refreshed_charts: the server answers as
+    # soon as there is a snapshot newer than last_ts or a changed chart
+    def subscribe_refreshed_charts(self, dash_id: int,
+                                   node_ids_to_read: list,
+                                   last_ts: int,
+                                   timeout: float) -> dict:
+        while True:
+            subscribe_url = f"{self.url_header}/dashboard/ace/{dash_id}/subscribe"
+            json_body = {
+                "node_ids_to_read": node_ids_to_read,
+                "last_ts": last_ts,
+                "timeout": timeout,
+            }
+            result = requests.post(subscribe_url,
+                                   headers=self.headers,
+                                   json=json_body)
+            if int(result.status_code) == 401:
+                self.get_new_token()
+            else:
+                try:
+                    result.raise_for_status()
+                except HTTPError as error:
+                    print("Subscribe Charts Error: " + str(error.response))
+                    exit(-1)
+                return clean_read_results(json.loads(result.text)["result"])
+
     def clean_up(self, dash_id: str) -> None:
         while True:
             delete_dash_state_url = f"{self.url_header}/dashboard/" \
@@ -61,11 +61,13 @@ class TPCHDashBehavior(BaseDashBehavior):
                  db_password: str,
                  db_host: str,
                  db_port: str,
-                 sf: int):
+                 sf: int,
+                 read_mode: str = "poll"):
         super().__init__(server_addr, username, password, mvc_properties, k_relaxed,
                          opt_viewport, opt_exec_time, opt_metrics, opt_skip_write,
                          enable_stats_cache)
         self.read_behavior = read_behavior
+        self.read_mode = read_mode
         self.write_behavior = write_behavior
         self.refresh_interval_ms = refresh_interval * 1000
         self.num_refresh = num_refresh
@@ -91,6 +93,8 @@ class TPCHDashBehavior(BaseDashBehavior):
         self.chart_id_to_vis_result = {}
 
         self.txn_interval = 0.1
+        self.subscribe = "subscribe"
+        self.loading_timeout = 10
         self.last_log_time = 0.0
         self.viewport_interval_ms = 1000
         if viewport_start % 2 == 1:
@@ -278,8 +282,7 @@ class TPCHDashBehavior(BaseDashBehavior):
             new_read = None
             # if self.submit_ts != self.commit_ts:
             read_result = self.enhance_read_result(
-                super().read_refreshed_charts(self.dash_id,
-                                              node_ids_in_viewport))
+                self.read_charts(node_ids_in_viewport, self.get_read_timeout()))
             new_commit_ts = int(read_result["ts"])
             if new_commit_ts != self.commit_ts:
                 self.print(f"Refresh {new_commit_ts} committed;"
@@ -312,7 +315,9 @@ class TPCHDashBehavior(BaseDashBehavior):
                     self.cur_time - self.test_start_ts, new_ids_in_viewport)
                 self.print("New viewport: " + str(new_ids_in_viewport))
 
-            time.sleep(self.txn_interval)
+            # a subscription already waited for the next commit
+            if self.read_mode != self.subscribe:
+                time.sleep(self.txn_interval)
 
     def initial_loading(self):
         self.print("Loading visualizations")
@@ -332,15 +337,33 @@ class TPCHDashBehavior(BaseDashBehavior):
 
         while self.submit_ts != self.commit_ts:
             read_result = self.enhance_read_result(
-                super().read_refreshed_charts(self.dash_id, self.chart_ids))
+                self.read_charts(self.chart_ids, self.loading_timeout))
             self.commit_ts = read_result["ts"]
             new_read = read_result["snapshot"]
             self.update_chart_results(new_read)
             if new_read:
                 self.print(json.dumps(read_result))
-            time.sleep(self.txn_interval * 10)
+            if self.read_mode != self.subscribe:
+                time.sleep(self.txn_interval * 10)
         self.print("Finished initial loading")
 
+    # Polls the charts, or subscribes to them and waits up to timeout
+    # seconds for a commit newer than the one read before
+    def read_charts(self, node_ids_to_read: list, timeout: float) -> dict:
+        if self.read_mode == self.subscribe:
+            return super().subscribe_refreshed_charts(self.dash_id, node_ids_to_read,
+                                                      self.commit_ts, timeout)
+        return super().read_refreshed_charts(self.dash_id, node_ids_to_read)
+
+    # Seconds until the next refresh or viewport change is due, so that a
+    # subscription does not delay them
+    def get_read_timeout(self) -> float:
+        next_time = self.last_viewport_change + self.viewport_interval_ms
+        if self.refresh_counter < self.num_refresh:
+            next_time = min(next_time,
+                            self.last_refresh_time + self.refresh_interval_ms)
+        return max((next_time - get_cur_time()) / 1000, self.txn_interval)
+
     def enhance_read_result(self, read_result: dict) -> dict:
         for chart_id_str in read_result["snapshot"]:
             result = read_result["snapshot"][chart_id_str]
@@ -354,16 +377,26 @@ class TPCHDashBehavior(BaseDashBehavior):
             return
 
         # Build necessary data structures
-        if self.write_behavior == self.filter_change:
+        filter_ids = sorted(self.filter_node_ids.get(self.dash_id, {}))
+        if self.write_behavior == self.filter_change and filter_ids:
+            # Change one of the filters of the dashboard: refreshing its node
+            # refreshes the charts in its scope
+            cur_filter = self.predefined_filters[self.cur_filter_idx]
+            filter_id = filter_ids[self.refresh_counter % len(filter_ids)]
+            node_ids_to_write = [self.filter_node_ids[self.dash_id][filter_id]]
+            node_ids_to_refresh = self.filter_scopes[self.dash_id][filter_id]
+        elif self.write_behavior == self.filter_change:
             # Build a filter
             cur_filter = self.predefined_filters[self.cur_filter_idx]
 
             # Build other info required for a refresh
             node_ids_to_refresh = [self.chart_title_to_id[chart_title]
                                    for chart_title in self.filter_impacted_charts]
+            node_ids_to_write = node_ids_to_refresh
         else:  # source_data_change
             cur_filter = []
             node_ids_to_refresh = list(self.chart_ids)
+            node_ids_to_write = node_ids_to_refresh
             try:
                 self.insert_tuples_to_base_tables(self.refresh_counter)
             except psycopg2.Error as e:
@@ -375,7 +408,7 @@ class TPCHDashBehavior(BaseDashBehavior):
 
         # Submit a refresh
         self.submit_ts = super().post_refresh(
-            self.dash_id, node_ids_to_refresh,
+            self.dash_id, node_ids_to_write,
             node_ids_in_viewport, node_id_to_form_data, cur_filter)
         self.ts_to_real_ts[self.submit_ts] = self.cur_time
 
@@ -399,6 +432,11 @@ class TPCHDashBehavior(BaseDashBehavior):
         for chart_id_str in snapshot:
             node_result = snapshot[chart_id_str]
             chart_id = int(chart_id_str)
+            old_result = self.chart_id_to_vis_result.get(chart_id, None)
+            if node_result["version_result"] == "UNCHANGED" and old_result is not None:
+                # the chart keeps its result, now at a newer ts
+                node_result = dict(node_result,
+                                   version_result=old_result["version_result"])
             self.chart_id_to_vis_result[chart_id] = node_result
 
     def create_read_snapshot(self, chart_ids: list) -> dict:
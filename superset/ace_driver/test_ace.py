@@ -45,7 +45,8 @@ class TestACE:
                  db_password: str,
                  db_host: str,
                  db_port: str,
-                 sf: int):
+                 sf: int,
+                 read_mode: str = "poll"):
         self.tpch_behavior = TPCHDashBehavior(server_addr, username,
                                               password, dashboard_title, viewport_range,
                                               shift_step, explore_range, read_behavior,
@@ -55,7 +56,8 @@ class TestACE:
                                               opt_exec_time, opt_metrics, opt_skip_write,
                                               enable_stats_cache, enable_iv_sl_log,
                                               stat_dir, db_name,
-                                              db_username, db_password, db_host, db_port, sf)
+                                              db_username, db_password, db_host, db_port, sf,
+                                              read_mode)
         self.tpch_behavior.setup()
 
     def start_test(self):
@@ -52,6 +52,11 @@ if __name__ == '__main__':
     parser.add_argument('--read_behavior',
                         help='simulated behavior of a user reading the dashboard',
                         required=True)
+    parser.add_argument('--read_mode',
+                        help='poll the refreshed charts every 100ms, or subscribe to '
+                             'them and wait for each commit',
+                        choices=['poll', 'subscribe'],
+                        default='poll')
     parser.add_argument('--viewport_start',
                         help='starting viewport',
                         type=int,
@@ -153,6 +158,7 @@ if __name__ == '__main__':
                       db_password=args.db_password,
                       db_host=args.db_host,
                       db_port=args.db_port,
-                      sf=args.sf)
+                      sf=args.sf,
+                      read_mode=args.read_mode)
     testACE.start_test()
     testACE.report_results()
@@ -1274,6 +1274,68 @@ MENU_HIDE_USER_INFO = False
 SQLALCHEMY_DOCS_URL = "https://docs.sqlalchemy.org/en/13/core/engines.html"
 SQLALCHEMY_DISPLAY_TEXT = "SQLAlchemy docs"
 
+# ACE (transactional dashboard refresh) settings.
+# Number of worker threads shared by the schedulers of all dashboards; it bounds
+# the number of chart queries ACE runs concurrently in one process.
+ACE_SCHEDULER_NUM_WORKERS = 8
+# The scheduler of a dashboard without pending refreshes is dropped after this
+# many seconds and recreated by its next refresh.
+ACE_SCHEDULER_IDLE_TIMEOUT = int(timedelta(minutes=10).total_seconds())
+# Max number of concurrent ACE chart queries against one database (0: no limit)
+ACE_MAX_QUERIES_PER_DATABASE = 0
+# Number of threads running the EXPLAINs that estimate the refresh cost of charts
+ACE_COST_ESTIMATION_WORKERS = 4
+# The expected refresh time of each chart is a moving average of its observed
+# refresh times with weight ACE_COST_MODEL_ALPHA, blended with its EXPLAIN cost
+# until it has ACE_COST_MODEL_MIN_SAMPLES samples. The model is saved to
+# ACE_COST_MODEL_PATH ("": not saved).
+ACE_COST_MODEL_ALPHA = 0.2
+ACE_COST_MODEL_MIN_SAMPLES = 5
+ACE_COST_MODEL_PATH = os.path.join(DATA_DIR, "ace_cost_model.json")
+# Max number of rows of the query shared by the charts of a shared scan (see the
+# opt_shared_scan option of ace/<pk>/config); above it, the charts are refreshed
+# with one query each. Also the max number of groups of the delta query of a
+# chart maintained incrementally (see the watermark_columns option, which maps
+# the id of an append-only datasource to its increasing column); above it, the
+# chart is refreshed in full.
+ACE_SHARED_SCAN_ROW_LIMIT = 100000
+# Chart results no ACE reader can see any more are garbage collected every
+# ACE_GC_INTERVAL seconds, and as soon as the results kept for a dashboard
+# exceed ACE_GC_MEMORY_BUDGET bytes (0: no budget).
+ACE_GC_INTERVAL = 30
+ACE_GC_MEMORY_BUDGET = 128 * 1024 * 1024
+# Format of the "data" of the query results served by ace/<pk>/charts: "json"
+# records, or "arrow" for a base64 encoded Arrow IPC stream per query.
+ACE_PAYLOAD_FORMAT = "json"
+# ace/<pk>/subscribe holds a long-poll for at most ACE_SUBSCRIBE_TIMEOUT seconds,
+# which is also the keep-alive interval of its event streams. An event stream
+# is closed after ACE_SUBSCRIBE_STREAM_DURATION seconds; the client reconnects.
+ACE_SUBSCRIBE_TIMEOUT = 30
+ACE_SUBSCRIBE_STREAM_DURATION = int(timedelta(minutes=5).total_seconds())
+# Where the ACE state of the dashboards lives. "local" keeps it in the memory of
+# each process, which requires a single web worker. "redis" shares it through
+# the Redis server at ACE_STATE_STORE_URL, and "mmap" through memory-mapped
+# files in ACE_STATE_STORE_DIR for the workers of a single host.
+ACE_STATE_STORE = "local"
+ACE_STATE_STORE_URL = "redis://localhost:6379/0"
+ACE_STATE_STORE_DIR = os.path.join(DATA_DIR, "ace_state")
+# Seconds a process keeps the refreshes it submitted to a shared state store
+# without renewing its lease, which its version garbage collector does every
+# ACE_GC_INTERVAL seconds. The refreshes of a process whose lease expired are
+# aborted so that the other processes can commit past them. The clocks of the
+# hosts sharing a Redis server must be in sync within a fraction of the lease.
+ACE_STATE_STORE_LEASE = 120
+# A process reads from its replica of the state of a dashboard, which catches
+# up with the shared state store on every read, and looks up whether the
+# dashboard was deleted or created again every ACE_STATE_STORE_VALIDATE_INTERVAL
+# seconds.
+ACE_STATE_STORE_VALIDATE_INTERVAL = 5
+# With the "local" state store, the committed chart results of each dashboard
+# are checkpointed to ACE_CHECKPOINT_DIR every ACE_CHECKPOINT_INTERVAL seconds
+# (0: never) and restored when its ACE state is created after a restart.
+ACE_CHECKPOINT_INTERVAL = 60
+ACE_CHECKPOINT_DIR = os.path.join(DATA_DIR, "ace_checkpoints")
+
 # -------------------------------------------------------------------
 # *                WARNING:  STOP EDITING  HERE                    *
 # -------------------------------------------------------------------
@@ -63,6 +63,7 @@ from superset.dashboards.schemas import (
     DashboardGetResponseSchema,
     DashboardPostMVCSchema,
     DashboardPostChartsSchema,
+    DashboardPostSubscribeSchema,
     DashboardPostSchema,
     DashboardPutSchema,
     get_delete_ids_schema,
@@ -90,11 +91,18 @@ from superset.views.filters import FilterRelatedOwners
 from superset.ace.util_functions import (
     add_ds_state_manager,
     config_ace,
-    read_view_port,
-    submit_one_txn,
-    get_or_create_one_scheduler,
+    read_view_port_json,
+    subscribe_view_port_json,
+    stream_view_port_json,
+    admit_one_txn,
+    schedule_one_txn,
+    get_ds_state_manager,
+    ADMITTED,
+    MERGED,
+    REJECTED,
     shut_down_one_scheduler,
     remove_ds_state_manager,
+    get_ace_stats,
 )
 
 from superset import appbuilder
@@ -125,6 +133,8 @@ class DashboardRestApi(BaseSupersetModelRestApi):
         "ace_post_config",
         "ace_post_refresh",
         "ace_read_refreshed_charts",
+        "ace_subscribe_charts",
+        "ace_get_stats",
     }
     resource_name = "dashboard"
     allow_browser_login = True
@@ -203,6 +213,7 @@ class DashboardRestApi(BaseSupersetModelRestApi):
     base_order = ("changed_on", "desc")
 
     dashboard_post_charts_schema = DashboardPostChartsSchema()
+    dashboard_post_subscribe_schema = DashboardPostSubscribeSchema()
     dashboard_post_mvc_schema = DashboardPostMVCSchema()
     add_model_schema = DashboardPostSchema()
     edit_model_schema = DashboardPutSchema()
@@ -260,8 +271,9 @@ class DashboardRestApi(BaseSupersetModelRestApi):
     def ace_create_ds_state(self, dash_id: str) -> Response:
         try:
             dash = DashboardDAO.get_by_id_or_slug(dash_id)
-            add_ds_state_manager(dash)
-            return self.response(200)
+            filter_node_ids, filter_scopes = add_ds_state_manager(dash)
+            return self.response(200, result={"filter_node_ids": filter_node_ids,
+                                              "filter_scopes": filter_scopes})
         except DashboardNotFoundError:
             return self.response_404()
 
@@ -307,7 +319,17 @@ class DashboardRestApi(BaseSupersetModelRestApi):
                    item.get("username", ""),
                    item.get("password", ""),
                    item.get("host", ""),
-                   item.get("port", ""))
+                   item.get("port", ""),
+                   item.get("num_refresh_workers", 1),
+                   item.get("scheduler_weight", 1.0),
+                   item.get("opt_shared_scan", False),
+                   item.get("watermark_columns", {}),
+                   item.get("max_pending_txns", 0),
+                   item.get("admission_mode", "reject"),
+                   item.get("adaptive_k", False),
+                   item.get("target_invisibility", 0.1),
+                   item.get("target_staleness", 0.1),
+                   item.get("viewport_predictor", ""))
         response = self.response(
             200,
             id=pk,
@@ -335,11 +357,23 @@ class DashboardRestApi(BaseSupersetModelRestApi):
             charts_form_data = json_body["charts_form_data"]
         except KeyError:
             return self.response_400(message="Not follow the refresh format")
-        ts, node_group_list = submit_one_txn(dash_id, node_ids_to_refresh,
-                                             node_ids_in_viewport)
-        scheduler = get_or_create_one_scheduler(dash_id, appbuilder.get_app)
-        scheduler.submit_one_txn(ts, node_group_list, charts_form_data)
-        result = {"ts": ts}
+        # too many txns of the dashboard are pending: the txn is merged into
+        # the pending one, or the client retries after Retry-After seconds
+        status, value, node_group_list = admit_one_txn(
+            dash_id, appbuilder.get_app, node_ids_to_refresh,
+            node_ids_in_viewport, charts_form_data)
+        if status == ADMITTED:
+            schedule_one_txn(dash_id, appbuilder.get_app, value, node_group_list,
+                             charts_form_data)
+        queue_depth = get_ds_state_manager(dash_id).get_queue_depth()
+        if status == REJECTED:
+            response = self.response(429, message="Too many pending refreshes",
+                                     queue_depth=queue_depth)
+            response.headers["Retry-After"] = str(value)
+            return response
+        result = {"ts": value, "queue_depth": queue_depth}
+        if status == MERGED:
+            result["merged"] = True
         return self.response(200, id=pk, result=result)
 
     @expose("ace/<pk>/charts", methods=["POST"])
@@ -360,14 +394,70 @@ class DashboardRestApi(BaseSupersetModelRestApi):
         except ValidationError as error:
             return self.response_400(message=error.messages)
         node_id_set = set(item["node_ids_to_read"])
-        result = read_view_port(dash_id, node_id_set)
-        response = self.response(
-            200,
-            id=pk,
-            result=result,
-        )
+        # the chart results were serialized when they were stored
+        result = read_view_port_json(dash_id, node_id_set)
+        data = b'{"id": %s, "result": %s}' % (json.dumps(pk).encode("utf-8"),
+                                               result)
+        response = make_response(data, 200)
+        response.headers["Content-Type"] = "application/json; charset=utf-8"
         return response
 
+    @expose("ace/<pk>/subscribe", methods=["POST"])
+    @protect()
+    @safe
+    @statsd_metrics
+    @event_logger.log_this_with_context(
+        action=lambda self, *args, **kwargs: f"{self.__class__.__name__}"
+                                             f".ace_subscribe_charts",
+        log_to_statsd=False,  # pylint: disable=arguments-renamed
+    )
+    def ace_subscribe_charts(self, pk: str) -> Response:
+        dash_id = int(pk)
+        if not request.is_json:
+            return self.response_400(message="Request is not JSON")
+        try:
+            item = self.dashboard_post_subscribe_schema.load(request.json)
+        except ValidationError as error:
+            return self.response_400(message=error.messages)
+        node_id_set = set(item["node_ids_to_read"])
+        if item["stream"]:
+            results = stream_view_port_json(dash_id, node_id_set, item["last_ts"])
+
+            def generate_events():
+                for result in results:
+                    if result is None:
+                        yield b": keep-alive\n\n"
+                    else:
+                        yield b"data: %s\n\n" % result
+
+            response = Response(generate_events(), mimetype="text/event-stream")
+            response.headers["Cache-Control"] = "no-cache"
+            response.headers["X-Accel-Buffering"] = "no"
+            return response
+        # long-poll
+        result = subscribe_view_port_json(dash_id, node_id_set, item["last_ts"],
+                                          item["timeout"])
+        data = b'{"id": %s, "result": %s}' % (json.dumps(pk).encode("utf-8"),
+                                               result)
+        response = make_response(data, 200)
+        response.headers["Content-Type"] = "application/json; charset=utf-8"
+        return response
+
+    @expose("ace/<pk>/stats", methods=["GET"])
+    @protect()
+    @safe
+    @statsd_metrics
+    @event_logger.log_this_with_context(
+        action=lambda self, *args, **kwargs: f"{self.__class__.__name__}"
+                                             f".ace_get_stats",
+        log_to_statsd=False,  # pylint: disable=arguments-renamed
+    )
+    def ace_get_stats(self, pk: str) -> Response:
+        stats = get_ace_stats(int(pk))
+        if stats is None:
+            return self.response_404()
+        return self.response(200, id=pk, result=stats)
+
     @etag_cache(
         get_last_modified=lambda _self,
                                  id_or_slug: DashboardDAO.get_dashboard_changed_on(
@@ -19,12 +19,12 @@ import re
 from typing import Any, Dict, Union
 
 from marshmallow import fields, post_load, Schema
-from marshmallow.validate import Length, ValidationError, OneOf
+from marshmallow.validate import Length, ValidationError, OneOf, Range
 
 from superset.exceptions import SupersetException
 from superset.utils import core as utils
 
-from superset.ace.util_class import PropertyCombination
+from superset.ace.util_class import PropertyCombination, START_TS
 
 get_delete_ids_schema = {"type": "array", "items": {"type": "integer"}}
 get_export_ids_schema = {"type": "array", "items": {"type": "integer"}}
@@ -36,6 +36,9 @@ thumbnail_query_schema = {
 
 mvc_description = "An integer value to decide the mvc properties"
 node_id_list_description = "A list of node ids"
+last_ts_description = "The ts of the last snapshot read by the client"
+timeout_description = "Max number of seconds to wait for a newer snapshot"
+stream_description = "Stream the snapshots as server-sent events"
 dashboard_title_description = "A title for the dashboard."
 slug_description = "Unique identifying part for the web address of the dashboard."
 owners_description = (
@@ -239,6 +242,13 @@ class DashboardPostChartsSchema(BaseDashboardSchema):
     node_ids_to_read = fields.List(fields.Integer(description=node_id_list_description))
 
 
+class DashboardPostSubscribeSchema(DashboardPostChartsSchema):
+    last_ts = fields.Integer(description=last_ts_description, missing=START_TS - 1)
+    timeout = fields.Float(description=timeout_description, missing=30,
+                           validate=Range(min=0))
+    stream = fields.Boolean(description=stream_description, missing=False)
+
+
 class DashboardPostSchema(BaseDashboardSchema):
     dashboard_title = fields.String(
         description=dashboard_title_description,
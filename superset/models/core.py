@@ -55,6 +55,7 @@ from sqlalchemy.schema import UniqueConstraint
 from sqlalchemy.sql import expression, Select
 
 from superset import app, db_engine_specs, is_feature_enabled
+from superset.ace.query_cancel import register_cursor
 from superset.db_engine_specs.base import TimeGrain
 from superset.extensions import cache_manager, encrypted_field_factory, security_manager
 from superset.models.helpers import AuditMixinNullable, ImportExportMixin
@@ -416,6 +417,7 @@ class Database(
 
         with closing(engine.raw_connection()) as conn:
             cursor = conn.cursor()
+            register_cursor(self, cursor)
             for sql_ in sqls[:-1]:
                 _log_query(sql_)
                 self.db_engine_spec.execute(cursor, sql_)
@@ -0,0 +1,109 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import struct
+
+import pytest
+from pytest import mark
+
+from superset.ace.checkpoint import (HEADER, load_checkpoint, parse_checkpoint,
+                                     write_checkpoint)
+from superset.ace.ds_state_manager import DashStateManager
+from superset.ace.util_class import Checkpoint, Dependency, Node, NodeType
+
+CHECKPOINT = Checkpoint(7, {10: (5, b'{"a": 1}'), 11: (7, b"[]")}, {10: 2.5})
+
+
+def create_state_manager() -> DashStateManager:
+    dependency_list = [Dependency(Node(chart_id - 10, NodeType.BASE_TABLE),
+                                  Node(chart_id, NodeType.VIZ))
+                       for chart_id in (10, 11)]
+    ds_state_manager = DashStateManager(dependency_list)
+    ds_state_manager.config_state_manager(1, 0, True, False, False, True, True,
+                                          "", "", "", "", "")
+    return ds_state_manager
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = str(tmp_path / "1.ckpt")
+    write_checkpoint(path, CHECKPOINT)
+    return path
+
+
+def read_bytes(path: str) -> bytes:
+    with open(path, "rb") as checkpoint_file:
+        return checkpoint_file.read()
+
+
+def write_bytes(path: str, data: bytes) -> None:
+    with open(path, "wb") as checkpoint_file:
+        checkpoint_file.write(data)
+
+
+@mark.unittest
+class TestCheckpoint:
+    def test_round_trip(self, path):
+        assert parse_checkpoint(read_bytes(path)) == CHECKPOINT
+        assert load_checkpoint(path) == CHECKPOINT
+
+    def test_bad_magic_and_version(self, path):
+        data = read_bytes(path)
+        with pytest.raises(ValueError):
+            parse_checkpoint(b"XXXX" + data[4:])
+        with pytest.raises(ValueError):
+            parse_checkpoint(data[:4] + struct.pack("<I", 2) + data[8:])
+        write_bytes(path, b"XXXX" + data[4:])
+        assert load_checkpoint(path) is None
+
+    def test_truncated(self, path):
+        data = read_bytes(path)
+        with pytest.raises(struct.error):
+            parse_checkpoint(data[:HEADER.size - 1])
+        # in the middle of the result of a node
+        with pytest.raises(ValueError):
+            parse_checkpoint(data[:HEADER.size + 25])
+        # in the middle of the metrics
+        with pytest.raises(struct.error):
+            parse_checkpoint(data[:-1])
+        for length in (HEADER.size - 1, HEADER.size + 25, len(data) - 1):
+            write_bytes(path, data[:length])
+            assert load_checkpoint(path) is None
+
+    def test_empty_or_missing(self, path, tmp_path):
+        write_bytes(path, b"")
+        assert load_checkpoint(path) is None
+        assert load_checkpoint(str(tmp_path / "2.ckpt")) is None
+
+    def test_restore(self, tmp_path):
+        ds_state_manager = create_state_manager()
+        ts, _ = ds_state_manager.submit_one_txn({0, 1}, set(), 1)
+        ds_state_manager.finish_one_update(10, ts, {"a": 1})
+        ds_state_manager.finish_one_update(11, ts, [1, 2])
+        ds_state_manager.commit_one_txn(ts)
+        ds_state_manager.read_view_port({10}, 3)
+        path = str(tmp_path / "1.ckpt")
+        write_checkpoint(path, ds_state_manager.get_checkpoint())
+
+        restored = create_state_manager()
+        restored.restore_checkpoint(load_checkpoint(path))
+        assert restored.last_committed == ts
+        assert restored.node_metrics[10] == 3
+        read_result = restored.read_view_port({10, 11}, 0)
+        assert read_result["ts"] == ts
+        assert {node_id: version["version_result"] for node_id, version
+                in read_result["snapshot"].items()} == {10: {"a": 1}, 11: [1, 2]}
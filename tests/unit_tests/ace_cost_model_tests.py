@@ -0,0 +1,67 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+from pytest import approx, mark
+
+from superset.ace.cost_model import ChartCostModel
+
+
+@mark.unittest
+class TestChartCostModel:
+    def test_learns_the_time_of_each_chart(self):
+        model = ChartCostModel(alpha=0.5, min_samples=2)
+        assert model.predict({1}, {}) == {}
+        assert model.predict({1}, {1: 100.0}) == {1: 100.0}
+        model.observe(1, 2.0)
+        model.observe(1, 4.0)
+        assert model.predict({1}, {}) == {1: approx(3.0)}
+
+    def test_secs_per_cost_unit_by_database(self):
+        model = ChartCostModel(alpha=1.0, min_samples=100)
+        model.predict({1, 2, 3, 4}, {1: 100.0, 2: 100.0, 3: 50.0, 4: 50.0},
+                      {1: 1, 2: 2, 3: 1, 4: 2})
+        model.observe(1, 1.0)
+        model.observe(2, 10.0)
+        # the prior of a chart converts its EXPLAIN cost with the rate of
+        # its own database
+        costs = model.predict({3, 4}, {})
+        assert costs == {3: approx(0.5), 4: approx(5.0)}
+        assert model.get_stats()["secs_per_cost_unit"] == {"1": approx(0.01),
+                                                           "2": approx(0.1)}
+
+    def test_incremental_refresh_keeps_secs_per_cost_unit(self):
+        model = ChartCostModel(alpha=1.0, min_samples=100)
+        model.predict({1, 2}, {1: 100.0, 2: 100.0}, {1: 1, 2: 1})
+        model.observe(1, 1.0)
+        model.observe(1, 0.01, incremental=True)
+        assert model.get_stats()["secs_per_cost_unit"] == {"1": approx(0.01)}
+        assert model.predict({2}, {}) == {2: approx(1.0)}
+
+    def test_save_and_load(self, tmp_path):
+        path = str(tmp_path / "cost_model.json")
+        model = ChartCostModel(alpha=1.0, path=path)
+        model.predict({1}, {1: 100.0}, {1: 1})
+        model.observe(1, 2.0)
+        model.save()
+        loaded = ChartCostModel(alpha=1.0, path=path)
+        assert loaded.secs_per_cost_unit == {"1": approx(0.02)}
+        assert loaded.predict({1}, {}, {1: 1}) == {1: approx(2.0)}
+
+        # a model saved with a single rate for all databases relearns them
+        with open(path, "w") as model_file:
+            model_file.write('{"secs_per_cost_unit": 0.5, "charts": {}}')
+        assert ChartCostModel(path=path).secs_per_cost_unit == {}
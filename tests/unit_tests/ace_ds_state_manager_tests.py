@@ -0,0 +1,176 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import hashlib
+from threading import Barrier, Event, Thread
+
+from pytest import mark
+
+from superset.ace.ds_state_manager import DashStateManager
+from superset.ace.payload_store import payload_store
+from superset.ace.util_class import Dependency, Node, NodeType
+
+CHART_IDS = (10, 11, 12)
+
+
+# one base table per chart, in viewport mode
+def create_state_manager(chart_ids: tuple = CHART_IDS,
+                         prop_comb: int = 1) -> DashStateManager:
+    dependency_list = [Dependency(Node(chart_id - 10, NodeType.BASE_TABLE),
+                                  Node(chart_id, NodeType.VIZ))
+                       for chart_id in chart_ids]
+    ds_state_manager = DashStateManager(dependency_list)
+    ds_state_manager.config_state_manager(prop_comb, 0, True, False, False, True, True,
+                                          "", "", "", "", "")
+    return ds_state_manager
+
+
+# try_submit_one_txn from num_threads threads at once, returns the admitted ts
+def submit_concurrently(ds_state_manager, num_threads: int) -> list:
+    barrier = Barrier(num_threads)
+    admitted_ts = []
+
+    def submit() -> None:
+        barrier.wait()
+        ret = ds_state_manager.try_submit_one_txn({0}, set(), 1)
+        if ret is None:
+            ds_state_manager.count_rejected_txn()
+        else:
+            admitted_ts.append(ret[0])
+
+    threads = [Thread(target=submit) for _ in range(num_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return admitted_ts
+
+
+# submits a txn refreshing every chart, and finishes it unless told otherwise
+def refresh_charts(ds_state_manager: DashStateManager, commit: bool = True) -> int:
+    ts, _ = ds_state_manager.submit_one_txn({chart_id - 10 for chart_id in CHART_IDS},
+                                            set(), 1)
+    if commit:
+        for chart_id in CHART_IDS:
+            ds_state_manager.finish_one_update(chart_id, ts, {"ts": ts})
+        ds_state_manager.commit_one_txn(ts)
+    return ts
+
+
+@mark.unittest
+class TestDashStateManager:
+    def test_charts_not_ready_keep_their_priority(self):
+        ds_state_manager = create_state_manager()
+        ts, _ = ds_state_manager.submit_one_txn({0, 1, 2}, {10}, 1)
+        ds_state_manager.read_view_port({11}, 5)
+        pending = set(CHART_IDS)
+        # the most viewed chart is not ready at first, the next one is picked
+        chart_id = ds_state_manager.get_top_priority_node(ts, pending, {}, {10, 12})
+        assert chart_id == 10
+        pending.discard(chart_id)
+        chart_id = ds_state_manager.get_top_priority_node(ts, pending, {}, {12})
+        assert chart_id == 12
+        pending.discard(chart_id)
+        assert ds_state_manager.get_top_priority_node(ts, pending, {}) == 11
+
+    def test_viewport_reads_do_not_grow_the_queue(self):
+        ds_state_manager = create_state_manager()
+        ts, _ = ds_state_manager.submit_one_txn({0, 1, 2}, set(), 1)
+        pending = set(CHART_IDS)
+        chart_id = ds_state_manager.get_top_priority_node(ts, pending, {})
+        pending.discard(chart_id)
+        for _ in range(1000):
+            ds_state_manager.read_view_port(pending, 1)
+        pending_queue = ds_state_manager.pending_queues[ts]
+        assert len(pending_queue) == 2
+        assert len(pending_queue.heap) <= 64
+
+
+    def test_gc_keeps_iv_counters_when_nothing_is_removed(self):
+        ds_state_manager = create_state_manager(prop_comb=3)
+        key = frozenset(CHART_IDS)
+        refresh_charts(ds_state_manager)
+        ds_state_manager.read_view_port(set(CHART_IDS), 1)
+        assert key in ds_state_manager.iv_counters
+        num_versions, _ = ds_state_manager.clean_unused_versions()
+        assert num_versions != 0
+        assert len(ds_state_manager.iv_counters) == 0
+
+        ds_state_manager.read_view_port(set(CHART_IDS), 1)
+        iv_counter = ds_state_manager.iv_counters[key]
+        assert ds_state_manager.clean_unused_versions() == (0, 0)
+        assert ds_state_manager.iv_counters[key] is iv_counter
+
+    def test_gc_is_signalled_past_its_watermark(self):
+        ds_state_manager = create_state_manager()
+        ds_state_manager.memory_budget = 1
+        ds_state_manager.gc_event = gc_event = Event()
+        # nothing is committed yet
+        ts = refresh_charts(ds_state_manager, commit=False)
+        ds_state_manager.finish_one_update(10, ts, {})
+        assert not gc_event.is_set()
+        for chart_id in (11, 12):
+            ds_state_manager.finish_one_update(chart_id, ts, {})
+        ds_state_manager.commit_one_txn(ts)
+        ds_state_manager.read_view_port(set(CHART_IDS), 1)
+
+        ts = refresh_charts(ds_state_manager, commit=False)
+        ds_state_manager.finish_one_update(10, ts, {"a": 1})
+        assert gc_event.is_set()
+        gc_event.clear()
+        ds_state_manager.clean_unused_versions()
+        ds_state_manager.finish_one_update(11, ts, {"a": 1})
+        assert not gc_event.is_set()
+        ds_state_manager.finish_one_update(12, ts, {"a": 1})
+        ds_state_manager.commit_one_txn(ts)
+
+        # a reader that does not read any more holds back the watermark
+        ts = refresh_charts(ds_state_manager, commit=False)
+        ds_state_manager.finish_one_update(10, ts, {"a": 2})
+        assert not gc_event.is_set()
+        ds_state_manager.read_view_port(set(CHART_IDS), 1)
+        ds_state_manager.finish_one_update(11, ts, {"a": 2})
+        assert gc_event.is_set()
+
+    def test_result_replaced_at_the_same_ts_is_released(self):
+        ds_state_manager = create_state_manager()
+        ts = refresh_charts(ds_state_manager, commit=False)
+        first_result = {"replaced": "first"}
+        first_digest = hashlib.sha256(
+            payload_store.serialize(first_result)).hexdigest()
+        ds_state_manager.finish_one_update(10, ts, first_result)
+        assert first_digest in payload_store.entries
+        ds_state_manager.finish_one_update(10, ts, {"replaced": "second"})
+        assert first_digest not in payload_store.entries
+        node = ds_state_manager.view_graph.id_to_node[10]
+        assert node.get_visible_version().result == {"replaced": "second"}
+        assert ds_state_manager.payload_bytes == \
+            len(payload_store.serialize({"replaced": "second"}))
+        ds_state_manager.release_all_payloads()
+
+    def test_admission_is_atomic(self):
+        ds_state_manager = create_state_manager()
+        ds_state_manager.config_state_manager(1, 0, True, False, False, True, True,
+                                              "", "", "", "", "",
+                                              max_pending_txns=2)
+        admitted_ts = submit_concurrently(ds_state_manager, 16)
+        assert len(admitted_ts) == 2
+        assert ds_state_manager.get_queue_depth() == 2
+        stats = ds_state_manager.get_admission_stats()
+        assert stats["rejected_txns"] == 14
+        ds_state_manager.commit_one_txn(max(admitted_ts))
+        assert ds_state_manager.try_submit_one_txn({0}, set(), 1) is not None
@@ -0,0 +1,95 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+from pytest import mark
+
+from superset.ace.filter_scope import (get_chart_order, get_filter_box_columns,
+                                       get_filter_node_id, get_filter_scopes)
+
+# ROOT_ID -> GRID_ID -> two rows, the second of them in a tab
+POSITION = {
+    "ROOT_ID": {"type": "ROOT", "children": ["GRID_ID"]},
+    "GRID_ID": {"type": "GRID", "children": ["ROW-1", "TABS-1"]},
+    "ROW-1": {"type": "ROW", "children": ["CHART-1", "CHART-2"]},
+    "TABS-1": {"type": "TABS", "children": ["TAB-1"]},
+    "TAB-1": {"type": "TAB", "children": ["ROW-2"]},
+    "ROW-2": {"type": "ROW", "children": ["CHART-3", "CHART-4"]},
+    "CHART-1": {"type": "CHART", "meta": {"chartId": 1}},
+    "CHART-2": {"type": "CHART", "meta": {"chartId": 2}},
+    "CHART-3": {"type": "CHART", "meta": {"chartId": 3}},
+    "CHART-4": {"type": "CHART", "meta": {"chartId": 4}},
+}
+CHART_IDS = {1, 2, 3, 4}
+
+
+@mark.unittest
+class TestFilterScope:
+    def test_filter_node_id(self):
+        node_id = get_filter_node_id("NATIVE_FILTER-1")
+        assert node_id < 0
+        assert node_id == get_filter_node_id("NATIVE_FILTER-1")
+        assert node_id != get_filter_node_id("NATIVE_FILTER-2")
+
+    def test_chart_order(self):
+        assert get_chart_order(POSITION) == [1, 2, 3, 4]
+        assert get_chart_order({}) == []
+
+    def test_native_filter_scopes(self):
+        json_metadata = {"native_filter_configuration": [
+            {"id": "in_tab", "scope": {"rootPath": ["TAB-1"], "excluded": [4]}},
+            {"id": "everywhere", "scope": {"rootPath": ["ROOT_ID"],
+                                           "excluded": [1]}},
+            {"id": "listed", "chartsInScope": [2, 3, 9]},
+            {"id": "no_scope"},
+            {"scope": {"rootPath": ["ROOT_ID"]}},
+        ]}
+        assert get_filter_scopes(json_metadata, POSITION, CHART_IDS) == {
+            "in_tab": {3},
+            "everywhere": {2, 3, 4},
+            "listed": {2, 3},
+            "no_scope": {1, 2, 3, 4},
+        }
+
+    def test_filter_box_scopes(self):
+        json_metadata = {"filter_scopes": {
+            "1": {"region": {"scope": ["ROW-2"], "immune": [4]},
+                  "__time_range": {"scope": ["ROOT_ID"], "immune": []}},
+        }}
+        assert get_filter_scopes(json_metadata, POSITION, CHART_IDS) == {
+            "1_region": {3},
+            "1___time_range": {2, 3, 4},
+        }
+
+    def test_filter_box_without_scopes(self):
+        form_data = {"date_filter": True,
+                     "filter_configs": [{"column": "region"}, {"column": None}]}
+        assert get_filter_box_columns(form_data) == ["__time_range", "region"]
+        assert get_filter_box_columns({}) == []
+
+        json_metadata = {"filter_immune_slices": [2],
+                         "filter_immune_slice_fields": {"3": ["region"]}}
+        filter_box_columns = {1: get_filter_box_columns(form_data)}
+        assert get_filter_scopes(json_metadata, POSITION, CHART_IDS,
+                                 filter_box_columns) == {
+            "1_region": {4},
+            "1___time_range": {3, 4},
+        }
+        # the explicit scopes of a filter box take precedence
+        json_metadata = {"filter_scopes": {
+            "1": {"region": {"scope": ["ROW-1"], "immune": []}}}}
+        assert get_filter_scopes(json_metadata, POSITION, CHART_IDS,
+                                 filter_box_columns) == {"1_region": {2}}
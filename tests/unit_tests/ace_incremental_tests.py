@@ -0,0 +1,126 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import pandas as pd
+from pytest import mark
+
+from superset.ace.incremental import (build_incremental_form_data,
+                                      build_incremental_result,
+                                      get_incremental_key, merge_incremental_state,
+                                      WATERMARK_LABEL)
+
+WATERMARK_COLUMN = "l_shipdate"
+PARTIAL_COLUMNS = ["a", "SUM(x)", "AVG(y)__ace_sum", "AVG(y)__ace_count", "MIN(z)",
+                   WATERMARK_LABEL]
+
+
+def create_metric(aggregate: str, column_name: str) -> dict:
+    return {"expressionType": "SIMPLE", "aggregate": aggregate,
+            "column": {"column_name": column_name},
+            "label": f"{aggregate}({column_name})"}
+
+
+def create_form_data(**query) -> dict:
+    chart_query = {"columns": ["a"],
+                   "metrics": [create_metric("SUM", "x"), create_metric("AVG", "y"),
+                               create_metric("MIN", "z")],
+                   "filters": [{"col": "region", "op": "==", "val": "EU"}]}
+    chart_query.update(query)
+    return {"datasource": {"id": 1, "type": "table"}, "queries": [chart_query]}
+
+
+def create_payload(rows: list) -> dict:
+    return {"colnames": PARTIAL_COLUMNS,
+            "data": [dict(zip(PARTIAL_COLUMNS, row)) for row in rows],
+            "rowcount": len(rows),
+            "status": "success"}
+
+
+@mark.unittest
+class TestIncremental:
+    def test_incremental_key(self):
+        key = get_incremental_key(create_form_data(), WATERMARK_COLUMN)
+        assert key is not None
+        # the ordering and row limit are applied to the merged aggregates
+        assert key == get_incremental_key(
+            create_form_data(orderby=[["a", True]], row_limit=10), WATERMARK_COLUMN)
+        assert key != get_incremental_key(create_form_data(columns=["b"]),
+                                          WATERMARK_COLUMN)
+        assert key != get_incremental_key(create_form_data(), "l_commitdate")
+        assert get_incremental_key(create_form_data(), None) is None
+
+    def test_charts_not_maintained_incrementally(self):
+        # HAVING is evaluated over all the rows of a group, not the delta
+        assert get_incremental_key(create_form_data(extras={"having": "SUM(x) > 1"}),
+                                   WATERMARK_COLUMN) is None
+        assert get_incremental_key(
+            create_form_data(metrics=[create_metric("COUNT_DISTINCT", "x")]),
+            WATERMARK_COLUMN) is None
+        assert get_incremental_key(create_form_data(is_timeseries=True),
+                                   WATERMARK_COLUMN) is None
+        assert get_incremental_key(create_form_data(orderby=[["b", True]]),
+                                   WATERMARK_COLUMN) is None
+
+    def test_incremental_form_data(self):
+        form_data = create_form_data(orderby=[["a", True]], row_limit=10)
+        query = build_incremental_form_data(form_data, WATERMARK_COLUMN,
+                                            None, 1000)["queries"][0]
+        assert [metric["label"] for metric in query["metrics"]] == \
+            PARTIAL_COLUMNS[1:]
+        assert [metric["aggregate"] for metric in query["metrics"]] == \
+            ["SUM", "SUM", "COUNT", "MIN", "MAX"]
+        assert query["orderby"] == []
+        assert query["row_limit"] == 1000
+        assert len(query["filters"]) == 1
+
+        query = build_incremental_form_data(form_data, WATERMARK_COLUMN,
+                                            12, 1000)["queries"][0]
+        assert query["filters"][-1] == {"col": WATERMARK_COLUMN, "op": ">", "val": 12}
+        assert form_data["queries"][0]["row_limit"] == 10
+
+    def test_merge_incremental_state(self):
+        form_data = create_form_data(orderby=[["SUM(x)", False]])
+        state = merge_incremental_state(None, "key", create_payload([
+            ("p", 1.0, 4.0, 2, 5, 10),
+            ("q", 2.0, 3.0, 1, 7, 12),
+        ]), form_data)
+        assert state.watermark == 12
+        # an empty delta keeps the state
+        assert merge_incremental_state(state, "key", create_payload([]),
+                                       form_data) is state
+
+        state = merge_incremental_state(state, "key", create_payload([
+            ("q", 1.0, 5.0, 1, 2, 15),
+            ("r", 4.0, 0.0, 0, 9, 14),
+        ]), form_data)
+        assert state.watermark == 15
+        assert len(state.df.index) == 3
+
+        payload = build_incremental_result(create_payload([]), state, form_data)
+        assert payload["colnames"] == ["a", "SUM(x)", "AVG(y)", "MIN(z)"]
+        assert payload["rowcount"] == 3
+        rows = payload["data"]
+        assert [row["a"] for row in rows] == ["r", "q", "p"]
+        assert [row["SUM(x)"] for row in rows] == [4.0, 3.0, 1.0]
+        # the AVG of a group without rows is NULL
+        assert pd.isna(rows[0]["AVG(y)"])
+        assert [row["AVG(y)"] for row in rows[1:]] == [4.0, 2.0]
+        assert [row["MIN(z)"] for row in rows] == [9, 2, 5]
+
+        form_data["queries"][0]["row_limit"] = 1
+        payload = build_incremental_result(create_payload([]), state, form_data)
+        assert [row["a"] for row in payload["data"]] == ["r"]
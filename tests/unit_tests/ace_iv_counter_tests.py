@@ -0,0 +1,111 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import random
+
+from pytest import mark
+
+from superset.ace.iv_counter import build_iv_counter, IVCounter
+from superset.ace.util_class import IV, Node, NodeType, START_TS, Version
+
+
+@mark.unittest
+class TestIVCounter:
+    def test_range_add_and_min(self):
+        counter = IVCounter(0, 4, [0, 1, 2, 1, 0])
+        assert counter.range_min(0, 4) == 0
+        assert counter.range_min(1, 3) == 1
+        counter.add(1, 2, 2)
+        assert [counter.range_min(ts, ts) for ts in range(5)] == [0, 3, 4, 1, 0]
+        # the lazy adds of a parent reach the leaves read later
+        counter.add(0, 4, -1)
+        assert counter.range_min(2, 2) == 3
+        assert counter.range_min(0, 4) == -1
+
+    def test_add_without_upper_bound(self):
+        counter = IVCounter(0, 2, [1, 1, 1])
+        counter.add(2, None, 1)
+        assert counter.tail == 2
+        counter.extend(9)
+        # the ts submitted later start from the count of the newest one
+        assert [counter.range_min(ts, ts) for ts in range(10)] == \
+            [1, 1, 2, 2, 2, 2, 2, 2, 2, 2]
+        counter.add(-5, 0, -1)
+        assert counter.range_min(0, 0) == 0
+
+    def test_last_leq(self):
+        counter = IVCounter(3, 8, [2, 0, 1, 3, 1, 2])
+        assert counter.last_leq(3, 8, 1) == 7
+        assert counter.last_leq(3, 6, 1) == 5
+        assert counter.last_leq(3, 8, 0) == 4
+        assert counter.last_leq(5, 8, 0) == START_TS - 1
+
+    def test_random_ops(self):
+        rng = random.Random(7)
+        last_ts = 5
+        values = [rng.randint(0, 3) for _ in range(last_ts + 1)]
+        counter = IVCounter(0, last_ts, list(values))
+        tail = values[-1]
+        for _ in range(500):
+            op = rng.randint(0, 3)
+            if op == 0:
+                new_last_ts = last_ts + rng.randint(1, 10)
+                counter.extend(new_last_ts)
+                values.extend([tail] * (new_last_ts - last_ts))
+                last_ts = new_last_ts
+            elif op == 1:
+                lo_ts = rng.randint(0, last_ts)
+                delta = rng.choice([-1, 1])
+                if rng.randint(0, 1) == 0:
+                    counter.add(lo_ts, None, delta)
+                    tail += delta
+                    hi_ts = last_ts
+                else:
+                    hi_ts = rng.randint(lo_ts, last_ts)
+                    counter.add(lo_ts, hi_ts, delta)
+                for ts in range(lo_ts, hi_ts + 1):
+                    values[ts] += delta
+            elif op == 2:
+                lo_ts = rng.randint(0, last_ts)
+                hi_ts = rng.randint(lo_ts, last_ts)
+                assert counter.range_min(lo_ts, hi_ts) == min(values[lo_ts:hi_ts + 1])
+            else:
+                lo_ts = rng.randint(0, last_ts)
+                hi_ts = rng.randint(lo_ts, last_ts)
+                bound = rng.randint(-2, 4)
+                expected = START_TS - 1
+                for ts in range(lo_ts, hi_ts + 1):
+                    if values[ts] <= bound:
+                        expected = ts
+                assert counter.last_leq(lo_ts, hi_ts, bound) == expected
+
+    def test_build_iv_counter(self):
+        nodes = [Node(node_id, NodeType.VIZ) for node_id in range(3)]
+        for version in (Version(1, {}), IV(3), Version(5, {}), IV(8)):
+            nodes[0].versions.append(version)
+        for version in (IV(2), IV(4), Version(6, {})):
+            nodes[1].versions.append(version)
+        for version in (Version(2, {}), IV(9)):
+            nodes[2].versions.append(version)
+        counter = build_iv_counter(nodes, 8)
+        assert counter.base_ts == 1
+        # the IVs read by a snapshot read of each ts, the IV at 9 is not
+        # submitted yet
+        expected = [sum(isinstance(node.get_version_by_snapshot(ts), IV)
+                        for node in nodes) for ts in range(1, 9)]
+        assert expected == [0, 1, 2, 2, 1, 0, 0, 1]
+        assert [counter.range_min(ts, ts) for ts in range(1, 9)] == expected
@@ -0,0 +1,66 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+from pytest import approx, mark
+
+from superset.ace.k_controller import ADJUST_INTERVAL, KController, READ_ALPHA
+
+
+def observe_reads(controller: KController, num_reads: int, num_iv: int,
+                  num_stale: int, commit_lag: int = 1, max_iv: int = 10) -> int:
+    k_relaxed = controller.k_relaxed
+    for _ in range(num_reads):
+        k_relaxed = controller.observe(num_iv, num_stale, 4, commit_lag, max_iv)
+    return k_relaxed
+
+
+@mark.unittest
+class TestKController:
+    def test_moving_averages(self):
+        controller = KController(2, 0.1, 0.1)
+        controller.observe(2, 1, 4, 1, 10)
+        assert controller.invisibility == approx(READ_ALPHA * 0.5)
+        assert controller.staleness == approx(READ_ALPHA * 0.25)
+
+    def test_k_goes_down_with_invisibility(self):
+        controller = KController(2, 0.1, 0.1)
+        # k is only adjusted every ADJUST_INTERVAL reads
+        assert observe_reads(controller, ADJUST_INTERVAL - 1, 4, 0) == 2
+        assert observe_reads(controller, 1, 4, 0) == 1
+        assert observe_reads(controller, ADJUST_INTERVAL, 4, 0) == 0
+        assert observe_reads(controller, ADJUST_INTERVAL, 4, 0) == 0
+        assert controller.get_stats()["adjustments"] == 2
+
+    def test_k_goes_up_with_staleness(self):
+        controller = KController(0, 0.1, 0.1)
+        assert observe_reads(controller, ADJUST_INTERVAL, 0, 4) == 1
+        # not past the IVs of the ts a reader can choose from
+        assert observe_reads(controller, 4 * ADJUST_INTERVAL, 0, 4, max_iv=2) == 2
+        # nor without pending txns
+        assert observe_reads(controller, ADJUST_INTERVAL, 0, 4, commit_lag=0,
+                             max_iv=10) == 2
+        assert observe_reads(controller, ADJUST_INTERVAL, 0, 4) == 3
+
+    def test_k_keeps_within_headroom(self):
+        controller = KController(1, 0.2, 0.1)
+        controller.invisibility = 0.15
+        # the invisibility is below its target but above the headroom
+        for _ in range(20 * ADJUST_INTERVAL):
+            controller.observe(3, 10, 20, 1, 10)
+        assert controller.invisibility == approx(0.15)
+        assert controller.k_relaxed == 1
+        assert controller.get_stats()["adjustments"] == 0
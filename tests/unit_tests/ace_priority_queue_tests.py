@@ -0,0 +1,49 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+from pytest import mark
+
+from superset.ace.priority_queue import ChartPriorityQueue
+
+
+@mark.unittest
+class TestChartPriorityQueue:
+    def test_pop_by_priority(self):
+        queue = ChartPriorityQueue()
+        for node_id, priority in ((1, 1.0), (2, 3.0), (3, 2.0)):
+            queue.update(node_id, priority)
+        queue.update(1, 4.0)
+        queue.remove(3)
+        assert len(queue) == 2
+        assert [queue.pop(), queue.pop(), queue.pop()] == [1, 2, None]
+
+    def test_pop_keeps_charts_not_ready(self):
+        queue = ChartPriorityQueue()
+        for node_id, priority in ((1, 3.0), (2, 2.0), (3, 1.0)):
+            queue.update(node_id, priority)
+        assert queue.pop({2, 3}) == 2
+        assert 1 in queue
+        assert queue.pop(set()) is None
+        assert [queue.pop(), queue.pop()] == [1, 3]
+
+    def test_invalidated_entries_are_bounded(self):
+        queue = ChartPriorityQueue()
+        for step in range(10000):
+            for node_id in range(10):
+                queue.update(node_id, float(step * 10 + node_id))
+        assert len(queue.heap) <= max(64, 3 * len(queue))
+        assert [queue.pop() for _ in range(10)] == list(reversed(range(10)))
@@ -0,0 +1,160 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import pytest
+from pytest import mark
+
+from superset.extensions import ace_scheduler_manager, ace_state_manager
+from superset.ace.ds_state_manager import DashStateManager
+from superset.ace.scheduler import merge_txn_records, Scheduler, TxnRecord
+from superset.ace.scheduler_service import SchedulerService
+from superset.ace.util_class import Dependency, Node, NodeType
+
+DASH_ID = 1
+# chart id -> database id
+CHART_DATABASES = {10: 1, 11: 2, 12: 2, 13: 2}
+
+
+@pytest.fixture
+def service():
+    # the workers are not started, the tests claim the tasks
+    service = SchedulerService(1, 60, 1, 1)
+    yield service
+    service.cost_estimator.shut_down()
+    service.query_canceller.shut_down()
+    ace_state_manager.pop(DASH_ID, None)
+    ace_scheduler_manager.pop(DASH_ID, None)
+
+
+def create_scheduler(service: SchedulerService) -> Scheduler:
+    dependency_list = [Dependency(Node(chart_id - 10, NodeType.BASE_TABLE),
+                                  Node(chart_id, NodeType.VIZ))
+                       for chart_id in CHART_DATABASES]
+    ds_state_manager = DashStateManager(dependency_list)
+    ds_state_manager.config_state_manager(1, 0, True, False, False, True, True,
+                                          "", "", "", "", "")
+    ace_state_manager[DASH_ID] = ds_state_manager
+    scheduler = Scheduler(DASH_ID, None)
+    service.register(scheduler)
+    return scheduler
+
+
+def claim_chart(scheduler: Scheduler):
+    task = scheduler.claim_task()
+    return task if task is None else task.chart_id
+
+
+def create_txn_record(ts: int, chart_ids: set, covered_ts: tuple = ()) -> TxnRecord:
+    node_groups = [{chart_id - 10 for chart_id in chart_ids}, set(), set(chart_ids)]
+    return TxnRecord(ts, node_groups,
+                     {chart_id: {"ts": ts} for chart_id in chart_ids},
+                     covered_ts=covered_ts)
+
+
+@mark.unittest
+class TestScheduler:
+    def test_claim_order_with_saturated_database(self, service):
+        scheduler = create_scheduler(service)
+        ds_state_manager = scheduler.ds_state_manager
+        ts, node_groups = ds_state_manager.submit_one_txn({0, 1, 2, 3}, set(), 1)
+        for chart_id, duration in ((11, 4), (12, 3), (13, 2), (10, 1)):
+            ds_state_manager.read_view_port({chart_id}, duration)
+        scheduler.submit_one_txn(ts, node_groups, {})
+        estimation_task = scheduler.claim_task()
+        scheduler.complete_task(estimation_task, ({}, dict(CHART_DATABASES)))
+
+        # the slot of database 2 is taken by another dashboard
+        service.acquire_db_slot(2)
+        task = scheduler.claim_task()
+        assert task.chart_id == 10
+        assert claim_chart(scheduler) is None
+        scheduler.complete_task(task, None)
+        service.release_db_slot(2)
+
+        # the charts of database 2 are claimed in the order of their priority
+        claimed_chart_ids = []
+        while scheduler.has_ready_task():
+            task = scheduler.claim_task()
+            claimed_chart_ids.append(task.chart_id)
+            assert claim_chart(scheduler) is None
+            scheduler.complete_task(task, None)
+        assert claimed_chart_ids == [11, 12, 13]
+        assert ds_state_manager.last_committed == ts
+        assert service.db_in_flight == {}
+
+    def test_replace_state_manager(self, service):
+        scheduler = create_scheduler(service)
+        ds_state_manager = DashStateManager([])
+        # the replica of the same owner keeps the txns of the scheduler
+        service.replace_state_manager(DASH_ID, ds_state_manager, True)
+        assert service.schedulers[DASH_ID] is scheduler
+        assert scheduler.ds_state_manager is ds_state_manager
+        # a new state drops the scheduler
+        service.replace_state_manager(DASH_ID, DashStateManager([]), False)
+        assert DASH_ID not in service.schedulers
+        assert scheduler.finish
+
+    def test_merge_txn_records(self):
+        merged = merge_txn_records(create_txn_record(1, {10, 11}),
+                                   create_txn_record(2, {11, 12}))
+        assert merged.ts == 2
+        assert merged.covered_ts == (1,)
+        assert merged.node_groups == [{0, 1, 2}, set(), {10, 11, 12}]
+        # a chart of the older txn only keeps its ts and form data
+        assert [merged.get_chart_ts(chart_id) for chart_id in (10, 11, 12)] == \
+            [1, 2, 2]
+        assert merged.charts_form_data == {10: {"ts": 1}, 11: {"ts": 2},
+                                           12: {"ts": 2}}
+
+        merged = merge_txn_records(merged, create_txn_record(4, {12}, (3,)))
+        assert merged.ts == 4
+        assert merged.covered_ts == (1, 2, 3)
+        assert [merged.get_chart_ts(chart_id) for chart_id in (10, 11, 12)] == \
+            [1, 2, 4]
+        assert merged.charts_form_data[12] == {"ts": 4}
+
+    def test_coalesce_pending_txns(self, service):
+        scheduler = create_scheduler(service)
+        ds_state_manager = scheduler.ds_state_manager
+        ts_list = []
+        for node_ids in ({0, 1}, {1, 2}, {2, 3}):
+            ts, node_groups = ds_state_manager.submit_one_txn(node_ids, set(), 1)
+            scheduler.submit_one_txn(ts, node_groups, {})
+            ts_list.append(ts)
+            if len(ts_list) == 1:
+                estimation_task = scheduler.claim_task()
+                scheduler.complete_task(estimation_task, None)
+        # chart 11 of the current txn is refreshed by the next one, which is
+        # coalesced with the newest one
+        assert scheduler.cur_chart_ids == {10}
+        assert len(scheduler.pending_txns) == 1
+        assert scheduler.pending_txns[0].covered_ts == (ts_list[1],)
+
+        claimed_chart_ids = []
+        while scheduler.has_ready_task():
+            task = scheduler.claim_task()
+            if task.chart_id is not None:
+                claimed_chart_ids.append(task.chart_id)
+                ts = task.txn.get_chart_ts(task.chart_id)
+                ds_state_manager.finish_one_update(task.chart_id, ts, {})
+            scheduler.complete_task(task, None)
+        assert sorted(claimed_chart_ids) == [10, 11, 12, 13]
+        assert ds_state_manager.last_committed == ts_list[2]
+        nodes = ds_state_manager.view_graph.id_to_node
+        assert [nodes[chart_id].get_visible_version().ts
+                for chart_id in (10, 11, 12, 13)] == \
+            [ts_list[0], ts_list[1], ts_list[2], ts_list[2]]
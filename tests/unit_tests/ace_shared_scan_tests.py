@@ -0,0 +1,133 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import pandas as pd
+import pytest
+from pytest import mark
+
+from superset.ace.shared_scan import (build_shared_scan_form_data,
+                                      get_shared_scan_key, has_having,
+                                      rollup_groups, split_shared_scan_result)
+
+
+def create_metric(aggregate: str, column_name: str) -> dict:
+    return {"expressionType": "SIMPLE", "aggregate": aggregate,
+            "column": {"column_name": column_name},
+            "label": f"{aggregate}({column_name})"}
+
+
+def create_form_data(columns: list, metrics: list, **query) -> dict:
+    chart_query = {"columns": columns, "metrics": metrics,
+                   "filters": [{"col": "region", "op": "==", "val": "EU"}]}
+    chart_query.update(query)
+    return {"datasource": {"id": 1, "type": "table"}, "queries": [chart_query]}
+
+
+# the result of the shared scan grouped by a and b
+PAYLOAD = {
+    "colnames": ["a", "b", "SUM(x)", "MIN(y)", "COUNT(z)"],
+    "data": [
+        {"a": "p", "b": 1, "SUM(x)": 1.0, "MIN(y)": 5, "COUNT(z)": 2},
+        {"a": "p", "b": 2, "SUM(x)": 2.0, "MIN(y)": 3, "COUNT(z)": 1},
+        {"a": "q", "b": 1, "SUM(x)": None, "MIN(y)": 7, "COUNT(z)": 0},
+        {"a": "q", "b": 2, "SUM(x)": None, "MIN(y)": 1, "COUNT(z)": 0},
+    ],
+    "rowcount": 4,
+    "status": "success",
+}
+
+
+@mark.unittest
+class TestSharedScan:
+    def test_shared_scan_key(self):
+        key = get_shared_scan_key(create_form_data(
+            ["a"], [create_metric("SUM", "x")], orderby=[["a", True]], row_limit=10))
+        assert key is not None
+        # the columns, metrics, order and row limit may differ
+        assert key == get_shared_scan_key(create_form_data(
+            ["b"], [create_metric("MIN", "y")]))
+        # the filters may not
+        form_data = create_form_data(["a"], [create_metric("SUM", "x")])
+        form_data["queries"][0]["filters"] = []
+        assert get_shared_scan_key(form_data) != key
+
+    def test_charts_that_do_not_share_scans(self):
+        metrics = [create_metric("SUM", "x")]
+        assert get_shared_scan_key(create_form_data(
+            ["a"], [create_metric("AVG", "x")])) is None
+        assert get_shared_scan_key(create_form_data(
+            ["a"], [{"expressionType": "SQL", "sqlExpression": "SUM(x)"}])) is None
+        assert get_shared_scan_key(create_form_data(
+            ["a"], metrics, orderby=[["b", True]])) is None
+        assert get_shared_scan_key(create_form_data(
+            ["a"], metrics, is_timeseries=True)) is None
+        assert get_shared_scan_key(create_form_data(
+            ["a"], metrics, extras={"having": "SUM(x) > 1"})) is None
+        assert get_shared_scan_key(create_form_data(
+            ["a"], metrics, having_druid=[{"col": "x"}])) is None
+
+    def test_has_having(self):
+        assert not has_having({"extras": {"having": "", "where": "x > 1"}})
+        assert has_having({"extras": {"having": "SUM(x) > 1"}})
+        assert has_having({"having": "SUM(x) > 1"})
+
+    def test_build_shared_scan_form_data(self):
+        forms = [create_form_data(["a"], [create_metric("SUM", "x")],
+                                  orderby=[["a", True]], row_limit=10),
+                 create_form_data(["b", "a"], [create_metric("SUM", "x"),
+                                               create_metric("MIN", "y")])]
+        query = build_shared_scan_form_data(forms, 1000)["queries"][0]
+        assert query["columns"] == ["a", "b"]
+        assert [metric["label"] for metric in query["metrics"]] == ["SUM(x)", "MIN(y)"]
+        assert query["orderby"] == []
+        assert query["row_limit"] == 1000
+        assert forms[0]["queries"][0]["columns"] == ["a"]
+
+        other_sum = dict(create_metric("SUM", "y"), label="SUM(x)")
+        with pytest.raises(ValueError):
+            build_shared_scan_form_data(
+                forms + [create_form_data(["a"], [other_sum])], 1000)
+
+    def test_split_shared_scan_result(self):
+        form_data = create_form_data(
+            ["a"], [create_metric("SUM", "x"), create_metric("MIN", "y"),
+                    create_metric("COUNT", "z")],
+            orderby=[["a", False]], row_limit=10)
+        payload = split_shared_scan_result(PAYLOAD, form_data)
+        assert payload["colnames"] == ["a", "SUM(x)", "MIN(y)", "COUNT(z)"]
+        assert payload["rowcount"] == 2
+        assert payload["status"] == "success"
+        rows = payload["data"]
+        assert [row["a"] for row in rows] == ["q", "p"]
+        # a SUM over groups that are all NULL is NULL, not 0
+        assert pd.isna(rows[0]["SUM(x)"])
+        assert rows[1]["SUM(x)"] == 3.0
+        assert [row["MIN(y)"] for row in rows] == [1, 3]
+        assert [row["COUNT(z)"] for row in rows] == [0, 3]
+
+        form_data["queries"][0]["row_limit"] = 1
+        assert split_shared_scan_result(PAYLOAD, form_data)["rowcount"] == 1
+
+    def test_rollup_without_columns(self):
+        rollup = {"SUM(x)": "sum", "MIN(y)": "min"}
+        df = pd.DataFrame(PAYLOAD["data"], columns=PAYLOAD["colnames"])
+        rolled_up_df = rollup_groups(df, [], rollup)
+        assert len(rolled_up_df.index) == 1
+        assert rolled_up_df["SUM(x)"].iloc[0] == 3.0
+        assert rolled_up_df["MIN(y)"].iloc[0] == 1
+        rolled_up_df = rollup_groups(df[df["a"] == "q"], [], rollup)
+        assert pd.isna(rolled_up_df["SUM(x)"].iloc[0])
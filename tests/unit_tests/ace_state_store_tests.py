@@ -0,0 +1,164 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import time
+from threading import Barrier, Thread
+
+import pytest
+from pytest import mark
+
+from superset.ace import shared_state_manager
+from superset.ace.shared_state_manager import (SharedDashStateManager,
+                                               StaleReplicaError, ABORTED_RESULT)
+from superset.ace.state_store import LocalStateStore, TrimmedLogError
+from superset.ace.util_class import (RESPONSE_CODE, RESPONSE, Dependency, Node,
+                                     NodeType, Version)
+
+DASH_ID = 1
+CHART_IDS = (10, 11)
+
+
+def make_result(response: str) -> dict:
+    return {RESPONSE_CODE: 200, RESPONSE: response}
+
+
+def create_replicas(store: LocalStateStore, lease_duration: float = 120,
+                    second_lease_duration: float = 120) -> tuple:
+    dependency_list = [Dependency(Node(1, NodeType.BASE_TABLE),
+                                  Node(chart_id, NodeType.VIZ))
+                       for chart_id in CHART_IDS]
+    first = SharedDashStateManager.create(DASH_ID, dependency_list, store,
+                                          lease_duration)
+    second = SharedDashStateManager.load(DASH_ID, store.load_dashboard(DASH_ID),
+                                         store, second_lease_duration)
+    return first, second
+
+
+def get_result(ds_state_manager: SharedDashStateManager, chart_id: int,
+               ts: int) -> dict:
+    ds_state_manager.sync()
+    node = ds_state_manager.view_graph.id_to_node[chart_id]
+    version = node.get_version_by_snapshot(ts)
+    assert isinstance(version, Version)
+    return version.result
+
+
+@mark.unittest
+class TestSharedDashStateManager:
+    def test_replay(self):
+        first, second = create_replicas(LocalStateStore())
+        ts, _ = first.submit_one_txn({10}, {10}, 1)
+        first.finish_one_update(10, ts, make_result("a"))
+        second.sync()
+        assert second.last_committed < ts
+        first.commit_one_txn(ts)
+        second.sync()
+        assert second.last_committed == ts
+        assert get_result(second, 10, ts) == make_result("a")
+
+    def test_abort_orphaned_txns(self):
+        store = LocalStateStore()
+        first, second = create_replicas(store, lease_duration=0.05)
+        ts, _ = first.submit_one_txn({10}, {10}, 1)
+        first.finish_one_update(10, ts, make_result("a"))
+        first.commit_one_txn(ts)
+        orphaned_ts, _ = first.submit_one_txn({10, 11}, {10, 11}, 1)
+        # the process of first stops, its lease expires
+        time.sleep(0.1)
+        second.clean_unused_versions()
+        assert second.last_committed == orphaned_ts
+        assert get_result(second, 10, orphaned_ts) == make_result("a")
+        assert get_result(second, 11, orphaned_ts) == ABORTED_RESULT
+        # the txns after the aborted ones commit as usual
+        ts, _ = second.submit_one_txn({11}, {11}, 1)
+        second.finish_one_update(11, ts, make_result("b"))
+        second.commit_one_txn(ts)
+        assert second.last_committed == ts
+        assert get_result(first, 11, ts) == make_result("b")
+
+    def test_compaction(self, monkeypatch):
+        monkeypatch.setattr(shared_state_manager, "MIN_COMPACTION_EVENTS", 1)
+        store = LocalStateStore()
+        first, second = create_replicas(store)
+        for response in ("a", "b"):
+            ts, _ = first.submit_one_txn({10}, {10}, 1)
+            first.finish_one_update(10, ts, make_result(response))
+            first.commit_one_txn(ts)
+        committed_ts = ts
+        pending_ts, _ = first.submit_one_txn({10, 11}, {10, 11}, 1)
+        first.finish_one_update(11, pending_ts, make_result("c"))
+        # the leases of the first pass hold the records the replicas replayed,
+        # the oldest replica alive compacts the logs on the second pass
+        for _ in range(2):
+            first.clean_unused_versions()
+            second.clean_unused_versions()
+        with pytest.raises(TrimmedLogError):
+            store.read_txns(DASH_ID, first.generation, 0)
+
+        # a new replica starts from the snapshot
+        third = SharedDashStateManager.load(DASH_ID, store.load_dashboard(DASH_ID),
+                                            store)
+        assert third.last_committed == committed_ts
+        assert get_result(third, 10, committed_ts) == make_result("b")
+        first.finish_one_update(10, pending_ts, make_result("d"))
+        first.commit_one_txn(pending_ts)
+        assert get_result(third, 10, pending_ts) == make_result("d")
+        assert get_result(third, 11, pending_ts) == make_result("c")
+        assert third.last_committed == pending_ts
+
+    def test_submit_on_stale_replica(self, monkeypatch):
+        monkeypatch.setattr(shared_state_manager, "MIN_COMPACTION_EVENTS", 1)
+        store = LocalStateStore()
+        first, second = create_replicas(store, second_lease_duration=0.05)
+        ts, _ = first.submit_one_txn({10}, {10}, 1)
+        first.finish_one_update(10, ts, make_result("a"))
+        first.commit_one_txn(ts)
+        # the lease of second expires, first trims the records it did not replay
+        time.sleep(0.1)
+        first.clean_unused_versions()
+        with pytest.raises(StaleReplicaError) as error:
+            second.submit_one_txn({11}, {11}, 1)
+        assert second.is_stale
+        stale_ts = error.value.ts
+
+        # the replica replacing second takes over its txn
+        third = SharedDashStateManager.load(DASH_ID, store.load_dashboard(DASH_ID),
+                                            store, 120, error.value.owner)
+        node_groups = third.get_own_placeholder(stale_ts, {11})
+        assert node_groups[NodeType.VIZ.value - 1] == {11}
+        third.finish_one_update(11, stale_ts, make_result("b"))
+        third.commit_one_txn(stale_ts)
+        assert get_result(first, 11, stale_ts) == make_result("b")
+        assert first.last_committed == stale_ts
+
+    def test_admission_is_atomic(self):
+        first, _ = create_replicas(LocalStateStore())
+        first.max_pending_txns = 1
+        barrier = Barrier(8)
+        results = []
+
+        def submit() -> None:
+            barrier.wait()
+            results.append(first.try_submit_one_txn({10}, {10}, 1))
+
+        threads = [Thread(target=submit) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len([ret for ret in results if ret is not None]) == 1
+        assert first.get_queue_depth() == 1
@@ -0,0 +1,99 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+from pytest import mark
+
+from superset.ace.util_class import IV, Version, VersionChain
+
+
+def create_chain(*versions) -> VersionChain:
+    chain = VersionChain()
+    for version in versions:
+        chain.append(version)
+    return chain
+
+
+def get_ts_list(versions) -> list:
+    return [version.ts for version in versions]
+
+
+@mark.unittest
+class TestVersionChain:
+    def test_append(self):
+        chain = VersionChain()
+        assert chain.get_visible() is None
+        assert chain.get_by_snapshot(0) is None
+        chain.append(Version(0, {}))
+        chain.append(IV(2))
+        assert chain.get_visible().ts == 0
+        assert chain.get_by_snapshot(1).ts == 0
+        assert isinstance(chain.get_by_snapshot(2), IV)
+        assert chain.get_by_snapshot(-1) is None
+        chain.append(Version(3, {}))
+        assert chain.get_visible().ts == 3
+        assert list(chain.ts_list) == [0, 2, 3]
+        assert list(chain.iv_flags) == [0, 1, 0]
+
+    def test_insert_before_the_visible_version(self):
+        chain = create_chain(Version(0, {}), Version(4, {}))
+        assert chain.append(IV(2)) is None
+        assert list(chain.ts_list) == [0, 2, 4]
+        assert chain.get_visible().ts == 4
+        assert chain.get_by_snapshot(3).ts == 2
+
+    def test_replace_iv_in_place(self):
+        chain = create_chain(Version(0, {}), IV(1), IV(2))
+        iv = chain.payloads[1]
+        assert chain.insert(Version(1, {"a": 1})) is iv
+        assert chain.get_visible().ts == 1
+        # a Version older than the visible one keeps it visible
+        chain.insert(Version(2, {}))
+        assert chain.insert(Version(1, {"a": 2})).result == {"a": 1}
+        assert chain.get_visible().ts == 2
+        assert len(chain) == 3
+
+    def test_invalidate_the_visible_version(self):
+        chain = create_chain(Version(0, {}), IV(1), Version(2, {}))
+        chain.insert(IV(2))
+        # the newest Version below the IVs becomes visible again
+        assert chain.get_visible().ts == 0
+        chain.insert(IV(0))
+        assert chain.get_visible() is None
+        chain.insert(Version(1, {}))
+        assert chain.get_visible().ts == 1
+
+    def test_truncate_before(self):
+        chain = create_chain(Version(0, {}), Version(1, {}), IV(2),
+                             Version(3, {}), IV(4))
+        assert chain.truncate_before(0) == []
+        # the newest Version at or below ts is kept, not the IV above it
+        assert get_ts_list(chain.truncate_before(2)) == [0]
+        assert list(chain.ts_list) == [1, 2, 3, 4]
+        assert chain.get_visible().ts == 3
+        assert chain.get_by_snapshot(2).ts == 2
+        assert get_ts_list(chain.truncate_before(10)) == [1, 2]
+        assert list(chain.ts_list) == [3, 4]
+        assert chain.get_visible().ts == 3
+        assert chain.truncate_before(10) == []
+
+    def test_truncate_before_only_ivs(self):
+        chain = create_chain(IV(0), IV(1), Version(2, {}))
+        assert get_ts_list(chain.truncate_before(2)) == [0, 1]
+        assert chain.get_visible().ts == 2
+        chain = create_chain(IV(0), IV(1))
+        assert chain.truncate_before(1) == []
+        assert chain.get_visible() is None
@@ -0,0 +1,63 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+from pytest import mark
+
+from superset.ace import view_graph as view_graph_module
+from superset.ace.util_class import IV, Dependency, Node, NodeType, Version
+from superset.ace.view_graph import ViewGraph
+
+
+# base tables 0 and 1, filter -1 scoped on charts 10 and 11, chart 12 on
+# table 1 only
+def create_view_graph() -> ViewGraph:
+    view_graph = ViewGraph()
+    for prec, dep in ((Node(0, NodeType.BASE_TABLE), Node(10, NodeType.VIZ)),
+                      (Node(0, NodeType.BASE_TABLE), Node(11, NodeType.VIZ)),
+                      (Node(1, NodeType.BASE_TABLE), Node(12, NodeType.VIZ)),
+                      (Node(-1, NodeType.FILTER), Node(10, NodeType.VIZ)),
+                      (Node(-1, NodeType.FILTER), Node(11, NodeType.VIZ))):
+        view_graph.insert(Dependency(prec, dep))
+    view_graph.create_initial_snapshot(-1)
+    return view_graph
+
+
+@mark.unittest
+class TestViewGraph:
+    def test_impacted_groups(self, monkeypatch):
+        expected_groups = {
+            frozenset({0}): ({0}, set(), {10, 11}),
+            frozenset({-1, 1}): ({1}, {-1}, {10, 11, 12}),
+            frozenset({0, 1}): ({0, 1}, set(), {10, 11, 12}),
+            frozenset({12}): (set(), set(), {12}),
+        }
+        # walked node by node, and from the closures of the nodes
+        for max_walked_nodes in (512, 0):
+            monkeypatch.setattr(view_graph_module, "MAX_WALKED_NODES",
+                                max_walked_nodes)
+            view_graph = create_view_graph()
+            for node_id_set, groups in expected_groups.items():
+                assert view_graph.get_impacted_groups(node_id_set) == groups
+
+    def test_snapshot_placeholder(self):
+        view_graph = create_view_graph()
+        view_graph.create_snapshot_placeholder({-1}, 0)
+        snapshot = view_graph.read_snapshot(0, {-1, 0, 10, 11, 12})
+        assert isinstance(snapshot[-1], Version) and snapshot[-1].ts == 0
+        assert snapshot[0].ts == -1
+        assert isinstance(snapshot[10], IV) and isinstance(snapshot[11], IV)
+        assert isinstance(snapshot[12], Version) and snapshot[12].ts == -1
@@ -0,0 +1,115 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+from pytest import approx, mark
+
+from superset.ace.ds_state_manager import DashStateManager
+from superset.ace.util_class import Dependency, Node, NodeType
+from superset.ace.viewport_predictor import (build_viewport_predictor,
+                                             MarkovPredictor, MomentumPredictor,
+                                             PREDICTOR_MARKOV, PREDICTOR_MOMENTUM,
+                                             PREDICTOR_NONE)
+
+VIEW_PORT_A = frozenset({10, 11})
+VIEW_PORT_B = frozenset({12, 13})
+VIEW_PORT_C = frozenset({11, 14})
+
+
+@mark.unittest
+class TestViewportPredictor:
+    def test_markov(self):
+        predictor = MarkovPredictor()
+        assert not predictor.observe(frozenset())
+        for view_port in (VIEW_PORT_A, VIEW_PORT_B, VIEW_PORT_A, VIEW_PORT_C,
+                          VIEW_PORT_A, VIEW_PORT_B):
+            assert predictor.observe(view_port)
+        assert not predictor.observe(VIEW_PORT_B)
+        assert predictor.predict() == {10: 1.0, 11: 1.0}
+        predictor.observe(VIEW_PORT_A)
+        # the charts of the current viewport are not predicted
+        assert predictor.predict() == {12: approx(2 / 3), 13: approx(2 / 3),
+                                       14: approx(1 / 3)}
+        predictor.observe(VIEW_PORT_C)
+        assert predictor.predict() == {10: 1.0}
+
+    def test_markov_states_are_bounded(self):
+        predictor = MarkovPredictor(max_states=2)
+        for view_port in (VIEW_PORT_A, VIEW_PORT_B, VIEW_PORT_C, VIEW_PORT_A):
+            predictor.observe(view_port)
+        # the transitions of the least recently left viewport are dropped
+        assert list(predictor.transitions) == [VIEW_PORT_B, VIEW_PORT_C]
+        assert predictor.predict() == {}
+
+    def test_momentum(self):
+        predictor = MomentumPredictor(list(range(10)), alpha=0.5)
+        predictor.observe(frozenset({0, 1}))
+        assert predictor.predict() == {}
+        predictor.observe(frozenset({2, 3}))
+        assert predictor.velocity == approx(1.0)
+        assert predictor.predict() == {4: 1.0}
+        predictor.observe(frozenset({6, 7}))
+        assert predictor.velocity == approx(2.5)
+        assert predictor.predict() == {8: 1.0, 9: 1.0}
+        predictor.observe(frozenset({8, 9}))
+        # the charts past the end of the dashboard are not predicted
+        assert predictor.predict() == {}
+
+        # scrolling back up
+        predictor.observe(frozenset({2, 3}))
+        assert predictor.velocity == approx(-1.875)
+        assert predictor.predict() == {0: 1.0, 1: 1.0}
+        # the charts that are not in the layout are ignored
+        assert predictor.observe(frozenset({20}))
+        assert predictor.predict() == {}
+
+    def test_build_viewport_predictor(self):
+        assert build_viewport_predictor(PREDICTOR_NONE, []) is None
+        assert isinstance(build_viewport_predictor(PREDICTOR_MARKOV, []),
+                          MarkovPredictor)
+        assert isinstance(build_viewport_predictor(PREDICTOR_MOMENTUM, [1, 2]),
+                          MomentumPredictor)
+
+    def test_predicted_charts_are_boosted(self):
+        chart_ids = (10, 11, 12, 13, 14)
+        dependency_list = [Dependency(Node(chart_id - 10, NodeType.BASE_TABLE),
+                                      Node(chart_id, NodeType.VIZ))
+                           for chart_id in chart_ids]
+        ds_state_manager = DashStateManager(dependency_list)
+        ds_state_manager.config_state_manager(1, 0, True, False, False, True, True,
+                                              "", "", "", "", "",
+                                              viewport_predictor=PREDICTOR_MARKOV)
+        for view_port in (VIEW_PORT_A, VIEW_PORT_B, VIEW_PORT_A):
+            ds_state_manager.read_view_port(view_port, 1)
+        ts, _ = ds_state_manager.submit_one_txn({0, 1, 2, 3, 4}, set(), 1)
+        ds_state_manager.read_view_port(VIEW_PORT_A, 4)
+        # the boost is half the viewport time of the most viewed chart
+        assert [ds_state_manager._node_priority(ts, chart_id)
+                for chart_id in chart_ids] == [4.0, 4.0, 2.0, 2.0, 0.0]
+        # and keeps up with it
+        ds_state_manager.read_view_port(VIEW_PORT_A, 4)
+        assert [ds_state_manager._node_priority(ts, chart_id)
+                for chart_id in chart_ids] == [8.0, 8.0, 4.0, 4.0, 0.0]
+
+        pending = set(chart_ids)
+        claimed_chart_ids = []
+        while len(pending) != 0:
+            chart_id = ds_state_manager.get_top_priority_node(ts, pending, {})
+            claimed_chart_ids.append(chart_id)
+            pending.discard(chart_id)
+        assert set(claimed_chart_ids[:2]) == set(VIEW_PORT_A)
+        assert set(claimed_chart_ids[2:4]) == set(VIEW_PORT_B)
+        assert claimed_chart_ids[4] == 14